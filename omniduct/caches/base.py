@@ -4,9 +4,10 @@ import sys
 from abc import abstractmethod
 
 import six
-from decorator import decorator
+from decorator import decorate
 
 from omniduct.duct import Duct
+from omniduct.errors import DuctOffline
 from omniduct.utils.config import config
 from omniduct.utils.docs import quirk_docs
 
@@ -16,6 +17,10 @@ config.register('cache_fail_hard',
                 description='Raise exception if cache fails to save.',
                 default=False)
 
+# Returned by `Cache.get` (as the `default`) to signal that a cached value
+# could not be loaded, since `None` may itself be a cached value.
+_MISSING = object()
+
 
 def cached_method(id_str,
                   cache=lambda self: self.cache,
@@ -23,35 +28,68 @@ def cached_method(id_str,
                   use_cache=lambda self, kwargs: kwargs.pop('use_cache', True),
                   renew=lambda self, kwargs: kwargs.pop('renew', False),
                   format=lambda self, kwargs: None,
-                  serializer=lambda format: pickle.dump,  # Serializers accept obj, file handle and format.
-                  deserializer=lambda format: pickle.load):  # Deserializers accept file handle and format.
-    @decorator
-    def wrapped(method, self, *args, **kwargs):
+                  tags=lambda self, kwargs: None,
+                  serializer=lambda self, format: pickle.dump,  # Serializers accept obj, file handle and format.
+                  deserializer=lambda self, format: pickle.load):  # Deserializers accept file handle and format.
+    def decorator(method):
+        # The names of positional arguments are determined once, at decoration
+        # time, rather than on every call.
         if six.PY3 and not hasattr(sys, 'pypy_version_info'):
-            arguments = inspect.signature(method).parameters.keys()
+            arguments = list(inspect.signature(method).parameters.keys())[1:]
         else:
-            arguments = inspect.getargspec(method).args
-        kwargs.update(dict(zip(list(arguments)[1:], args)))
-
-        _cache = cache(self)
-        _use_cache = use_cache(self, kwargs)
-        _renew = renew(self, kwargs)
-        _format = format(self, kwargs)
-
-        if _cache is None or not _use_cache:
-            return method(self, **kwargs)
-
-        _id_duct = id_duct(self, kwargs)
-        _id_str = id_str(self, kwargs)
-
-        if _renew or not _cache.has_key(_id_duct, _id_str):  # noqa: has_key is not of a dictionary here
+            arguments = inspect.getargspec(method).args[1:]
+
+        def wrapped(method, self, *args, **kwargs):
+            if args:
+                kwargs.update(zip(arguments, args))
+
+            _cache = cache(self)
+            _use_cache = use_cache(self, kwargs)
+            _renew = renew(self, kwargs)
+
+            # Offline ducts (see `Duct.offline`) may only serve results from
+            # the cache.
+            _offline = getattr(self, 'offline', False)
+
+            if _cache is None or not _use_cache:
+                if _offline:
+                    raise DuctOffline("`{}` is offline, and `{}` cannot be called without using a cache.".format(self.name, method.__name__))
+                return method(self, **kwargs)
+
+            _format = format(self, kwargs)
+            _id_duct = id_duct(self, kwargs)
+            _id_str = id_str(self, kwargs)
+
+            # Cache hits are served by a single lookup, with misses (including
+            # entries which could not be loaded) signalled by `_MISSING`.
+            if not _renew:
+                try:
+                    value = _cache.get(
+                        id_duct=_id_duct,
+                        id_str=_id_str,
+                        deserializer=deserializer(self, _format),
+                        default=_MISSING
+                    )
+                except Exception as e:
+                    if not _offline:
+                        raise
+                    logger.error("Failed to load cached result of `{}`: {}".format(method.__name__, e))
+                    value = _MISSING
+                if value is not _MISSING:
+                    logger.caveat('Loaded from cache')
+                    return value
+
+            if _offline:
+                raise DuctOffline("`{}` is offline, and no cached result of `{}` is available.".format(self.name, method.__name__))
             value = method(self, **kwargs)
             try:
                 _cache.set(
                     id_duct=_id_duct,
                     id_str=_id_str,
                     value=value,
-                    serializer=serializer(_format)
+                    serializer=serializer(self, _format),
+                    format=_format,
+                    tags=tags(self, kwargs)
                 )
             except Exception:  # Remove any lingering (perhaps partial) cache files
                 _cache.clear(
@@ -63,15 +101,8 @@ def cached_method(id_str,
                     raise
 
             return value
-
-        logger.caveat('Loaded from cache')
-
-        return _cache.get(
-            id_duct=_id_duct,
-            id_str=_id_str,
-            deserializer=deserializer(_format)
-        )
-    return wrapped
+        return decorate(method, wrapped)
+    return decorator
 
 
 class Cache(Duct):
@@ -100,6 +131,18 @@ class Cache(Duct):
     def _init(self):
         pass
 
+    @property
+    def offline(self):
+        """
+        bool: Caches serve the results of offline ducts, and so are never
+        themselves offline.
+        """
+        return False
+
+    @offline.setter
+    def offline(self, offline):
+        pass
+
     @abstractmethod
     def clear(self, id_duct, id_str):
         pass
@@ -109,7 +152,7 @@ class Cache(Duct):
         pass
 
     @abstractmethod
-    def get(self, id_duct, id_str, deserializer=pickle.load):
+    def get(self, id_duct, id_str, deserializer=pickle.load, default=None):
         pass
 
     @abstractmethod
@@ -121,5 +164,25 @@ class Cache(Duct):
         pass
 
     @abstractmethod
-    def set(self, id_duct, id_str, value, serializer=pickle.dump):
+    def set(self, id_duct, id_str, value, serializer=pickle.dump, format=None, tags=None):
         pass
+
+    def invalidate(self, tags, id_duct=None, qualified=False):
+        """
+        Remove all cache entries associated with any of the nominated tags
+        (for example, the results of all queries which referenced a table
+        that has since been updated).
+
+        Parameters:
+            tags (list<str>): The tags for which entries should be removed.
+            id_duct (str, None): If specified, only entries of the nominated
+                duct are removed.
+            qualified (bool): Whether entries associated with qualified forms
+                of the tags (those ending in "." followed by a nominated tag,
+                such as "catalog.schema.table" for "schema.table") should also
+                be removed (default: False).
+
+        Returns:
+            int: The number of entries removed.
+        """
+        raise NotImplementedError("`{}` does not support invalidation by tag.".format(self.__class__.__name__))
@@ -1,8 +1,20 @@
+import atexit
+import errno
 import hashlib
+import io
+import json
 import os
 import pickle
 import shutil
+import sqlite3
 import sys
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
 
 import six
 
@@ -10,12 +22,43 @@ from ..utils.storage import ensure_path_exists
 from ..utils.debug import logger
 from .base import Cache
 
+# Caches with access statistics which may need to be written to their index
+# at exit. Caches are held weakly, so that they can be garbage collected.
+_LOCAL_CACHES = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_local_caches():
+    for cache in list(_LOCAL_CACHES):
+        cache._flush_accesses_at_exit()
+
 
 class LocalCache(Cache):
     """
     `LocalCache` uses the local filesystem (at a nominated directory) to store
     the cache.
 
+    Cached values are stored by content: each distinct serialized payload is
+    stored once (in a "_blobs" subdirectory, named by the sha256 hash of its
+    contents), and cache entries are hard links to these shared blobs. Many
+    distinct keys whose values serialize identically (e.g. differently
+    formatted but equivalent queries) therefore consume disk space only once.
+    The link count of each blob acts as its reference count, and blobs are
+    removed once no entries refer to them. If hard links are not supported by
+    the underlying filesystem, entries fall back to being independent copies.
+
+    Metadata about each entry (its duct, size, format, creation and access
+    times, time-to-live, number of hits and tags) is maintained in a SQLite index
+    stored alongside the cache, which serves lookups, listing of keys,
+    eviction and statistics without touching the filesystem, and which is
+    safe to share between many concurrent processes. Entries present on disk
+    when the index is first created are indexed automatically (see
+    `LocalCache.reindex`). So that cache hits do not contend for the index's
+    write lock, access times and hit counts are accumulated in memory and
+    written to the index in batches (at most every `ACCESS_FLUSH_INTERVAL`
+    seconds, or every `ACCESS_FLUSH_SIZE` entries accessed, and on
+    disconnection).
+
     Note: This cache will be replaced with a `FileSystemCache`, which is
     similar but based on the `FileSystemClient` API rather than directly accessing
     the local filesystem.
@@ -23,11 +66,39 @@ class LocalCache(Cache):
 
     PROTOCOLS = ['local_cache']
 
-    def _init(self, dir):
+    BLOBS_DIR = '_blobs'
+    INDEX_FILE = '_index.sqlite3'
+    ACCESS_FLUSH_INTERVAL = 60
+    ACCESS_FLUSH_SIZE = 1000
+
+    def _init(self, dir, dedup=True, ttl=None, index_journal_mode='wal', index_timeout=60):
         """
         dir (str): The path to act as the parent directory for the cache.
+        dedup (bool): Whether to share the storage of identical cached values
+            between cache entries (default: True).
+        ttl (float, None): The default number of seconds for which cache
+            entries remain valid (default: None, meaning that entries do not
+            expire).
+        index_journal_mode (str): The SQLite journal mode of the cache index.
+            The default, 'wal', allows readers to proceed concurrently with
+            writers, but requires all processes using the cache to be on the
+            same host; for caches on network filesystems (such as NFS) shared
+            between hosts, use 'delete' instead.
+        index_timeout (float): The number of seconds to wait for concurrent
+            writers to release their lock on the index (default: 60).
         """
         self.dir = dir
+        self.dedup = dedup
+        self.ttl = ttl
+        self.index_journal_mode = index_journal_mode
+        self.index_timeout = index_timeout
+        self.__index_local = threading.local()
+        self.__index_lock = threading.Lock()
+        self.__index_connections = []
+        self.__index_generation = 0
+        self.__accesses = {}
+        self.__accesses_flushed = time.time()
+        _LOCAL_CACHES.add(self)
 
     @property
     def dir(self):
@@ -72,34 +143,527 @@ class LocalCache(Cache):
         return True
 
     def _disconnect(self):
-        pass
+        self._flush_accesses()
+        with self.__index_lock:
+            connections, self.__index_connections = self.__index_connections, []
+            self.__index_generation += 1  # Other threads reconnect on next use
+        for pid, connection in connections:
+            if pid == os.getpid():
+                connection.close()
 
-    # Cache implementations
-    def clear(self, id_duct, id_str):
+    # Index
+    @property
+    def _index(self):
+        # SQLite connections may not be shared between threads or forked
+        # processes, and so a connection is maintained per thread and process.
+        # Connections are also tracked centrally, so that all of them can be
+        # closed on disconnection.
+        local = self.__index_local
+        if (
+            getattr(local, 'connection', None) is None
+            or local.pid != os.getpid()
+            or local.generation != self.__index_generation
+        ):
+            index_path = os.path.join(self.dir, self.INDEX_FILE)
+            created = not os.path.exists(index_path)
+            connection = sqlite3.connect(index_path, timeout=self.index_timeout, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute("PRAGMA journal_mode={}".format(self.index_journal_mode))
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id_duct TEXT NOT NULL, key TEXT NOT NULL, id_str TEXT, format TEXT, size INTEGER, "
+                "content_hash TEXT, created REAL, accessed REAL, ttl REAL, hits INTEGER NOT NULL DEFAULT 0, "
+                "PRIMARY KEY (id_duct, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS tags ("
+                "tag TEXT NOT NULL, id_duct TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, id_duct, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS tags_entry ON tags (id_duct, key)")
+            with self.__index_lock:
+                self.__index_connections.append((os.getpid(), connection))
+                local.connection, local.pid, local.generation = connection, os.getpid(), self.__index_generation
+            if created:
+                self.reindex()
+        return local.connection
+
+    @classmethod
+    def _id_duct_str(cls, id_duct):
+        return id_duct if isinstance(id_duct, six.string_types) else '.'.join(id_duct)
+
+    def _index_entry(self, id_duct, id_str):
+        return self._index.execute(
+            "SELECT content_hash, created, ttl FROM entries WHERE id_duct = ? AND key = ?",
+            (self._id_duct_str(id_duct), self.get_hash(id_str))
+        ).fetchone()
+
+    @classmethod
+    def _expired(cls, entry, now=None):
+        _, created, ttl = entry
+        return ttl is not None and created + ttl < (now or time.time())
+
+    def reindex(self):
+        """
+        Add any cache entries present on disk but missing from the index (for
+        example, those created by earlier versions of omniduct) to the index.
+        The keys (`id_str`) of such entries are not known, and so they are not
+        included in `LocalCache.keys`.
+        """
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.dir):
+            if dirpath == self.dir and self.BLOBS_DIR in dirnames:
+                dirnames.remove(self.BLOBS_DIR)
+            id_duct = os.path.relpath(dirpath, self.dir).replace(os.sep, '.')
+            for filename in filenames:
+                if id_duct == '.' or '.' in filename:  # Index files and temporary files
+                    continue
+                stat = os.stat(os.path.join(dirpath, filename))
+                entries.append((id_duct, filename, stat.st_size, stat.st_mtime, stat.st_mtime))
+        with self._index_transaction() as index:
+            index.executemany(
+                "INSERT OR IGNORE INTO entries (id_duct, key, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                entries
+            )
+
+    def _record_access(self, id_duct, key):
+        with self.__index_lock:
+            hits = self.__accesses.get((id_duct, key), (None, 0))[1]
+            self.__accesses[(id_duct, key)] = (time.time(), hits + 1)
+            flush = (
+                len(self.__accesses) >= self.ACCESS_FLUSH_SIZE
+                or time.time() - self.__accesses_flushed > self.ACCESS_FLUSH_INTERVAL
+            )
+        if flush:
+            self._flush_accesses()
+
+    def _flush_accesses(self):
+        """
+        Write the access times and hit counts of entries accessed since the
+        last flush to the index.
+        """
+        with self.__index_lock:
+            accesses, self.__accesses = self.__accesses, {}
+            self.__accesses_flushed = time.time()
+        if not accesses:
+            return
+        with self._index_transaction() as index:
+            index.executemany(
+                "UPDATE entries SET accessed = MAX(COALESCE(accessed, 0), ?), hits = hits + ? WHERE id_duct = ? AND key = ?",
+                [(accessed, hits, id_duct, key) for (id_duct, key), (accessed, hits) in accesses.items()]
+            )
+
+    def _flush_accesses_at_exit(self):
+        # Caches are often used without being connected (and hence are not
+        # disconnected at exit), and may have since been removed.
+        if self.__accesses and os.path.exists(os.path.join(self._dir, self.INDEX_FILE)):
+            self._flush_accesses()
+
+    @contextmanager
+    def _index_transaction(self):
+        index = self._index
+        index.execute("BEGIN IMMEDIATE")
         try:
-            os.remove(self.get_path(id_duct, id_str))
+            yield index
         except:
+            index.execute("ROLLBACK")
+            raise
+        index.execute("COMMIT")
+
+    def stats(self, id_duct=None):
+        """
+        Summarize the contents of the cache (or of the entries of a single
+        duct).
+
+        Parameters:
+            id_duct (str, None): The duct for which entries should be
+                summarized. If `None`, all entries are summarized.
+
+        Returns:
+            dict: A dictionary with keys 'entries' (the number of entries),
+                'size' (the total size of the entries in bytes, counting shared
+                storage once per entry), and 'hits' (the total number of times
+                entries have been loaded from the cache).
+        """
+        self._flush_accesses()
+        where, args = self._duct_predicate(id_duct)
+        entries, size, hits = self._index.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM entries WHERE {}".format(where), args
+        ).fetchone()
+        return {'entries': entries, 'size': size, 'hits': hits}
+
+    def evict(self, max_size=None, max_age=None, id_duct=None):
+        """
+        Evict expired entries from the cache, along with (if specified)
+        entries which have not been accessed within `max_age` seconds, and
+        the least recently accessed entries until the cache is no larger than
+        `max_size` bytes.
+
+        Parameters:
+            max_size (int, None): The maximum total size of entries to retain.
+            max_age (float, None): The maximum number of seconds since entries
+                were last accessed.
+            id_duct (str, None): If specified, only entries of the nominated
+                duct are considered for eviction (and counted towards
+                `max_size`).
+
+        Returns:
+            int: The number of entries evicted.
+        """
+        self._flush_accesses()
+        now = time.time()
+        where, args = self._duct_predicate(id_duct)
+        conditions = ["(ttl IS NOT NULL AND created + ttl < ?)"]
+        args = list(args) + [now]
+        if max_age is not None:
+            conditions.append("accessed < ?")
+            args.append(now - max_age)
+        evicted = self._index.execute(
+            "SELECT id_duct, key, content_hash FROM entries WHERE ({}) AND ({})".format(where, ' OR '.join(conditions)),
+            args
+        ).fetchall()
+
+        if max_size is not None:
+            evicted_keys = set((id_duct_, key) for id_duct_, key, _ in evicted)
+            where, args = self._duct_predicate(id_duct)
+            size = 0
+            for id_duct_, key, content_hash, entry_size in self._index.execute(
+                "SELECT id_duct, key, content_hash, size FROM entries WHERE {} ORDER BY accessed DESC".format(where), args
+            ).fetchall():
+                if (id_duct_, key) in evicted_keys:
+                    continue
+                size += entry_size or 0
+                if size > max_size:
+                    evicted.append((id_duct_, key, content_hash))
+
+        for id_duct_, key, content_hash in evicted:
+            self._clear_entry(id_duct_, key, content_hash)
+        if evicted:
+            logger.info("Evicted {} entries from the cache.".format(len(evicted)))
+        return len(evicted)
+
+    # Bundles
+    def export_bundle(self, path, id_duct=None, since=None):
+        """
+        Export cache entries to a bundle (a gzipped tarball), which can be
+        imported into another cache using `LocalCache.import_bundle`; for
+        example, to replay reports or tests against their cached results in
+        an environment without access to the underlying services (see
+        `Duct.offline`). To export just those entries used by a set of
+        notebooks, run the notebooks and then export the entries accessed
+        since they were started:
+        ```
+        start = time.time()
+        # ... run notebooks ...
+        cache.export_bundle('reports.tar.gz', since=start)
+        ```
+        Each distinct payload is stored in the bundle only once. Entries whose
+        keys are not known (see `LocalCache.reindex`) cannot be exported.
+
+        Parameters:
+            path (str): The path of the bundle to create.
+            id_duct (str, None): If specified, only entries of the nominated
+                duct are exported.
+            since (float, None): If specified, only entries created or accessed
+                at or after this time (in seconds since the epoch) are exported.
+
+        Returns:
+            int: The number of entries exported.
+        """
+        self._flush_accesses()
+        now = time.time()
+        where, args = self._duct_predicate(id_duct)
+        if since is not None:
+            where, args = "{} AND accessed >= ?".format(where), tuple(args) + (since,)
+        entries = self._index.execute(
+            "SELECT id_duct, key, id_str, format, content_hash, created, ttl FROM entries "
+            "WHERE {} AND id_str IS NOT NULL ORDER BY id_duct, id_str".format(where), args
+        ).fetchall()
+
+        manifest = []
+        with tarfile.open(path, 'w:gz') as bundle:
+            members = set()
+            for id_duct_, key, id_str, format, content_hash, created, ttl in entries:
+                if self._expired((content_hash, created, ttl), now=now):
+                    continue
+                entry_path = os.path.join(self.dir, *(id_duct_.split('.') + [key]))
+                if not os.path.exists(entry_path):
+                    continue
+                content_hash = content_hash or self.get_content_hash(entry_path)
+                if content_hash not in members:
+                    bundle.add(entry_path, arcname='blobs/{}'.format(content_hash))
+                    members.add(content_hash)
+                manifest.append({
+                    'id_duct': id_duct_,
+                    'id_str': id_str,
+                    'format': format,
+                    'content_hash': content_hash,
+                    'tags': [tag for tag, in self._index.execute(
+                        "SELECT tag FROM tags WHERE id_duct = ? AND key = ? ORDER BY tag", (id_duct_, key)
+                    )],
+                })
+            data = json.dumps({'version': 1, 'entries': manifest}, indent=2).encode('utf8')
+            info = tarfile.TarInfo('manifest.json')
+            info.size, info.mtime = len(data), now
+            bundle.addfile(info, io.BytesIO(data))
+        logger.info("Exported {} entries from the cache to '{}'.".format(len(manifest), path))
+        return len(manifest)
+
+    def import_bundle(self, path):
+        """
+        Import the cache entries of a bundle created by
+        `LocalCache.export_bundle`, replacing any existing entries with the
+        same keys. Imported entries are treated as newly created, and are
+        subject to the `ttl` of this cache.
+
+        Parameters:
+            path (str): The path of the bundle to import.
+
+        Returns:
+            int: The number of entries imported.
+        """
+        with tarfile.open(path, 'r:gz') as bundle:
+            manifest = json.loads(bundle.extractfile('manifest.json').read().decode('utf8'))
+            for entry in manifest['entries']:
+                payload = bundle.extractfile('blobs/{}'.format(entry['content_hash']))
+                self.set(
+                    entry['id_duct'], entry['id_str'], payload,
+                    serializer=lambda payload, f: shutil.copyfileobj(payload, f),
+                    format=entry['format'], tags=entry['tags']
+                )
+        logger.info("Imported {} entries into the cache from '{}'.".format(len(manifest['entries']), path))
+        return len(manifest['entries'])
+
+    def _duct_predicate(self, id_duct, column='id_duct'):
+        # Matches entries of the nominated duct, and of any nested ducts
+        if id_duct is None:
+            return "1", ()
+        id_duct = self._id_duct_str(id_duct)
+        return "({0} = ? OR substr({0}, 1, ?) = ?)".format(column), (id_duct, len(id_duct) + 1, id_duct + '.')
+
+    def _clear_entry(self, id_duct, key, content_hash=None):
+        path = os.path.join(self.dir, *(id_duct.split('.') + [key]))
+        try:
+            self._release_entry(path, content_hash=content_hash)
+        except OSError:
+            pass
+        with self._index_transaction() as index:
+            index.execute("DELETE FROM entries WHERE id_duct = ? AND key = ?", (id_duct, key))
+            index.execute("DELETE FROM tags WHERE id_duct = ? AND key = ?", (id_duct, key))
+
+    # Content-addressed storage
+    @property
+    def blobs_dir(self):
+        return os.path.join(self.dir, self.BLOBS_DIR)
+
+    def get_blob_path(self, content_hash):
+        return os.path.join(self.blobs_dir, content_hash[:2], content_hash)
+
+    @classmethod
+    def get_content_hash(cls, path):
+        """
+        Get the sha256 hash of the contents of the file at `path`.
+
+        Parameters:
+            path (str): The path of the file to be hashed.
+
+        Returns:
+            str: The sha256 hash of the file's contents.
+        """
+        content_hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b''):
+                content_hash.update(chunk)
+        return content_hash.hexdigest()
+
+    def _store_blob(self, payload_path, cache_path, previous_hash=None):
+        # Link the serialized payload into blob storage (unless an identical
+        # blob already exists), and then atomically replace the cache entry
+        # with a hard link to the blob. The payload is only removed (by the
+        # caller) once linked, so blobs never go unreferenced in the interim.
+        content_hash = self.get_content_hash(payload_path)
+        blob_path = self.get_blob_path(content_hash)
+        ensure_path_exists(os.path.dirname(blob_path))
+        link_path = '{}.{}.link'.format(cache_path, uuid.uuid4().hex)  # Unique to this writer
+        for _ in range(3):
+            try:
+                os.link(blob_path, link_path)
+                break
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+            try:  # Blob does not exist (or was concurrently garbage collected)
+                os.link(payload_path, blob_path)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        else:
+            raise OSError(errno.ENOENT, "Failed to link cache entry to blob.", blob_path)
+        self._release_entry(cache_path, replace_with=link_path, content_hash=previous_hash)
+        return content_hash
+
+    def _release_entry(self, cache_path, replace_with=None, content_hash=None):
+        # Remove (or replace) a cache entry, garbage collecting its blob if
+        # this was the last entry referring to it.
+        try:
+            stat = os.stat(cache_path)
+        except OSError:
+            stat = None
+        blob_path = None
+        if stat is not None and stat.st_nlink == 2:
+            blob_path = self.get_blob_path(content_hash or self.get_content_hash(cache_path))
+        if replace_with is not None:
+            os.rename(replace_with, cache_path)
+        elif stat is not None:
+            os.remove(cache_path)
+        if blob_path is not None:
+            self._collect_blob(blob_path)
+
+    def _collect_blob(self, blob_path):
+        try:
+            if os.stat(blob_path).st_nlink == 1:
+                os.remove(blob_path)
+        except OSError:
             pass
 
+    def collect_garbage(self):
+        """
+        Remove all blobs which are no longer referred to by any cache entries.
+        This is not normally necessary, since blobs are removed as the entries
+        referring to them are cleared, but is useful after entries have been
+        removed by other means (e.g. `clear_all`).
+        """
+        if not os.path.exists(self.blobs_dir):
+            return
+        for dirpath, _, filenames in os.walk(self.blobs_dir):
+            for filename in filenames:
+                self._collect_blob(os.path.join(dirpath, filename))
+
+    # Cache implementations
+    def clear(self, id_duct, id_str):
+        entry = self._index_entry(id_duct, id_str)
+        self._clear_entry(self._id_duct_str(id_duct), self.get_hash(id_str),
+                          content_hash=entry[0] if entry else None)
+
     def clear_all(self, id_duct=None):
-        cache_path = self.dir if id_duct is None else os.path.dirname(self.get_path(id_duct, 'None'))
-        shutil.rmtree(cache_path)
+        where, args = self._duct_predicate(id_duct)
+        with self._index_transaction() as index:
+            index.execute("DELETE FROM entries WHERE {}".format(where), args)
+            index.execute("DELETE FROM tags WHERE {}".format(where), args)
+        if id_duct is not None:
+            shutil.rmtree(os.path.dirname(self.get_path(id_duct, 'None')), ignore_errors=True)
+            self.collect_garbage()
+            return
+        for name in os.listdir(self.dir):  # Retain the index (which may be in use by other processes)
+            path = os.path.join(self.dir, name)
+            if name.startswith(self.INDEX_FILE):
+                continue
+            elif os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
 
-    def get(self, id_duct, id_str, deserializer=pickle.load):
+    def get(self, id_duct, id_str, deserializer=pickle.load, default=None):
+        entry = self._index_entry(id_duct, id_str)
+        if entry is None or self._expired(entry):
+            return default
         cache_path = self.get_path(id_duct, id_str)
-        if not os.path.exists(cache_path):
-            return None
-        with open(cache_path, 'rb') as f:
+        try:
+            f = open(cache_path, 'rb')
+        except IOError:
+            self._clear_entry(self._id_duct_str(id_duct), self.get_hash(id_str))  # Entry removed by other means
+            return default
+        with f:
             logger.debug("Loading local cache entry from '{}'.".format(cache_path))
-            return deserializer(f)
+            value = deserializer(f)
+        self._record_access(self._id_duct_str(id_duct), self.get_hash(id_str))
+        return value
 
     def has_key(self, id_duct, id_str):
-        return os.path.exists(self.get_path(id_duct, id_str))
+        entry = self._index_entry(id_duct, id_str)
+        return entry is not None and not self._expired(entry)
+
+    def keys(self, id_duct):
+        now = time.time()
+        return [
+            id_str for id_str, created, ttl in self._index.execute(
+                "SELECT id_str, created, ttl FROM entries WHERE id_duct = ? AND id_str IS NOT NULL ORDER BY id_str",
+                (self._id_duct_str(id_duct),)
+            )
+            if not self._expired((None, created, ttl), now=now)
+        ]
 
-    def keys(self, id_dict):
-        raise NotImplementedError()
+    def invalidate(self, tags, id_duct=None, qualified=False):
+        tags = list(tags)
+        if not tags:
+            return 0
+        matches, match_args = ["tags.tag IN ({})".format(', '.join('?' * len(tags)))], list(tags)
+        if qualified:
+            for tag in tags:
+                matches.append("substr(tags.tag, -?) = ?")
+                match_args.extend([len(tag) + 1, '.' + tag])
+        where, args = self._duct_predicate(id_duct, column='entries.id_duct')
+        entries = self._index.execute(
+            "SELECT DISTINCT entries.id_duct, entries.key, entries.content_hash FROM tags "
+            "JOIN entries ON tags.id_duct = entries.id_duct AND tags.key = entries.key "
+            "WHERE ({}) AND {}".format(' OR '.join(matches), where),
+            match_args + list(args)
+        ).fetchall()
+        for id_duct_, key, content_hash in entries:
+            self._clear_entry(id_duct_, key, content_hash)
+        if entries:
+            logger.info("Invalidated {} entries in the cache.".format(len(entries)))
+        return len(entries)
 
-    def set(self, id_duct, id_str, value, serializer=pickle.dump):
+    def set(self, id_duct, id_str, value, serializer=pickle.dump, format=None, tags=None, ttl=None):
+        """
+        Additional Parameters:
+            format (str, None): The format of the serialized value, which is
+                recorded in the cache index.
+            tags (list<str>, None): Tags with which to associate this entry,
+                allowing it to be removed using `LocalCache.invalidate`.
+            ttl (float, None): The number of seconds for which this entry
+                remains valid (defaults to `.ttl`).
+        """
         cache_path = self.get_path(id_duct, id_str, create=True)
-        with open(cache_path, 'wb') as f:
-            return serializer(value, f)
+        entry = self._index_entry(id_duct, id_str)
+        previous_hash = entry[0] if entry else None
+
+        if not self.dedup:
+            self._release_entry(cache_path, content_hash=previous_hash)
+            with open(cache_path, 'wb') as f:
+                result = serializer(value, f)
+            content_hash = None
+        else:
+            fd, payload_path = tempfile.mkstemp(dir=ensure_path_exists(self.blobs_dir), prefix='.payload')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    result = serializer(value, f)
+                try:
+                    content_hash = self._store_blob(payload_path, cache_path, previous_hash=previous_hash)
+                except (OSError, AttributeError):  # Hard links are not supported; store an independent copy
+                    logger.debug("Unable to deduplicate cache entry; storing an independent copy.")
+                    self._release_entry(cache_path, content_hash=previous_hash)
+                    os.rename(payload_path, cache_path)
+                    content_hash = None
+            finally:
+                if os.path.exists(payload_path):
+                    os.remove(payload_path)
+
+        now = time.time()
+        id_duct, key = self._id_duct_str(id_duct), self.get_hash(id_str)
+        with self._index_transaction() as index:
+            index.execute(
+                "INSERT OR REPLACE INTO entries (id_duct, key, id_str, format, size, content_hash, created, accessed, ttl, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (id_duct, key, id_str, format, os.path.getsize(cache_path),
+                 content_hash, now, now, ttl if ttl is not None else self.ttl)
+            )
+            index.execute("DELETE FROM tags WHERE id_duct = ? AND key = ?", (id_duct, key))
+            index.executemany(
+                "INSERT OR IGNORE INTO tags (tag, id_duct, key) VALUES (?, ?, ?)",
+                [(tag, id_duct, key) for tag in tags or []]
+            )
+        return result
+
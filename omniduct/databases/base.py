@@ -2,18 +2,31 @@ from __future__ import absolute_import, print_function
 
 import hashlib
 import inspect
+import json
 import logging
 import os
+import re
 import sys
+import time
 from abc import abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
+import pandas as pd
+import six
 import sqlparse
 from decorator import decorator
-from jinja2 import StrictUndefined, Template
+from distutils.version import LooseVersion
+from jinja2 import Environment, StrictUndefined
+from jinja2.utils import LRUCache
+from six.moves.queue import Queue
 
 from . import cursor_formatters
 from omniduct.caches.base import cached_method
 from omniduct.duct import Duct
+from omniduct.errors import DuctOffline, DuctQueryCostExceeded
+from omniduct.utils.config import config
 from omniduct.utils.debug import logger, logging_scope
 from omniduct.utils.docs import quirk_docs
 from omniduct.utils.magics import MagicsProvider, process_line_arguments, process_line_cell_arguments
@@ -21,12 +34,12 @@ from omniduct.utils.magics import MagicsProvider, process_line_arguments, proces
 logging.getLogger('requests').setLevel(logging.WARNING)
 
 
-def cache_serializer(format):
-    return DatabaseClient.CURSOR_FORMATTERS[format].serialize
+def cache_serializer(self, format):
+    return self._get_formatter_class(format).serialize
 
 
-def cache_deserializer(format):
-    return DatabaseClient.CURSOR_FORMATTERS[format].deserialize
+def cache_deserializer(self, format):
+    return self._get_formatter_class(format).deserialize
 
 
 @decorator
@@ -55,10 +68,22 @@ class DatabaseClient(Duct, MagicsProvider):
             by subclasses).
         CURSOR_FORMATTERS (dict<str, CursorFormatter): asdsd
         DEFAULT_CURSOR_FORMATTER (str): ...
+        PUSH_BATCH_ROWS (int): The default maximum number of rows to insert
+            per `INSERT` statement when pushing data using `_push_batched`.
+        PUSH_BATCH_PARAMS (int, None): The maximum number of values (bound
+            parameters) permitted per `INSERT` statement, if limited by the
+            database (or driver). Batches are shrunk accordingly.
+        TEMPLATE_CACHE_SIZE (int): The number of compiled templates (keyed by
+            template body) to retain for reuse by `template_render`.
+        STATEMENT_HASH_CACHE_SIZE (int): The number of statement hashes to
+            retain for reuse by `statement_hash` (which avoids reformatting
+            statements each time their cached results are looked up).
     """
 
     DUCT_TYPE = Duct.Type.DATABASE
     DEFAULT_PORT = None
+    PUSH_BATCH_ROWS = 1000
+    PUSH_BATCH_PARAMS = None
 
     CURSOR_FORMATTERS = {
         'pandas': cursor_formatters.PandasCursorFormatter,
@@ -66,9 +91,14 @@ class DatabaseClient(Duct, MagicsProvider):
         'csv': cursor_formatters.CsvCursorFormatter,
         'tuple': cursor_formatters.TupleCursorFormatter,
         'dict': cursor_formatters.DictCursorFormatter,
+        'record': cursor_formatters.RecordCursorFormatter,
+        'columnar': cursor_formatters.ColumnarCursorFormatter,
         'raw': cursor_formatters.RawCursorFormatter,
     }
     DEFAULT_CURSOR_FORMATTER = 'pandas'
+    TEMPLATE_CACHE_SIZE = 400
+    STATEMENT_HASH_CACHE_SIZE = 1000
+    _statement_hashes = {}
 
     @quirk_docs('_init', mro=True)
     def __init__(self, **kwargs):
@@ -77,13 +107,21 @@ class DatabaseClient(Duct, MagicsProvider):
             templates can be added using `.template_add`.
         template_context (dict): The default template context to use when
             rendering templates.
+        template_bytecode_cache (jinja2.BytecodeCache, None): An optional
+            `jinja2` bytecode cache (such as `jinja2.FileSystemBytecodeCache`)
+            used to share compiled templates between sessions.
         """
         Duct.__init_with_kwargs__(self, kwargs, port=self.DEFAULT_PORT)
 
-        self._templates = kwargs.pop('templates', {})
+        self._templates = dict(kwargs.pop('templates', {}))
         self._template_context = kwargs.pop('template_context', {})
+        self._template_bytecode_cache = kwargs.pop('template_bytecode_cache', None)
+        self.__template_envs = None
+        self.__template_compiled = LRUCache(self.TEMPLATE_CACHE_SIZE)
+        self.__template_expansions = {}
         self._sqlalchemy_engine = None
         self._sqlalchemy_metadata = None
+        self.last_execution_timings = None
 
         self._init(**kwargs)
 
@@ -154,15 +192,209 @@ class DatabaseClient(Duct, MagicsProvider):
         Returns:
             str: The hash used to identify a statement to the cache.
         """
+        key = (cls, statement, cleanup)
+        statement_hash = cls._statement_hashes.get(key)
+        if statement_hash is not None:
+            return statement_hash
+
         if cleanup:
             statement = cls.statement_cleanup(statement)
         if sys.version_info.major == 3 or sys.version_info.major == 2 and isinstance(statement, unicode):
             statement = statement.encode('utf8')
-        return hashlib.sha256(statement).hexdigest()
+        statement_hash = hashlib.sha256(statement).hexdigest()
+
+        if len(cls._statement_hashes) >= cls.STATEMENT_HASH_CACHE_SIZE:
+            cls._statement_hashes.clear()
+        cls._statement_hashes[key] = statement_hash
+        return statement_hash
+
+    @classmethod
+    def params_hash(cls, params):
+        """
+        This classmethod is used to determine the hash used to identify the
+        parameters bound to a statement to the cache (if configured). Parameters
+        are canonicalized (dictionary keys are sorted, and values are
+        represented as JSON where possible), so that equivalent parameters
+        share cache entries.
+
+        Parameters:
+            params (dict, list, tuple): The parameters to be hashed.
+
+        Returns:
+            str: The hash used to identify the parameters to the cache.
+        """
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=repr)
+        return hashlib.sha256(canonical.encode('utf8')).hexdigest()
+
+    # Regular expressions used to infer the tables read and written by statements
+    _STATEMENT_QUALIFIED_NAME = r'(?:[`"\[]?[\w$]+[`"\]]?\.)*[`"\[]?[\w$]+[`"\]]?'
+    _STATEMENT_TABLE_NAME = '(' + _STATEMENT_QUALIFIED_NAME + ')'
+    _STATEMENT_WRITES = re.compile(
+        r'\b(?:'
+        r'CREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:GLOBAL\s+|LOCAL\s+)?TEMP(?:ORARY)?\s+|EXTERNAL\s+)?(?:TABLE|(?:MATERIALIZED\s+)?VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?'
+        r'|INSERT\s+(?:INTO|OVERWRITE)\s+(?:TABLE\s+)?'
+        r'|DROP\s+(?:TABLE|(?:MATERIALIZED\s+)?VIEW)\s+(?:IF\s+EXISTS\s+)?'
+        r'|ALTER\s+(?:TABLE|VIEW)\s+'
+        r'|TRUNCATE\s+(?:TABLE\s+)?'
+        r'|DELETE\s+FROM\s+'
+        r'|UPDATE\s+'
+        r'|MERGE\s+INTO\s+'
+        r')' + _STATEMENT_TABLE_NAME,
+        flags=re.IGNORECASE
+    )
+    _STATEMENT_RENAMES = re.compile(r'\bRENAME\s+TO\s+' + _STATEMENT_TABLE_NAME, flags=re.IGNORECASE)
+    _STATEMENT_READS = re.compile(r'\b(?:FROM|JOIN|USING)\s+' + _STATEMENT_TABLE_NAME, flags=re.IGNORECASE)
+    _STATEMENT_CTES = re.compile(r'(?:\bWITH|,)\s*' + _STATEMENT_TABLE_NAME + r'\s+AS\s*\(', flags=re.IGNORECASE)
+    _STATEMENT_LITERALS = re.compile(r"'(?:[^']|'')*'")
+    # Comma-separated `FROM` lists, whose items are (optionally aliased) table
+    # names or (collapsed) subqueries. Functions such as `UNNEST(...)` are not
+    # tables.
+    _STATEMENT_FROM_ITEM = (
+        r'(?:\(\)|' + _STATEMENT_QUALIFIED_NAME + r'(?![\w$.]|\s*\())'
+        r'(?:\s+(?:AS\s+)?(?!(?:WHERE|ON|USING|JOIN|INNER|LEFT|RIGHT|FULL|OUTER|CROSS|NATURAL|GROUP|ORDER|HAVING'
+        r'|LIMIT|OFFSET|FETCH|UNION|EXCEPT|INTERSECT|WINDOW|LATERAL|TABLESAMPLE|FOR|WITH|SELECT)\b)[\w$]+(?:\s*\(\))?)?'
+    )
+    _STATEMENT_FROM_LISTS = re.compile(
+        r'\bFROM\s+(' + _STATEMENT_FROM_ITEM + r'(?:\s*,\s*' + _STATEMENT_FROM_ITEM + r')+)', flags=re.IGNORECASE
+    )
+    _STATEMENT_PARENTHESES = re.compile(r'\(([^()]*[^()\s][^()]*)\)')
+    _STATEMENT_SESSION = re.compile(
+        r'^\s*(?:SET|RESET|USE|ADD\s+(?:JAR|FILE|ARCHIVE)S?'
+        r'|CREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:GLOBAL|LOCAL)\s+)?TEMP(?:ORARY)?)\b',
+        flags=re.IGNORECASE
+    )
+
+    @classmethod
+    def statement_tables(cls, statement):
+        """
+        This classmethod infers the tables read and written by an SQL statement,
+        and is used to determine the dependencies between statements when
+        executing scripts using `execute(..., dag=True)`. The inference is
+        based on simple pattern matching (of `FROM` and `JOIN` clauses, and
+        the targets of `CREATE`, `INSERT`, `DROP`, `ALTER`, etc.), and so
+        may be overly conservative (but should not miss dependencies in
+        standard SQL). If the statement's language is not to be SQL, this
+        method should be overloaded appropriately.
+
+        Parameters:
+            statement (str): The statement to be analysed.
+
+        Returns:
+            tuple<set, set>: The sets of (lower-cased, unquoted) names of the
+                tables read and written by the statement respectively.
+        """
+        statement = sqlparse.format(statement, strip_comments=True)
+        statement = cls._STATEMENT_LITERALS.sub("''", statement)
+
+        def normalise(name):
+            return re.sub(r'[`"\[\]]', '', name).lower()
+
+        writes = set(normalise(name) for name in cls._STATEMENT_WRITES.findall(statement))
+        writes.update(normalise(name) for name in cls._STATEMENT_RENAMES.findall(statement))
+        ctes = set(normalise(name) for name in cls._STATEMENT_CTES.findall(statement))
+        reads = set(normalise(name) for name in cls._STATEMENT_READS.findall(statement))
+        reads.update(normalise(name) for name in cls._statement_listed_tables(statement))
+        return reads - ctes - writes, writes
+
+    @classmethod
+    def _statement_listed_tables(cls, statement):
+        # The tables following the first item of comma-separated `FROM` lists
+        # (the first is matched by `_STATEMENT_READS`). Parenthesised
+        # expressions are analysed innermost first, and then collapsed to `()`
+        # so that lists containing subqueries can be recognised.
+        names = []
+        while True:
+            for segment in cls._STATEMENT_PARENTHESES.findall(statement) + [statement]:
+                for match in cls._STATEMENT_FROM_LISTS.finditer(segment):
+                    for item in match.group(1).split(',')[1:]:
+                        name = re.match(r'\s*' + cls._STATEMENT_TABLE_NAME, item)
+                        if name:
+                            names.append(name.group(1))
+            collapsed = cls._STATEMENT_PARENTHESES.sub('()', statement)
+            if collapsed == statement:
+                return names
+            statement = collapsed
+
+    @classmethod
+    def statement_is_session(cls, statement):
+        """
+        This classmethod determines whether an SQL statement modifies the state
+        of the session in which it is executed (such as `SET`, `USE` and `ADD
+        JAR` statements, or the creation of temporary tables and functions),
+        and whose effects are therefore not shared with other connections.
+        Scripts containing such statements are executed serially by
+        `execute(..., dag=True)`.
+
+        Parameters:
+            statement (str): The statement to be analysed.
+
+        Returns:
+            bool: Whether the statement modifies session state.
+        """
+        statement = sqlparse.format(statement, strip_comments=True)
+        return bool(cls._STATEMENT_SESSION.match(statement))
+
+    @classmethod
+    def statement_tags(cls, statement):
+        """
+        This classmethod determines the tags with which the cached results of
+        a statement are associated: the (lower-cased, unquoted) names of all
+        tables referenced by the statement, as determined by
+        `statement_tables`. These allow cached results to be invalidated when
+        the tables they depend upon are updated (see
+        `DatabaseClient.cache_invalidate`).
+
+        Parameters:
+            statement (str): The statement(s) to be analysed.
+
+        Returns:
+            list<str>: The sorted names of the tables referenced.
+        """
+        tables = set()
+        for stmt in cls.statements_split(statement):
+            reads, writes = cls.statement_tables(stmt)
+            tables.update(reads, writes)
+        return sorted(tables)
+
+    @classmethod
+    def statements_dependencies(cls, statements):
+        """
+        This classmethod infers the dependencies between a sequence of
+        statements, using the tables read and written by each statement (as
+        determined by `statement_tables`). A statement depends upon an earlier
+        statement if it reads or writes a table written by the earlier
+        statement, or if it writes a table read by the earlier statement.
+        Statements which neither read nor write any recognisable tables (such
+        as `SET` or `USE` statements) are treated as barriers: they depend
+        upon all earlier statements, and all later statements depend upon
+        them.
+
+        Parameters:
+            statements (list<str>): The statements to be analysed.
+
+        Returns:
+            list<set<int>>: For each statement, the set of indices of the
+                (earlier) statements upon which it directly depends.
+        """
+        tables = [cls.statement_tables(statement) for statement in statements]
+        dependencies = []
+        for j, (reads_j, writes_j) in enumerate(tables):
+            barrier_j = not (reads_j or writes_j)
+            deps = set()
+            for i, (reads_i, writes_i) in enumerate(tables[:j]):
+                if (
+                    barrier_j or not (reads_i or writes_i)
+                    or writes_j & (reads_i | writes_i)
+                    or reads_j & writes_i
+                ):
+                    deps.add(i)
+            dependencies.append(deps)
+        return dependencies
 
     @render_statement
     @quirk_docs('_execute')
-    def execute(self, statement, cleanup=True, async=False, cursor=None, **kwargs):
+    def execute(self, statement, cleanup=True, async=False, cursor=None, params=None, dag=False,
+                dependencies=None, parallelism=4, **kwargs):
         """
         This method executes a given statement against the relevant database,
         returning the results as a standard DBAPI2 compatible cursor. Where
@@ -179,6 +411,30 @@ class DatabaseClient(Duct, MagicsProvider):
                 results downloaded.
             cursor (DBAPI2 cursor):  Rather than creating a new cursor, execute
                 the statement against the provided cursor.
+            params (dict, list, tuple, None): Parameters to be bound to the
+                statement by the database driver (rather than rendered into
+                the statement), using the placeholder style of the driver
+                (typically `%(name)s` for dictionaries and `%s` for sequences).
+                Where supported, parameters are bound server-side (for example,
+                using prepared statements). Can only be used with a single
+                statement.
+            dag (bool): Whether to execute multiple statements as a directed
+                acyclic graph, rather than sequentially. Dependencies between
+                statements are inferred from the tables they read and write
+                (see `statements_dependencies`), and statements whose
+                dependencies have completed are executed concurrently (using
+                up to `parallelism` pooled connections where supported). Since
+                session state is not shared between these connections, scripts
+                containing session statements (see `statement_is_session`) are
+                executed serially. The timing of each statement is logged, and
+                made available as a DataFrame in `.last_execution_timings`.
+                Cannot be combined with `async` or `cursor`.
+            dependencies (dict<int, list<int>>, None): When `dag` is True,
+                explicit dependencies for statements (by their zero-indexed
+                position in the script), which override those inferred for
+                the nominated statements.
+            parallelism (int): When `dag` is True, the maximum number of
+                statements to execute concurrently (default: 4).
             **kwargs (dict): Extra keyword arguments to be passed on to
                 `_execute`, as implemented by subclasses.
             template (bool): Whether the statement should be treated as a Jinja2
@@ -188,7 +444,8 @@ class DatabaseClient(Duct, MagicsProvider):
                 `render_statement` decorator.]
 
         Returns:
-            DBAPI2 cursor: A DBAPI2 compatible cursor instance.
+            DBAPI2 cursor: A DBAPI2 compatible cursor instance (when `dag` is
+                True, that of the last statement in the script).
         """
 
         self.connect()
@@ -197,21 +454,142 @@ class DatabaseClient(Duct, MagicsProvider):
         statements = [self.statement_cleanup(stmt) if cleanup else stmt for stmt in statements]
         assert len(statements) > 0, "No non-empty statements were provided."
 
+        if params is not None:
+            if len(statements) > 1:
+                raise ValueError("Parameters can only be bound to a single statement.")
+            kwargs['params'] = params
+
+        if dag:
+            assert not async and cursor is None, "DAG execution does not support `async` or `cursor`."
+            return self._execute_dag(statements, dependencies=dependencies, parallelism=parallelism, **kwargs)
+
         for statement in statements[:-1]:
             cursor = self.connect()._execute(statement, cursor=cursor, async=False, **kwargs)
         cursor = self.connect()._execute(statements[-1], cursor=cursor, async=async, **kwargs)
 
         return cursor
 
+    def _execute_dag(self, statements, dependencies=None, parallelism=4, **kwargs):
+        graph = self.statements_dependencies(statements)
+        for index, deps in (dependencies or {}).items():
+            if not 0 <= index < len(statements):
+                raise ValueError("Dependencies specified for non-existent statement {}.".format(index))
+            graph[index] = set(deps)
+            if not all(0 <= dep < len(statements) and dep != index for dep in graph[index]):
+                raise ValueError("Invalid dependencies for statement {}: {}.".format(index, sorted(graph[index])))
+
+        # Check that the graph is acyclic before running anything
+        resolved = set()
+        while len(resolved) < len(statements):
+            ready = [i for i in range(len(statements)) if i not in resolved and graph[i] <= resolved]
+            if not ready:
+                raise ValueError("Statement dependencies contain a cycle involving statements: {}.".format(
+                    sorted(set(range(len(statements))) - resolved)))
+            resolved.update(ready)
+
+        # Session state (`SET`, `USE`, temporary tables, etc) would not be
+        # shared between pooled connections, so such scripts run serially on
+        # the client's own connection, as they would outside of DAG mode.
+        serial = any(self.statement_is_session(statement) for statement in statements)
+        if serial:
+            logger.warning("Script contains session statements; executing its statements serially.")
+            graph = [set([i - 1]) if i else set() for i in range(len(statements))]
+
+        completed = Queue()
+
+        def run(index, cursor=None):
+            start = time.time()
+            try:
+                if serial:
+                    cursor = self._execute(statements[index], cursor=cursor, async=False, **kwargs)
+                else:
+                    with self._pooled_cursor() as cursor:
+                        cursor = self._execute(statements[index], cursor=cursor, async=False, **kwargs)
+                completed.put((index, cursor, start, time.time(), None))
+            except Exception:
+                completed.put((index, None, start, time.time(), sys.exc_info()))
+
+        pending = set(range(len(statements)))
+        running = set()
+        done = set()
+        cursors = {}
+        timings = []
+        failure = None
+
+        pool = ThreadPool(max(int(parallelism), 1))
+        try:
+            logger.progress(0)
+            while pending or running:
+                if failure is None:
+                    for index in sorted(i for i in pending if graph[i] <= done):
+                        pending.remove(index)
+                        running.add(index)
+                        if serial:
+                            run(index, cursors.get(index - 1))
+                        else:
+                            pool.apply_async(run, (index,))
+                if not running:
+                    break
+                index, cursor, start, end, exc_info = completed.get()
+                running.remove(index)
+                timings.append({
+                    'statement': index,
+                    'dependencies': sorted(graph[index]),
+                    'start': pd.Timestamp.fromtimestamp(start),
+                    'end': pd.Timestamp.fromtimestamp(end),
+                    'duration': end - start,
+                    'status': 'failed' if exc_info else 'completed',
+                })
+                if exc_info:
+                    logger.error("Statement {} failed after {:.2f} seconds.".format(index, end - start))
+                    failure = failure or exc_info
+                    continue
+                logger.info("Statement {} completed in {:.2f} seconds.".format(index, end - start))
+                done.add(index)
+                cursors[index] = cursor
+                logger.progress(100. * len(done) / len(statements))
+        finally:
+            pool.close()
+            pool.join()
+            self.last_execution_timings = pd.DataFrame(
+                timings, columns=['statement', 'dependencies', 'start', 'end', 'duration', 'status']
+            ).set_index('statement').sort_index()
+
+        if failure is not None:
+            if pending:
+                logger.warning("Skipped {} statement(s) due to failure: {}.".format(len(pending), sorted(pending)))
+            six.reraise(*failure)
+        logger.progress(100, complete=True)
+
+        return cursors[len(statements) - 1]
+
+    @contextmanager
+    def _pooled_cursor(self):
+        """
+        This context manager provides the cursor to be used by a worker thread
+        when executing statements concurrently (see `execute(..., dag=True)`),
+        and may be overridden by subclasses whose connections cannot safely be
+        shared between threads. Yielding `None` (the default) allows `_execute`
+        to create a new cursor from the shared connection.
+        """
+        yield None
+
     @logging_scope("Query", timed=True)
     @render_statement
     @cached_method(
-        id_str=lambda self, kwargs: "{}:\n{}".format(kwargs['format'], self.statement_hash(kwargs['statement'], cleanup=kwargs.get('cleanup', True))),
+        id_str=lambda self, kwargs: "{}:\n{}{}".format(
+            kwargs['format'],
+            self.statement_hash(kwargs['statement'], cleanup=kwargs.get('cleanup', True)),
+            '' if kwargs.get('params') is None else ':\n{}'.format(self.params_hash(kwargs['params']))
+        ),
         format=lambda self, kwargs: kwargs['format'] if kwargs['format'] is not None else self.DEFAULT_CURSOR_FORMATTER,
+        use_cache=lambda self, kwargs: kwargs.pop('use_cache', True) and kwargs.get('max_memory') is None,
+        tags=lambda self, kwargs: self.statement_tags(kwargs['statement']),
         serializer=cache_serializer,
         deserializer=cache_deserializer
     )
-    def query(self, statement, format=None, format_opts={}, **kwargs):
+    def query(self, statement, format=None, format_opts={}, max_memory=None, max_cost=None,
+              max_cost_action='raise', **kwargs):
         """
         This method executes a statement against the database using
         `DatabaseClient.execute()`, and then collects the results before
@@ -222,11 +600,29 @@ class DatabaseClient(Duct, MagicsProvider):
             statement (str): The statement to be executed by the query client
                 (possibly templated).
             format (str): A subclass of CursorFormatter, or one of: 'pandas',
-                'hive', 'csv', 'tuple' or 'dict'. Defaults to
-                `self.DEFAULT_CURSOR_FORMATTER`.
+                'hive', 'csv', 'tuple', 'dict', 'record' or 'columnar'.
+                Defaults to `self.DEFAULT_CURSOR_FORMATTER`.
             format_opts (dict): A dictionary of format-specific options.
+            max_memory (int, None): If not `None`, the (approximate) maximum
+                number of bytes of results to hold in memory. Results that
+                exceed this budget are spilled to temporary files in batches,
+                and a `SpilledResult` handle is returned instead, which can be
+                iterated over (one batch at a time) or loaded using `.load()`.
+                Results are never cached when `max_memory` is specified.
+            max_cost (int, dict, None): If not `None`, the maximum estimated
+                cost of the query (as estimated by `DatabaseClient.explain()`)
+                before it is executed, specified as a number of bytes or as a
+                dictionary with 'rows' and/or 'bytes' keys. Estimates are only
+                computed if results are not already cached. Costs which cannot
+                be estimated are treated as exceeding the budget.
+            max_cost_action (str): What to do if the estimated cost of the
+                query exceeds `max_cost`: 'raise' (default) to refuse to run
+                the query (raising `DuctQueryCostExceeded`), or 'warn' to log a
+                warning and run the query anyway.
             **kwargs (dict): Additional arguments to pass on to
-                `DatabaseClient.execute()`.
+                `DatabaseClient.execute()`, including `params` (parameters to
+                be bound to the statement by the driver, which also form part
+                of the cache key).
             use_cache (bool): True (default) or False. Whether to use the cache
                 (if present). [Used by `cached_method` decorator.]
             renew (bool): True or False (default). If cache is being used, renew
@@ -234,8 +630,12 @@ class DatabaseClient(Duct, MagicsProvider):
                 decorator.]
 
         Returns:
-            The results of the query formatted as nominated.
+            The results of the query formatted as nominated (or, if spilled to
+            disk, a `SpilledResult` instance).
         """
+        if max_cost is not None:
+            self._check_cost(statement, max_cost, action=max_cost_action, params=kwargs.get('params'))
+
         cursor = self.execute(statement, async=False, template=False, **kwargs)
 
         # Some DBAPI2 cursor implementations error if attempting to extract
@@ -244,7 +644,7 @@ class DatabaseClient(Duct, MagicsProvider):
             return None
 
         formatter = self._get_formatter(format, cursor, **format_opts)
-        return formatter.dump()
+        return formatter.dump(max_memory=max_memory)
 
     def stream(self, statement, format=None, format_opts={}, batch=None, **kwargs):
         """
@@ -256,8 +656,8 @@ class DatabaseClient(Duct, MagicsProvider):
         Parameters:
             statement (str): The statement to be executed against the database.
             format (str): A subclass of CursorFormatter, or one of: 'pandas',
-                'hive', 'csv', 'tuple' or 'dict'. Defaults to
-                `self.DEFAULT_CURSOR_FORMATTER`.
+                'hive', 'csv', 'tuple', 'dict', 'record' or 'columnar'.
+                Defaults to `self.DEFAULT_CURSOR_FORMATTER`.
             format_opts (dict): A dictionary of format-specific options.
             batch (int): If not `None`, the number of rows from the resulting
                 cursor to be returned at once.
@@ -274,12 +674,264 @@ class DatabaseClient(Duct, MagicsProvider):
         for row in formatter.stream(batch=batch):
             yield row
 
-    def _get_formatter(self, formatter, cursor, **kwargs):
+    @render_statement
+    def query_preview(self, statement, n=10, sample=None, **kwargs):
+        """
+        This method returns a preview of the results of a query, by limiting
+        (and optionally sampling) the results of the statement server-side
+        rather than retrieving and truncating its full results. Previews are
+        cached independently of the full results of the statement.
+
+        Parameters:
+            statement (str): The statement for which results should be
+                previewed. If multiple statements are provided, only the
+                results of the last are limited.
+            n (int, None): The maximum number of rows to return (default: 10).
+                If `None`, no limit is applied.
+            sample (float, None): If not `None`, the percentage of rows (0-100)
+                to randomly sample prior to limiting the results, where
+                supported by the database.
+            **kwargs (dict): Additional arguments to pass on to
+                `DatabaseClient.query()`.
+
+        Returns:
+            The first `n` rows of the (sampled) results of the query, formatted
+            as nominated.
+        """
+        return self.query(self._statement_preview(statement, n=n, sample=sample), template=False, **kwargs)
+
+    @render_statement
+    def query_count(self, statement, sample=None, **kwargs):
+        """
+        This method counts the number of rows returned by a query without
+        retrieving them. If `sample` is specified, an approximate count is
+        computed by counting the rows of a random sample of the results (where
+        supported by the database), and scaling up accordingly; which can be
+        much cheaper for large results.
+
+        Parameters:
+            statement (str): The statement for which rows should be counted.
+            sample (float, None): If not `None`, the percentage of rows (0-100)
+                to sample when approximating the number of rows.
+            **kwargs (dict): Additional arguments to pass on to
+                `DatabaseClient.query()`. Any `format` passed is ignored, since
+                the count is always retrieved as a tuple.
+
+        Returns:
+            int: The (approximate) number of rows returned by the query.
+        """
+        kwargs.pop('format', None)
+        rows = self.query(
+            self._statement_preview(statement, n=None, sample=sample, select='COUNT(*)'),
+            format='tuple', template=False, **kwargs
+        )
+        count = rows[0][0] if rows else 0
+        if sample is not None:
+            count = count * 100. / sample
+        return int(round(count))
+
+    def _statement_preview(self, statement, n=None, sample=None, select='*'):
+        statements = [self.statement_cleanup(stmt) for stmt in self.statements_split(statement)]
+        assert len(statements) > 0, "No non-empty statements were provided."
+        preview = "SELECT {} FROM {}".format(select, self._statement_sampled_relation(statements[-1], sample=sample))
+        if n is not None:
+            preview += "\nLIMIT {}".format(int(n))
+        return ';\n'.join(statements[:-1] + [preview])
+
+    def _statement_sampled_relation(self, statement, sample=None):
+        """
+        This method should return a relation (suitable for use in a `FROM`
+        clause) over the results of `statement`, randomly sampling `sample`
+        percent of its rows if `sample` is not `None`. Subclasses should
+        override this method if the database supports sampling.
+        """
+        if sample is not None:
+            raise NotImplementedError("`{}` does not support sampling of query results.".format(self.__class__.__name__))
+        return "(\n{}\n) omniduct_preview".format(statement)
+
+    @render_statement
+    @quirk_docs('_explain')
+    def explain(self, statement, params=None, **kwargs):
+        """
+        This method asks the database to plan a statement (without executing
+        it), and returns the plan along with estimates of the number of rows
+        and bytes that would be read from tables in order to execute it, which
+        can be used to catch expensive queries (such as accidental full table
+        scans) before they are run.
+
+        Parameters:
+            statement (str): The statement to be explained (possibly
+                templated). If multiple statements are provided, only the last
+                is explained.
+            params (dict, list, tuple, None): Parameters to be bound to the
+                statement (as for `DatabaseClient.execute()`).
+            **kwargs (dict): Additional arguments to pass on to
+                `DatabaseClient._explain()`.
+
+        Returns:
+            dict: A dictionary with keys 'plan' (the plan as reported by the
+                database), 'rows' and 'bytes' (the estimated number of rows and
+                bytes read by the query, or `None` if not known).
+        """
+        statements = list(self.statements_split(statement))
+        assert len(statements) > 0, "No non-empty statements were provided."
+        if params is not None:
+            kwargs['params'] = params
+        return self.connect()._explain(statements[-1], **kwargs)
+
+    def _explain(self, statement, **kwargs):
+        raise NotImplementedError("`{}` does not support estimating query costs.".format(self.__class__.__name__))
+
+    def _check_cost(self, statement, max_cost, action='raise', params=None):
+        assert action in ('raise', 'warn'), "`max_cost_action` must be one of 'raise' or 'warn'."
+        if not isinstance(max_cost, dict):
+            max_cost = {'bytes': max_cost}
+        cost = self.explain(statement, params=params, template=False)
+
+        # Unknown estimates (`None`) cannot be shown to be within budget
+        excess = [
+            "{} {} (limit: {})".format('unknown' if cost.get(key) is None else cost[key], key, limit)
+            for key, limit in sorted(max_cost.items())
+            if limit is not None and (cost.get(key) is None or cost[key] > limit)
+        ]
+        if not excess:
+            return
+        message = "Estimated query cost exceeds budget: {}.".format(', '.join(excess))
+        if action == 'raise':
+            raise DuctQueryCostExceeded(message)
+        logger.warning(message)
+
+    @logging_scope("Incremental Query", timed=True)
+    def query_incremental(self, statement, watermark_column, key=None, context=None,
+                          initial_watermark=None, renew=False, **kwargs):
+        """
+        This method incrementally refreshes the results of a query against
+        append-only (or update-timestamped) data. The statement is rendered as
+        a template with an additional `watermark` context variable, which is
+        the greatest value of `watermark_column` previously retrieved (or
+        `initial_watermark` if no results have been cached), and should be
+        used by the statement to restrict results to new rows; for example:
+        ```
+        SELECT *
+        FROM events
+        {% if watermark is not none %}WHERE updated_at > '{{ watermark }}'{% endif %}
+        ```
+        New rows are merged into the previously retrieved rows (deduplicating
+        on `key`, keeping the most recent version of each row), and the merged
+        results are stored in the cache along with the new watermark. If no
+        cache is configured, the full results are queried on every call. If
+        this client is offline (see `Duct.offline`), the previously merged
+        results are returned from the cache without querying for new rows.
+
+        Parameters:
+            statement (str): The statement template to be executed.
+            watermark_column (str): The column whose maximum value is used as
+                the watermark for subsequent queries.
+            key (str, list<str>, None): The column(s) uniquely identifying
+                rows, used to deduplicate updated rows. If not specified, new
+                rows are simply appended.
+            context (dict, None): Additional context in which to render the
+                statement template. Results are cached separately for each
+                distinct context.
+            initial_watermark (object): The watermark to use when no results
+                have been cached (default: None).
+            renew (bool): Whether to ignore any cached results and watermark,
+                and refresh all results (default: False).
+            **kwargs (dict): Additional arguments to pass on to
+                `DatabaseClient.query()`.
+
+        Returns:
+            pandas.DataFrame: The merged results of the query.
+        """
+        cache = self.cache
+        id_duct = "{}.{}".format(self.__class__.__name__, self.name)
+        id_str = "incremental:{}:{}:{}:\n{}".format(
+            watermark_column, key,
+            self.params_hash({k: v for k, v in (context or {}).items() if k != 'watermark'}),
+            self.statement_hash(statement, cleanup=kwargs.get('cleanup', True))
+        )
+
+        cached = None
+        if cache is not None and not renew and cache.has_key(id_duct, id_str):  # noqa: has_key is not of a dictionary here
+            cached = cache.get(id_duct, id_str)
+        watermark = cached['watermark'] if cached is not None else initial_watermark
+
+        if self.offline:
+            if cached is None:
+                raise DuctOffline("`{}` is offline, and no cached incremental results are available.".format(self.name))
+            return cached['data']
+
+        context = dict(context or {}, watermark=watermark)
+        rows = self.query(
+            self.template_render(statement, context=context),
+            format='pandas', template=False, use_cache=False, **kwargs
+        )
+
+        if cached is None:
+            data = rows
+        elif rows is None or len(rows) == 0:
+            logger.info("No rows found past watermark: {}.".format(watermark))
+            return cached['data']
+        else:
+            logger.info("Merging {} new rows past watermark: {}.".format(len(rows), watermark))
+            data = pd.concat([cached['data'], rows], ignore_index=True)
+            if key is not None:
+                data = data.drop_duplicates(subset=key, keep='last').reset_index(drop=True)
+
+        if data is not None and len(data) > 0:
+            watermark = data[watermark_column].max()
+
+        if cache is not None:
+            try:
+                cache.set(id_duct, id_str, {'watermark': watermark, 'data': data},
+                          tags=self.statement_tags(statement))
+            except Exception:
+                cache.clear(id_duct, id_str)
+                logger.warning("Failed to save incremental results to cache.")
+                if config.cache_fail_hard:
+                    raise
+
+        return data
+
+    def cache_invalidate(self, tables):
+        """
+        This method removes the cached results of all queries which referenced
+        any of the nominated tables (leaving all other cached results intact),
+        and is intended to be called whenever tables (or their partitions) are
+        rebuilt; for example, from a handler of the partition-update events
+        published by a metastore. Results cached by less qualified references
+        to a table (e.g. `table` rather than `schema.table`) are also removed,
+        as are those cached by more qualified references (e.g.
+        `catalog.schema.table`).
+
+        Parameters:
+            tables (list<str>): The names of the tables which have been updated.
+
+        Returns:
+            int: The number of cached results removed.
+        """
+        if self.cache is None:
+            return 0
+        id_duct = "{}.{}".format(self.__class__.__name__, self.name)
+        names, unqualified = set(), set()
+        for table in tables:
+            parts = re.sub(r'[`"\[\]]', '', table).lower().split('.')
+            names.add('.'.join(parts))
+            unqualified.update('.'.join(parts[i:]) for i in range(1, len(parts)))
+        return (
+            self.cache.invalidate(sorted(names), id_duct=id_duct, qualified=True)
+            + self.cache.invalidate(sorted(unqualified - names), id_duct=id_duct)
+        )
+
+    def _get_formatter_class(self, formatter):
         formatter = formatter or self.DEFAULT_CURSOR_FORMATTER
         if not (inspect.isclass(formatter) and issubclass(formatter, cursor_formatters.CursorFormatter)):
             assert formatter in self.CURSOR_FORMATTERS, "Invalid format '{}'. Choose from: {}".format(formatter, ','.join(self.CURSOR_FORMATTERS.keys()))
             formatter = self.CURSOR_FORMATTERS[formatter]
-        return formatter(cursor, **kwargs)
+        return formatter
+
+    def _get_formatter(self, formatter, cursor, **kwargs):
+        return self._get_formatter_class(formatter)(cursor, **kwargs)
 
     def stream_to_file(self, statement, file, format='csv', **kwargs):
         """
@@ -367,6 +1019,7 @@ class DatabaseClient(Duct, MagicsProvider):
             PrestoClient: A reference to this object.
         """
         self._templates[name] = body
+        self.__template_expansions.clear()
         return self
 
     def template_render(self, name_or_statement, context=None, by_name=False):
@@ -438,18 +1091,66 @@ class DatabaseClient(Duct, MagicsProvider):
                 .format(intersection)
             )
 
-        # Substitute in any other named statements recursively
-        while '{{{' in statement or '{{%' in statement:
-            statement = Template(statement,
-                                 block_start_string='{{%',
-                                 block_end_string='%}}',
-                                 variable_start_string='{{{',
-                                 variable_end_string='}}}',
-                                 comment_start_string='{{#',
-                                 comment_end_string='#}}',
-                                 undefined=StrictUndefined).render(getattr(self, '_templates', {}))
+        return self._template_get(self._template_expand(statement)).render(template_context)
 
-        return Template(statement, undefined=StrictUndefined).render(template_context)
+    @property
+    def _template_envs(self):
+        # Environments have no loader, so that templates cannot include or
+        # extend other templates (which are instead embedded by name using the
+        # meta-templating syntax).
+        if self.__template_envs is None:
+            options = dict(undefined=StrictUndefined)
+            self.__template_envs = (
+                Environment(**options),
+                Environment(
+                    block_start_string='{{%',
+                    block_end_string='%}}',
+                    variable_start_string='{{{',
+                    variable_end_string='}}}',
+                    comment_start_string='{{#',
+                    comment_end_string='#}}',
+                    **options
+                )
+            )
+        return self.__template_envs
+
+    def _template_get(self, body, meta=False):
+        """
+        Compiled templates are cached (keyed by template body), and their
+        bytecode shared via the bytecode cache, if configured.
+        """
+        key = (meta, body)
+        template = self.__template_compiled.get(key)
+        if template is None:
+            env = self._template_envs[1 if meta else 0]
+            bcc = self._template_bytecode_cache
+            if bcc is None:
+                template = env.from_string(body)
+            else:
+                bucket = bcc.get_bucket(env, body, None, body)
+                if bucket.code is None:
+                    bucket.code = env.compile(body)
+                    bcc.set_bucket(bucket)
+                template = env.template_class.from_code(env, bucket.code, env.make_globals(None))
+            self.__template_compiled[key] = template
+        return template
+
+    def _template_expand(self, statement):
+        """
+        Substitute in any other named statements recursively. Expansions depend
+        only on the statement and the named templates, and so are cached until
+        templates are next added.
+        """
+        if '{{{' not in statement and '{{%' not in statement:
+            return statement
+        if statement not in self.__template_expansions:
+            expanded = statement
+            while '{{{' in expanded or '{{%' in expanded:
+                expanded = self._template_get(expanded, meta=True).render(self._templates)
+            if len(self.__template_expansions) >= self.TEMPLATE_CACHE_SIZE:
+                self.__template_expansions.clear()
+            self.__template_expansions[statement] = expanded
+        return self.__template_expansions[statement]
 
     def execute_from_template(self, name, context=None, **kwargs):
         """
@@ -502,7 +1203,7 @@ class DatabaseClient(Duct, MagicsProvider):
                 table, and 'append' to add data from this table into the
                 existing table.
             **kwargs (dict): Additional keyword arguments to pass onto
-                `QueryClient._push`.
+                `DatabaseClient._push`.
         """
         assert if_exists in {'fail', 'replace', 'append'}
         self.connect()._push(df, table, if_exists=if_exists, **kwargs)
@@ -516,6 +1217,36 @@ class DatabaseClient(Duct, MagicsProvider):
     def _push(self, df, table, if_exists='fail', **kwargs):
         raise NotImplementedError
 
+    def _push_batched(self, df, table, engine, if_exists='fail', schema=None, batch_size=None, **kwargs):
+        """
+        Push `df` into `table` via `pandas.DataFrame.to_sql` and the SQLAlchemy
+        `engine`, inserting `batch_size` rows at a time using multi-row
+        `INSERT ... VALUES` statements (where supported by the installed version
+        of pandas), and reporting progress as each batch completes. If not
+        specified, `batch_size` defaults to `PUSH_BATCH_ROWS`, reduced as
+        necessary so that batches have no more than `PUSH_BATCH_PARAMS` values.
+        Additional keyword arguments are passed on to `pandas.DataFrame.to_sql`.
+        """
+        if batch_size is None:
+            batch_size = self.PUSH_BATCH_ROWS
+            if self.PUSH_BATCH_PARAMS:
+                batch_size = min(batch_size, self.PUSH_BATCH_PARAMS // max(len(df.columns), 1))
+        batch_size = max(int(batch_size), 1)
+
+        if LooseVersion(pd.__version__) >= LooseVersion('0.24.0'):
+            kwargs.setdefault('method', 'multi')
+
+        offsets = list(range(0, len(df), batch_size)) or [0]
+        logger.progress(0)
+        for i, offset in enumerate(offsets):
+            df.iloc[offset:offset + batch_size].to_sql(
+                name=table, con=engine, index=False, schema=schema,
+                if_exists=if_exists if i == 0 else 'append',
+                chunksize=batch_size, **kwargs
+            )
+            logger.progress(100. * (i + 1) / len(offsets))
+        logger.progress(100, complete=True)
+
     def _cursor_empty(self, cursor):
         return False
 
@@ -542,6 +1273,90 @@ class DatabaseClient(Duct, MagicsProvider):
     def _table_exists(self, table, **kwargs):
         pass
 
+    @quirk_docs('_tables_exist')
+    def tables_exist(self, tables, **kwargs):
+        """
+        Check whether each of many tables exists, using as few round trips to
+        the database as the client supports. Additional kwargs are passed to
+        `DatabaseClient._tables_exist`.
+
+        Parameters:
+            tables (iterable<str>): The names of the tables to check (which may
+                be qualified by schema, as in "<schema>.<table>").
+
+        Returns:
+            pandas.Series: A boolean series indexed by table name.
+        """
+        tables = list(tables)
+        return pd.Series(self._tables_exist(tables, **kwargs), index=tables, dtype=bool)
+
+    def _tables_exist(self, tables, **kwargs):
+        """
+        Subclasses should override this method to check the existence of
+        multiple tables in bulk, returning a dictionary mapping table names to
+        booleans. By default, each table is checked using `_table_exists`.
+        """
+        return {table: self._table_exists(table=table, **kwargs) for table in tables}
+
+    @quirk_docs('_tables_desc')
+    def tables_desc(self, tables, **kwargs):
+        """
+        Describe many tables in the data source, using as few round trips to
+        the database as the client supports. Additional kwargs are passed to
+        `DatabaseClient._tables_desc`.
+
+        Parameters:
+            tables (iterable<str>): The names of the tables to describe.
+
+        Returns:
+            OrderedDict<str, pandas.DataFrame>: A mapping from table name to a
+                dataframe of table fields and descriptors (as returned by
+                `.table_desc`).
+        """
+        tables = list(tables)
+        descs = self._tables_desc(tables, **kwargs)
+        return OrderedDict((table, descs[table]) for table in tables)
+
+    def _tables_desc(self, tables, **kwargs):
+        """
+        Subclasses should override this method to describe multiple tables in
+        bulk, returning a dictionary mapping table names to dataframes. By
+        default, each table is described using `_table_desc`.
+        """
+        return {table: self._table_desc(table, **kwargs) for table in tables}
+
+    @classmethod
+    def _table_name_split(cls, table, schema=None):
+        """
+        Split a (possibly schema-qualified and quoted) table name into its
+        schema (falling back to `schema`) and table name components.
+        """
+        parts = [part.strip('`"[]') for part in table.split('.')]
+        return (parts[-2] if len(parts) > 1 else schema), parts[-1]
+
+    @classmethod
+    def _sql_literal(cls, value):
+        return "'{}'".format(value.replace("'", "''"))
+
+    @classmethod
+    def _table_names_predicate(cls, names, schema_column='table_schema', table_column='table_name'):
+        """
+        Render an SQL predicate (suitable for filtering `information_schema`
+        relations) matching any of the nominated (schema, table) tuples, where
+        a schema of `None` matches tables in any schema.
+        """
+        by_schema = {}
+        for schema, table in names:
+            by_schema.setdefault(schema, set()).add(table)
+        return ' OR '.join(
+            '({}{} IN ({}))'.format(
+                '' if schema is None else '{} = {} AND '.format(schema_column, cls._sql_literal(schema)),
+                table_column,
+                ', '.join(cls._sql_literal(table) for table in sorted(tables))
+            )
+            for schema, tables in sorted(by_schema.items(), key=lambda item: str(item[0]))
+        )
+
     @quirk_docs('_table_desc')
     def table_desc(self, table, **kwargs):
         """
@@ -607,7 +1422,8 @@ class DatabaseClient(Duct, MagicsProvider):
         """
         from IPython.core.magic import register_line_magic, register_cell_magic, register_line_cell_magic
 
-        def statement_executor_magic(executor, statement, variable=None, show='head', transpose=False, template=True, context=None, **kwargs):
+        def statement_executor_magic(executor, statement, variable=None, show='head', transpose=False, template=True, context=None,
+                                     preview=False, sample=None, **kwargs):
 
             ip = get_ipython()
 
@@ -619,7 +1435,12 @@ class DatabaseClient(Duct, MagicsProvider):
                 return self.query_from_template(variable, context=context, **kwargs)
 
             # Cell magic
-            result = getattr(self, executor)(statement, template=template, context=context, **kwargs)
+            if executor == 'query' and (preview or sample is not None):
+                # Limit (and/or sample) results server-side rather than retrieving all of them
+                n = 10 if preview is True else (int(preview) if preview else None)
+                result = self.query_preview(statement, n=n, sample=sample, template=template, context=context, **kwargs)
+            else:
+                result = getattr(self, executor)(statement, template=template, context=context, **kwargs)
 
             if variable is not None:
                 ip.user_ns[variable] = result
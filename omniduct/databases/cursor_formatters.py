@@ -1,15 +1,89 @@
 import csv
+import decimal
 import io
+import os
 import pickle
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict, namedtuple
 
 import pandas as pd
+import six
 from distutils.version import LooseVersion
 
+from omniduct.utils.debug import logger
+
+# Mapping from (normalised) DBAPI2 `cursor.description` type codes to the
+# coercions applied by `PandasCursorFormatter`. Type codes are lower-cased,
+# stripped of any parameters (e.g. 'decimal(10,2)') and of the '_type' suffix
+# used by HiveServer2 (e.g. 'TIMESTAMP_TYPE').
+COLUMN_TYPE_COERCIONS = {
+    'timestamp': 'timestamp',
+    'timestamp with time zone': 'timestamp',
+    'date': 'date',
+    'decimal': 'decimal',
+    'boolean': 'boolean',
+}
+
+
+def _coerce_timestamp(values, format=None):
+    return pd.to_datetime(values, format=format)
+
+
+def _coerce_date(values, format=None):
+    values = pd.to_datetime(values, format=format)
+    return values.dt.normalize() if isinstance(values, pd.Series) else values.normalize()
+
+
+def _coerce_decimal(values, format=None):
+    # Decimals are only converted to floats if every value survives the
+    # conversion exactly; otherwise they are left as (object) `Decimal`s.
+    if isinstance(values, pd.Series):
+        if values.dtype != object or not all(_decimal_is_float(v) for v in values):
+            return values
+        return pd.to_numeric(values)
+    return pd.to_numeric(values) if _decimal_is_float(values) else values
+
+
+def _decimal_is_float(value):
+    if value is None or isinstance(value, float):
+        return True
+    try:
+        value = decimal.Decimal(value)
+    except (decimal.InvalidOperation, TypeError, ValueError):
+        return True  # Not a decimal; leave to `pandas.to_numeric`
+    return not value.is_finite() or decimal.Decimal(repr(float(value))) == value
+
+
+def _coerce_boolean(values, format=None):
+    mapping = {'true': True, 'false': False, '1': True, '0': False}
+    if isinstance(values, pd.Series):
+        if values.dtype != object:
+            return values
+        return values.map(lambda v: mapping.get(v.lower(), v) if isinstance(v, six.string_types) else v)
+    if isinstance(values, six.string_types):
+        return mapping.get(values.lower(), values)
+    return values
+
+
+# Coercion functions accept either a `pandas.Series` (vectorised) or a scalar.
+COERCION_FUNCTIONS = {
+    'timestamp': _coerce_timestamp,
+    'date': _coerce_date,
+    'decimal': _coerce_decimal,
+    'boolean': _coerce_boolean,
+}
+
 
 class CursorFormatter(object):
 
+    SPILL_BATCH_SIZE = 10000
+
     def __init__(self, cursor, **kwargs):
         self.cursor = cursor
+        self._column_names = None
+        self._column_formats = None
         self.init(**kwargs)
 
     def init(self):
@@ -17,13 +91,19 @@ class CursorFormatter(object):
 
     @property
     def column_names(self):
-        return [c[0] for c in self.cursor.description]
+        if self._column_names is None:
+            self._column_names = [c[0] for c in self.cursor.description]
+        return self._column_names
 
     @property
     def column_formats(self):
-        return [c[1] for c in self.cursor.description]
+        if self._column_formats is None:
+            self._column_formats = [c[1] for c in self.cursor.description]
+        return self._column_formats
 
-    def dump(self):
+    def dump(self, max_memory=None):
+        if max_memory is not None:
+            return self._dump_bounded(max_memory)
         try:
             data = [self.prepare_row(row) for row in self.cursor.fetchall()]
             out = self.format_dump(data)
@@ -31,6 +111,35 @@ class CursorFormatter(object):
             self.cursor.close()
         return out
 
+    def _dump_bounded(self, max_memory):
+        batches = []
+        size = 0
+        spilled = None
+        try:
+            for data in self.stream(batch=self.SPILL_BATCH_SIZE):
+                if spilled is not None:
+                    spilled.append(data)
+                    continue
+                batches.append(data)
+                size += self.estimate_size(data)
+                if size > max_memory:
+                    logger.warning(
+                        "Query results exceed `max_memory` ({} bytes), and so are being "
+                        "spilled to disk. A `SpilledResult` handle will be returned instead."
+                        .format(max_memory)
+                    )
+                    spilled = SpilledResult(self)
+                    for batch in batches:
+                        spilled.append(batch)
+                    batches = []
+        except Exception:
+            if spilled is not None:
+                spilled.cleanup()
+            raise
+        if spilled is not None:
+            return spilled
+        return self.concat(batches) if batches else self.format_dump([])
+
     def stream(self, batch=None):
         try:
             if batch is not None:
@@ -55,6 +164,18 @@ class CursorFormatter(object):
     def format_row(self, row):
         raise NotImplementedError("{} does not support formatting streaming data.".format(self.__class__.__name__))
 
+    def concat(self, batches):
+        return [row for batch in batches for row in batch]
+
+    def estimate_size(self, formatted_data):
+        if isinstance(formatted_data, six.string_types):
+            return sys.getsizeof(formatted_data)
+        size = sys.getsizeof(formatted_data)
+        for row in formatted_data:
+            values = row.values() if isinstance(row, dict) else row
+            size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+        return size
+
     @classmethod
     def serialize(cls, formatted_data, fh):
         return pickle.dump(formatted_data, fh)
@@ -66,21 +187,77 @@ class CursorFormatter(object):
 
 class PandasCursorFormatter(CursorFormatter):
 
-    def init(self, index_fields=None, date_fields=None):
+    def init(self, index_fields=None, date_fields=None, coerce_types=True, column_types=None):
+        """
+        index_fields (str, list<str>): The column(s) to use as the index of the
+            resulting DataFrame.
+        date_fields (list<str>, dict<str, str>): Column names to parse as
+            timestamps or, if a dictionary, a mapping from column names to the
+            `strftime` format with which they should be parsed.
+        coerce_types (bool): Whether to automatically coerce timestamp, date,
+            decimal and boolean columns using the type codes in
+            `cursor.description` (default: True). Decimal columns are only
+            converted to floats if this is lossless for every value (i.e. the
+            precision and scale of the values fit within a float64); otherwise
+            they are left as columns of `Decimal` objects.
+        column_types (dict<str, str>): Per-column overrides of the coercion to
+            apply; values should be one of 'timestamp', 'date', 'decimal',
+            'boolean', or `None` to disable coercion for that column.
+        """
         self.index_fields = index_fields
         self.date_fields = date_fields
+        self.coerce_types = coerce_types
+        self.column_types = column_types or {}
+        self._coercions = None
+
+    @property
+    def coercions(self):
+        """
+        list<tuple>: A list of (column index, column name, coercion, format)
+        tuples describing the coercions to be applied to the columns of this
+        cursor. This is computed once per cursor.
+        """
+        if self._coercions is None:
+            date_fields = self.date_fields or {}
+            if not isinstance(date_fields, dict):
+                date_fields = {field: None for field in date_fields}
+
+            coercions = []
+            for i, (name, type_code) in enumerate(zip(self.column_names, self.column_formats)):
+                if name in self.column_types:
+                    coercion = self.column_types[name]
+                elif name in date_fields:
+                    coercion = 'timestamp'
+                elif self.coerce_types:
+                    coercion = self._coercion_for_type_code(type_code)
+                else:
+                    coercion = None
+                if coercion is not None:
+                    assert coercion in COERCION_FUNCTIONS, "Invalid column type '{}'. Choose from: {}".format(coercion, ','.join(COERCION_FUNCTIONS))
+                    coercions.append((i, name, coercion, date_fields.get(name)))
+            self._coercions = coercions
+        return self._coercions
+
+    @classmethod
+    def _coercion_for_type_code(cls, type_code):
+        if not isinstance(type_code, six.string_types):
+            return None
+        type_code = type_code.lower().split('(')[0].strip()
+        if type_code.endswith('_type'):
+            type_code = type_code[:-len('_type')]
+        return COLUMN_TYPE_COERCIONS.get(type_code)
 
     def format_dump(self, data):
         import pandas as pd
 
         df = pd.DataFrame(data=data, columns=self.column_names)
 
-        if self.date_fields is not None:
+        for _, name, coercion, format in self.coercions:
             try:
-                df = pd.io.sql._parse_date_columns(df, self.date_fields)
+                df[name] = COERCION_FUNCTIONS[coercion](df[name], format=format)
             except Exception as e:
-                logger.warning('Unable to parse date columns. Perhaps your version of pandas is outdated.'
-                               'Original error message was: {}: {}'.format(e.__class__.__name__, str(e)))
+                logger.warning('Unable to coerce column `{}` to {}. Original error message was: {}: {}'
+                               .format(name, coercion, e.__class__.__name__, str(e)))
 
         if self.index_fields is not None:
             df.set_index(self.index_fields, inplace=True)
@@ -90,10 +267,25 @@ class PandasCursorFormatter(CursorFormatter):
     def format_row(self, row):
         import pandas as pd
 
-        # TODO: Handle parsing of date fields
+        row = list(row)
+        for i, name, coercion, format in self.coercions:
+            if row[i] is None:
+                continue
+            try:
+                row[i] = COERCION_FUNCTIONS[coercion](row[i], format=format)
+            except Exception as e:
+                logger.warning('Unable to coerce column `{}` to {}. Original error message was: {}: {}'
+                               .format(name, coercion, e.__class__.__name__, str(e)))
 
         return pd.Series(row, index=self.column_names)
 
+    def concat(self, batches):
+        import pandas as pd
+        return pd.concat(batches, ignore_index=self.index_fields is None)
+
+    def estimate_size(self, formatted_data):
+        return formatted_data.memory_usage(index=True, deep=True).sum()
+
     @classmethod
     def serialize(cls, formatted_data, fh):
         # compat: if pandas is old, to_pickle does not accept file handles
@@ -116,6 +308,83 @@ class DictCursorFormatter(CursorFormatter):
         return dict(zip(self.column_names, row))
 
 
+class ColumnarCursorFormatter(CursorFormatter):
+    """
+    Formats results column-wise, as an ordered dictionary mapping column names
+    to lists of values, which avoids constructing a container per row. This is
+    convenient for results whose values are not naturally tabular (such as the
+    nodes and relationships returned by graph queries). Streamed rows are
+    formatted as ordered dictionaries.
+    """
+
+    def format_dump(self, data):
+        columns = OrderedDict((name, []) for name in self.column_names)
+        appenders = [values.append for values in columns.values()]
+        for row in data:
+            for append, value in zip(appenders, row):
+                append(value)
+        return columns
+
+    def format_row(self, row):
+        return OrderedDict(zip(self.column_names, row))
+
+    def concat(self, batches):
+        columns = OrderedDict((name, []) for name in self.column_names)
+        for batch in batches:
+            for name, values in batch.items():
+                columns[name].extend(values)
+        return columns
+
+    def estimate_size(self, formatted_data):
+        return sys.getsizeof(formatted_data) + sum(
+            sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+            for values in formatted_data.values()
+        )
+
+
+class RecordCursorFormatter(CursorFormatter):
+    """
+    Formats rows as lightweight `namedtuple` records, with the record class
+    (and hence column metadata) generated once per cursor and shared by all
+    rows. Column names that are not valid Python identifiers are renamed
+    positionally (e.g. '_1'), but values remain accessible by index.
+    """
+
+    def init(self, name='Record'):
+        self.name = name
+        self._record_class = None
+
+    @property
+    def record_class(self):
+        if self._record_class is None:
+            self._record_class = namedtuple(self.name, self.column_names, rename=True)
+        return self._record_class
+
+    def format_dump(self, data):
+        make = self.record_class._make
+        return [make(row) for row in data]
+
+    def format_row(self, row):
+        return self.record_class._make(row)
+
+    # Dynamically generated record classes cannot be pickled by reference, so
+    # we store the field names and rows, and regenerate the class on load.
+    @classmethod
+    def serialize(cls, formatted_data, fh):
+        if len(formatted_data) > 0:
+            record_class = type(formatted_data[0])
+            header = (record_class.__name__, record_class._fields)
+        else:
+            header = ('Record', ())
+        return pickle.dump((header, [tuple(record) for record in formatted_data]), fh)
+
+    @classmethod
+    def deserialize(cls, fh):
+        (name, fields), rows = pickle.load(fh)
+        make = namedtuple(name, fields)._make
+        return [make(row) for row in rows]
+
+
 class TupleCursorFormatter(CursorFormatter):
 
     def format_dump(self, data):
@@ -149,10 +418,12 @@ class CsvCursorFormatter(CursorFormatter):
         self.output = io.StringIO()
         self.include_header = include_header
         self.writer = csv.writer(self.output, **self.FORMAT_PARAMS)
+        self._header_written = False
 
     def format_dump(self, data):
-        if self.include_header:
+        if self.include_header and not self._header_written:
             self.writer.writerow(self.column_names)
+            self._header_written = True
         try:
             self.writer.writerows(data)
             return self.output.getvalue()
@@ -168,6 +439,9 @@ class CsvCursorFormatter(CursorFormatter):
             self.output.truncate(0)
             self.output.seek(0)
 
+    def concat(self, batches):
+        return ''.join(batches)
+
 
 class HiveCursorFormatter(CsvCursorFormatter):
 
@@ -186,3 +460,57 @@ class HiveCursorFormatter(CsvCursorFormatter):
     # Convert null values to '\N'.
     def prepare_row(self, row):
         return [r'\N' if v is None else str(v).replace('\t', r'\t') for v in row]
+
+
+class SpilledResult(object):
+    """
+    A handle on query results that were too large to be held in memory, and
+    which were therefore spilled in batches to a temporary directory (each
+    batch being written using the `serialize` method of the formatter that
+    generated it). Iterating over this object lazily loads the batches one at a
+    time, whereas `.load()` loads (and concatenates) all of them at once. The
+    temporary files are removed when this object is garbage collected, or when
+    `.cleanup()` is called.
+    """
+
+    def __init__(self, formatter, dir=None):
+        """
+        formatter (CursorFormatter): The formatter instance used to generate,
+            serialize, deserialize and concatenate batches.
+        dir (str, None): The directory in which to create the temporary spill
+            directory (defaults to the system temporary directory).
+        """
+        self.formatter = formatter
+        self.path = tempfile.mkdtemp(prefix='omniduct_spill', dir=dir)
+        self.batch_paths = []
+
+    def append(self, formatted_data):
+        path = os.path.join(self.path, 'batch_{:06d}'.format(len(self.batch_paths)))
+        with open(path, 'wb') as f:
+            self.formatter.serialize(formatted_data, f)
+        self.batch_paths.append(path)
+
+    def __iter__(self):
+        for path in self.batch_paths:
+            with open(path, 'rb') as f:
+                yield self.formatter.deserialize(f)
+
+    def load(self):
+        """
+        Load all of the spilled batches into memory, and return them
+        concatenated into a single result of the nominated format.
+        """
+        return self.formatter.concat(list(self))
+
+    def cleanup(self):
+        """
+        Remove all of the temporary files associated with this result.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.batch_paths = []
+
+    def __del__(self):
+        self.cleanup()
+
+    def __repr__(self):
+        return "<SpilledResult: {} batches in '{}'>".format(len(self.batch_paths), self.path)
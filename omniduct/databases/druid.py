@@ -1,19 +1,65 @@
 from __future__ import absolute_import
 
-from omniduct.utils.debug import logger
+import hashlib
+import json
+import re
+from collections import OrderedDict
 
-from .base import DatabaseClient
+import six
+
+from omniduct.caches.base import cached_method
+from omniduct.utils.debug import logger, logging_scope
+
+from .base import DatabaseClient, cache_deserializer, cache_serializer
 
 
 class DruidClient(DatabaseClient):
     """
     This Duct connects to a Druid server using the `pydruid` python library.
+
+    In addition to the standard (SQL) `DatabaseClient` API, `DruidClient`
+    supports native (JSON) Druid queries via `.query_native()` and
+    `.stream_native()`.
+
+    Attributes:
+        native_path (str): The path of the native query endpoint on the Druid
+            broker.
+        context (dict): The default query context for all queries.
+        stream_page_size (int, None): The number of rows fetched per page when
+            streaming results of ordered SQL queries (if not `None`).
     """
 
     PROTOCOLS = ['druid']
     DEFAULT_PORT = 80
 
-    def _init(self):
+    # Query context parameters which can be passed directly as keyword
+    # arguments to query methods, mapped to their Druid context keys.
+    CONTEXT_PARAMETERS = {
+        'timeout': 'timeout',
+        'priority': 'priority',
+        'use_cache': 'useCache',
+        'populate_cache': 'populateCache',
+    }
+
+    def _init(self, native_path='/druid/v2/', context=None, stream_page_size=None):
+        """
+        native_path (str): The path of the native query endpoint on the Druid
+            broker (default: '/druid/v2/').
+        context (dict, None): The default query context for all (SQL and
+            native) queries, such as `{'timeout': 60000, 'priority': 10}`.
+            Context can also be specified per query using the `context`
+            argument, or the `druid_timeout`, `druid_priority`,
+            `druid_use_cache` and `druid_populate_cache` keyword arguments.
+        stream_page_size (int, None): If specified, the number of rows to
+            fetch per page when streaming the results of SQL queries with an
+            `ORDER BY` clause using `.stream()`, such that memory usage is
+            bounded irrespective of the size of the results (default: None,
+            in which case results are not paginated). Pagination uses
+            `OFFSET`, which requires Druid 0.20 or later.
+        """
+        self.native_path = native_path
+        self.context = context or {}
+        self.stream_page_size = stream_page_size
         self.__druid = None
 
     # Connection
@@ -39,9 +85,191 @@ class DruidClient(DatabaseClient):
         self.__druid = None
 
     # Querying
-    def _execute(self, statement, cursor=None, async=False):
+    @classmethod
+    def native_query_hash(cls, query):
+        """
+        This classmethod is used to determine the hash used to identify native
+        queries to the cache (if configured), based on the canonical JSON
+        representation of the query (such that functionally identical queries
+        share cache entries irrespective of key order and whitespace).
+
+        Parameters:
+            query (dict, str): The native Druid query (or its JSON
+                representation).
+
+        Returns:
+            str: The hash used to identify the query to the cache.
+        """
+        if isinstance(query, six.string_types):
+            query = json.loads(query)
+        return hashlib.sha256(json.dumps(query, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    @logging_scope("Native Query", timed=True)
+    @cached_method(
+        id_str=lambda self, kwargs: "native:{}:\n{}".format(kwargs['format'], self.native_query_hash(kwargs['query'])),
+        format=lambda self, kwargs: kwargs['format'] if kwargs['format'] is not None else self.DEFAULT_CURSOR_FORMATTER,
+        serializer=cache_serializer,
+        deserializer=cache_deserializer
+    )
+    def query_native(self, query, format=None, format_opts={}, **kwargs):
+        """
+        This method executes a native (JSON) Druid query (such as a
+        `timeseries`, `topN`, `groupBy` or `scan` query) against the broker,
+        and returns the results formatted as nominated; optionally (and by
+        default) caching the result if a cache is configured. Results are
+        flattened into rows (see `DruidNativeCursor`).
+
+        Parameters:
+            query (dict, str): The native Druid query (or its JSON
+                representation).
+            format (str): A subclass of CursorFormatter, or one of: 'pandas',
+                'hive', 'csv', 'tuple', 'dict', 'record' or 'columnar'.
+                Defaults to `self.DEFAULT_CURSOR_FORMATTER`.
+            format_opts (dict): A dictionary of format-specific options.
+            **kwargs (dict): Additional arguments to pass on to
+                `DruidClient.execute_native()`.
+            use_cache (bool): True (default) or False. Whether to use the cache
+                (if present). [Used by `cached_method` decorator.]
+            renew (bool): True or False (default). If cache is being used, renew
+                it before returning stored value. [Used by `cached_method`
+                decorator.]
+
+        Returns:
+            The results of the query formatted as nominated.
+        """
+        cursor = self.execute_native(query, **kwargs)
+        return self._get_formatter(format, cursor, **format_opts).dump()
+
+    def stream_native(self, query, format=None, format_opts={}, batch=None, **kwargs):
+        """
+        This method executes a native (JSON) Druid query, and streams the
+        results as they are parsed from the response as an iterator over
+        objects of the nominated format. If `batch` is not `None`, then the
+        iterator will be over batches of size `batch` (e.g. DataFrames of
+        `batch` rows for the 'pandas' format). This is useful for large `scan`
+        queries, whose results need never be held in memory all at once.
+
+        Parameters:
+            query (dict, str): The native Druid query (or its JSON
+                representation).
+            format (str): A subclass of CursorFormatter, or one of: 'pandas',
+                'hive', 'csv', 'tuple', 'dict', 'record' or 'columnar'.
+                Defaults to `self.DEFAULT_CURSOR_FORMATTER`.
+            format_opts (dict): A dictionary of format-specific options.
+            batch (int): If not `None`, the number of rows to be returned at
+                once.
+            **kwargs (dict): Additional arguments to pass on to
+                `DruidClient.execute_native()`.
+
+        Returns:
+            iterator: An iterator over objects of the nominated format or, if
+                batched, a list of such objects.
+        """
+        cursor = self.execute_native(query, **kwargs)
+        formatter = self._get_formatter(format, cursor, **format_opts)
+
+        for row in formatter.stream(batch=batch):
+            yield row
+
+    def execute_native(self, query, timeout=None, context=None, **kwargs):
+        """
+        This method submits a native (JSON) Druid query to the broker, and
+        returns a DBAPI2-like cursor over the (flattened) results, which are
+        parsed incrementally from the response as they are fetched (using
+        `ijson`, if installed).
+
+        Parameters:
+            query (dict, str): The native Druid query (or its JSON
+                representation).
+            timeout (float, None): The number of seconds to wait for the broker
+                to respond.
+            context (dict, None): Druid query context for this query, which
+                extends `.context` (and is overridden by any context specified
+                in the query itself).
+            **kwargs (dict): Context parameters (`druid_timeout`,
+                `druid_priority`, `druid_use_cache` and `druid_populate_cache`)
+                as for `.execute()`.
+
+        Returns:
+            DruidNativeCursor: A cursor over the results of the query.
+        """
+        import requests
+        self.connect()
+        if isinstance(query, six.string_types):
+            query = json.loads(query)
+        query_context = self._query_context(context, **kwargs)
+        if query_context:
+            query = dict(query, context=dict(query_context, **query.get('context', {})))
+        query = json.dumps(query)
+        response = requests.post(
+            'http://{}:{}{}'.format(self.host, self.port, self.native_path),
+            data=query,
+            headers={'Content-Type': 'application/json'},
+            stream=True,
+            timeout=timeout,
+        )
+        if response.status_code != requests.codes.ok:
+            try:
+                message = response.json()
+            except ValueError:
+                message = response.text
+            response.close()
+            raise RuntimeError("Druid native query failed ({}): {}".format(response.status_code, message))
+        return DruidNativeCursor(response)
+
+    def _query_context(self, context=None, **kwargs):
+        query_context = dict(self.context)
+        query_context.update(context or {})
+        for name, key in self.CONTEXT_PARAMETERS.items():
+            value = kwargs.pop('druid_' + name, None)
+            if value is not None:
+                query_context[key] = value
+        if kwargs:
+            raise TypeError("Unexpected keyword arguments: {}".format(', '.join(kwargs)))
+        return query_context
+
+    def stream(self, statement, format=None, format_opts={}, batch=None, **kwargs):
+        """
+        If `.stream_page_size` (or `page_size`) is specified, the results of
+        ordered queries are fetched in pages of that many rows, so that memory
+        usage is bounded.
+        """
+        kwargs.setdefault('page_size', self.stream_page_size)
+        return DatabaseClient.stream(self, statement, format=format, format_opts=format_opts,
+                                     batch=batch, **kwargs)
+
+    def _execute(self, statement, cursor=None, async=False, context=None, page_size=None, params=None, **kwargs):
+        """
+        Additional Parameters:
+            params (dict, list, tuple, None): Parameters to be bound to the
+                statement by `pydruid` (using `%(name)s` or `%s` placeholders).
+            context (dict, None): Druid query context for this query, which
+                extends (and overrides) `.context`.
+            druid_timeout (int): The query timeout in milliseconds.
+            druid_priority (int): The query priority.
+            druid_use_cache (bool): Whether the query may use cached results.
+            druid_populate_cache (bool): Whether results may be cached by Druid.
+            page_size (int, None): If specified, `SELECT` statements with an
+                `ORDER BY` clause (and without `LIMIT` or `OFFSET` clauses) are
+                executed in pages of `page_size` rows (using `LIMIT` and
+                `OFFSET`, which requires Druid 0.20 or later), which are
+                fetched lazily as the returned cursor is consumed. Unordered
+                statements are not paginated, since Druid does not guarantee
+                that their rows are returned in a consistent order.
+        """
+        query_context = self._query_context(context, **kwargs)
+        if page_size and DruidPagedCursor.is_pageable(statement):
+            return DruidPagedCursor(
+                lambda page: self._execute(page, context=query_context, params=params),
+                statement, page_size
+            )
         cursor = cursor or self.__druid.cursor()
-        cursor.execute(statement)
+        if query_context:
+            if hasattr(cursor, 'context'):
+                cursor.context = query_context
+            else:
+                logger.warning("Installed version of `pydruid` does not support query context; ignoring it.")
+        cursor.execute(statement, params)
         return cursor
 
     def _table_list(self, schema=None, like=None, **kwargs):
@@ -49,9 +277,31 @@ class DruidClient(DatabaseClient):
         return self.query(cmd, **kwargs)
 
     def _table_exists(self, table, schema=None):
-        return (self.table_list(renew=True, schema=schema)['TABLE_NAME'] == table).any()
+        return self._tables_exist([table], schema=schema)[table]
+
+    def _tables_exist(self, tables, schema=None):
+        names = {table: self._table_name_split(table, schema) for table in tables}
+        if not names:
+            return {}
+        found = self.query(
+            "SELECT TABLE_SCHEMA, TABLE_NAME FROM INFORMATION_SCHEMA.TABLES WHERE {}"
+            .format(self._table_names_predicate(names.values(), 'TABLE_SCHEMA', 'TABLE_NAME')),
+            use_cache=False
+        )
+        found_names = set(found['TABLE_NAME'])
+        found = set(zip(found['TABLE_SCHEMA'], found['TABLE_NAME']))
+        return {
+            table: (name in found_names if schema is None else (schema, name) in found)
+            for table, (schema, name) in names.items()
+        }
 
     def _table_desc(self, table, **kwargs):
+        return self._tables_desc([table], **kwargs)[table]
+
+    def _tables_desc(self, tables, schema=None, **kwargs):
+        names = {table: self._table_name_split(table, schema) for table in tables}
+        if not names:
+            return {}
         query = ("""
             SELECT
                 TABLE_SCHEMA
@@ -62,11 +312,192 @@ class DruidClient(DatabaseClient):
                 , IS_NULLABLE
                 , DATA_TYPE
             FROM INFORMATION_SCHEMA.COLUMNS
-            WHERE TABLE_NAME = '{}'""").format(table)
-        return self.query(query, **kwargs)
+            WHERE {}""").format(self._table_names_predicate(names.values(), 'TABLE_SCHEMA', 'TABLE_NAME'))
+        columns = self.query(query, **kwargs)
+        return {
+            table: columns[
+                (columns['TABLE_NAME'] == name) & ((columns['TABLE_SCHEMA'] == schema) if schema is not None else True)
+            ].reset_index(drop=True)
+            for table, (schema, name) in names.items()
+        }
 
     def _table_head(self, table, n=10, **kwargs):
         return self.query("SELECT * FROM {} LIMIT {}".format(table, n), **kwargs)
 
     def _table_props(self, table, **kwargs):
         raise NotImplementedError
+
+
+class DruidPagedCursor(object):
+    """
+    A DBAPI2-like cursor which executes a `SELECT` statement in pages of
+    `page_size` rows (by appending `LIMIT` and `OFFSET` clauses), fetching
+    each page lazily as the previous one is consumed, so that no more than
+    one page of results is held in memory at once. Only statements with an
+    outermost `ORDER BY` clause can be paged consistently.
+    """
+
+    @classmethod
+    def is_pageable(cls, statement):
+        outer = statement
+        while True:  # Remove parenthesised subqueries (and window specifications)
+            inner = re.sub(r'\([^()]*\)', '', outer)
+            if inner == outer:
+                break
+            outer = inner
+        return (
+            re.match(r'^\s*(SELECT|WITH)\b', statement, flags=re.IGNORECASE) is not None
+            and re.search(r'\bORDER\s+BY\b', outer, flags=re.IGNORECASE) is not None
+            and re.search(r'\b(LIMIT|OFFSET)\s+\d+\s*$', statement, flags=re.IGNORECASE) is None
+        )
+
+    def __init__(self, execute, statement, page_size):
+        self._execute = execute
+        self._statement = statement
+        self._page_size = int(page_size)
+        self._offset = 0
+        self._page_rows = 0
+        self._cursor = self._next_page()
+        self.description = self._cursor.description
+
+    def _next_page(self):
+        cursor = self._execute('{}\nLIMIT {} OFFSET {}'.format(self._statement, self._page_size, self._offset))
+        self._offset += self._page_size
+        self._page_rows = 0
+        return cursor
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        rows = []
+        while self._cursor is not None and len(rows) < size:
+            page_rows = self._cursor.fetchmany(size - len(rows))
+            self._page_rows += len(page_rows)
+            rows.extend(page_rows)
+            if len(rows) < size:  # Current page exhausted
+                if self._page_rows < self._page_size:
+                    self._cursor = None
+                else:
+                    self._cursor = self._next_page()
+        return rows
+
+    def fetchall(self):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(self._page_size)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    def close(self):
+        if self._cursor is not None and hasattr(self._cursor, 'close'):
+            self._cursor.close()
+        self._cursor = None
+
+
+class DruidNativeCursor(object):
+    """
+    A minimal DBAPI2-like cursor over the results of a native Druid query,
+    suitable for use with `CursorFormatter` subclasses. The JSON response is
+    parsed incrementally (using `ijson`, if installed; otherwise it is decoded
+    in full on first access), and results are flattened into rows as follows:
+
+    - `timeseries`: one row per timestamp, with the `timestamp` followed by
+      the aggregated fields.
+    - `topN` and `search`: one row per result item, prefixed by `timestamp`.
+    - `groupBy`: one row per event, prefixed by `timestamp`.
+    - `scan`: one row per event (in either `list` or `compactedList` format).
+
+    Columns are determined by the first row; fields missing from later rows
+    are reported as `None`. The `timestamp` column is described as having
+    type 'timestamp', so that formatters can coerce it appropriately.
+    """
+
+    def __init__(self, response):
+        self._response = response
+        self._rows = self._iter_rows(self._iter_items(response))
+        self._buffer = []
+        self._columns = None
+
+    @property
+    def description(self):
+        return [
+            (column, 'timestamp' if column == 'timestamp' else None, None, None, None, None, True)
+            for column in self._get_columns()
+        ]
+
+    def _get_columns(self):
+        if self._columns is None:
+            self._columns = []
+            row = next(self._rows, None)
+            if row is not None:
+                self._buffer.append(row)
+                self._columns = list(row)
+        return self._columns
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        columns = self._get_columns()
+        rows = []
+        while len(rows) < size:
+            row = self._buffer.pop(0) if self._buffer else next(self._rows, None)
+            if row is None:
+                break
+            rows.append(tuple(row.get(column) for column in columns))
+        return rows
+
+    def fetchall(self):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(1000)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    def close(self):
+        self._response.close()
+
+    @staticmethod
+    def _iter_items(response):
+        try:
+            import ijson
+        except ImportError:
+            logger.debug("`ijson` is not installed; native Druid results will be parsed in full.")
+            for item in response.json():
+                yield item
+            return
+        response.raw.decode_content = True
+        try:
+            items = ijson.items(response.raw, 'item', use_float=True)
+        except TypeError:  # Older versions of ijson always yield decimals
+            items = ijson.items(response.raw, 'item')
+        for item in items:
+            yield item
+
+    @staticmethod
+    def _iter_rows(items):
+        for item in items:
+            if 'events' in item:  # scan
+                columns = item.get('columns')
+                for event in item['events']:
+                    yield OrderedDict(zip(columns, event)) if isinstance(event, list) else event
+            elif 'event' in item:  # groupBy
+                yield OrderedDict([('timestamp', item.get('timestamp'))] + list(item['event'].items()))
+            elif isinstance(item.get('result'), list):  # topN / search
+                for result in item['result']:
+                    yield OrderedDict([('timestamp', item.get('timestamp'))] + list(result.items()))
+            elif isinstance(item.get('result'), dict):  # timeseries
+                yield OrderedDict([('timestamp', item.get('timestamp'))] + list(item['result'].items()))
+            else:
+                yield item
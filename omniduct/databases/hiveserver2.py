@@ -1,16 +1,25 @@
 from __future__ import absolute_import
 
+import io
 import json
 import logging
 import os
 import re
 import shutil
 import tempfile
+import threading
 import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from itertools import islice
+from multiprocessing.pool import ThreadPool
 
 import pandas as pd
+import six
 from jinja2 import Template
 
+from omniduct.duct import Duct
 from omniduct.utils.config import config
 from omniduct.utils.debug import logger
 from omniduct.utils.processes import Timeout, run_in_subprocess
@@ -40,6 +49,15 @@ class HiveServer2Client(DatabaseClient):
             support the `INSERT` statement.
         default_table_props (dict): A dictionary of table properties to use by
             default when creating tables.
+        hdfs_fs (str, FileSystemClient, None): The HDFS filesystem client (or
+            the name of one in the registry) used to read query results
+            directly from HDFS when querying with `via='hdfs'`.
+        hdfs_result_dir (str): The directory on `hdfs_fs` in which temporary
+            query results are stored when querying with `via='hdfs'`.
+        hdfs_read_parallelism (int): The number of result files to read
+            concurrently when querying with `via='hdfs'`.
+        hdfs_write_parallelism (int): The number of data files to write
+            concurrently when pushing with `via='hdfs'`.
         connection_options (dict): Additional options to pass through to the
             `.connect()` methods of the drivers.
     """
@@ -47,8 +65,17 @@ class HiveServer2Client(DatabaseClient):
     PROTOCOLS = ['hiveserver2']
     DEFAULT_PORT = 3623
 
+    # The Hive input formats of tables which may be pushed to via HDFS, by
+    # file format.
+    HDFS_PUSH_INPUT_FORMATS = {
+        'parquet': 'MapredParquetInputFormat',
+        'orc': 'OrcInputFormat',
+    }
+
     def _init(self, schema=None, driver='pyhive', auth_mechanism='NOSASL',
-              push_using_hive_cli=False, default_table_props=None, **connection_options):
+              push_using_hive_cli=False, default_table_props=None, hdfs_fs=None,
+              hdfs_result_dir='.omniduct/hive_results', hdfs_read_parallelism=4,
+              hdfs_write_parallelism=4, **connection_options):
         """
         schema (str, None): The default database/schema to use for queries (will
             default to server-default if not specified).
@@ -66,6 +93,17 @@ class HiveServer2Client(DatabaseClient):
             support the `INSERT` statement. False by default.
         default_table_props (dict): A dictionary of table properties to use by
             default when creating tables (default is an empty dict).
+        hdfs_fs (str, FileSystemClient, None): The HDFS filesystem client (or
+            the name of one in the registry) used to read query results
+            directly from HDFS when querying with `via='hdfs'`.
+        hdfs_result_dir (str): The directory on `hdfs_fs` in which temporary
+            query results are stored when querying with `via='hdfs'`, relative
+            to the HDFS home directory unless absolute (default:
+            '.omniduct/hive_results').
+        hdfs_read_parallelism (int): The number of result files to read
+            concurrently when querying with `via='hdfs'` (default: 4).
+        hdfs_write_parallelism (int): The number of data files to write
+            concurrently when pushing with `via='hdfs'` (default: 4).
         **connection_options (dict): Additional options to pass through to the
             `.connect()` methods of the drivers.
         """
@@ -75,35 +113,45 @@ class HiveServer2Client(DatabaseClient):
         self.connection_options = connection_options
         self.push_using_hive_cli = push_using_hive_cli
         self.default_table_props = default_table_props or {}
+        self.hdfs_fs = hdfs_fs
+        self.hdfs_result_dir = hdfs_result_dir
+        self.hdfs_read_parallelism = hdfs_read_parallelism
+        self.hdfs_write_parallelism = hdfs_write_parallelism
         self.__hive = None
+        self.__hive_pool = []
+        self.__hive_pool_lock = threading.Lock()
         self.connection_fields += ('schema',)
 
         assert self.driver in ('pyhive', 'impyla'), "Supported drivers are pyhive and impyla."
 
     def _connect(self):
         from sqlalchemy import create_engine, MetaData
+        self.__hive = self.__hive_connect()
         if self.driver == 'pyhive':
-            import pyhive.hive
-            self.__hive = pyhive.hive.connect(host=self.host,
-                                              port=self.port,
-                                              auth=self.auth_mechanism,
-                                              database=self.schema,
-                                              username=self.username,
-                                              password=self.password,
-                                              **self.connection_options)
             self._sqlalchemy_engine = create_engine('hive://{}:{}/{}'.format(self.host, self.port, self.schema))
-            self._sqlalchemy_metadata = MetaData(self._sqlalchemy_engine)
         elif self.driver == 'impyla':
-            import impala.dbapi
-            self.__hive = impala.dbapi.connect(host=self.host,
-                                               port=self.port,
-                                               auth_mechanism=self.auth_mechanism,
-                                               database=self.schema,
-                                               user=self.username,
-                                               password=self.password,
-                                               **self.connection_options)
             self._sqlalchemy_engine = create_engine('impala://{}:{}/{}'.format(self.host, self.port, self.schema))
-            self._sqlalchemy_metadata = MetaData(self._sqlalchemy_engine)
+        self._sqlalchemy_metadata = MetaData(self._sqlalchemy_engine)
+
+    def __hive_connect(self):
+        if self.driver == 'pyhive':
+            import pyhive.hive
+            return pyhive.hive.connect(host=self.host,
+                                       port=self.port,
+                                       auth=self.auth_mechanism,
+                                       database=self.schema,
+                                       username=self.username,
+                                       password=self.password,
+                                       **self.connection_options)
+        elif self.driver == 'impyla':
+            import impala.dbapi
+            return impala.dbapi.connect(host=self.host,
+                                        port=self.port,
+                                        auth_mechanism=self.auth_mechanism,
+                                        database=self.schema,
+                                        user=self.username,
+                                        password=self.password,
+                                        **self.connection_options)
 
     def __hive_cursor(self):
         if self.driver == 'impyla':  # Impyla seems to have all manner of connection issues, attempt to restore connection
@@ -117,28 +165,67 @@ class HiveServer2Client(DatabaseClient):
     def _is_connected(self):
         return self.__hive is not None
 
+    @contextmanager
+    def _pooled_cursor(self):
+        # Thrift connections cannot be shared between threads, and so each
+        # concurrently executing statement borrows a dedicated connection.
+        with self.__hive_pool_lock:
+            connection = self.__hive_pool.pop() if self.__hive_pool else None
+        if connection is None:
+            connection = self.__hive_connect()
+        try:
+            yield connection.cursor()
+        finally:
+            with self.__hive_pool_lock:
+                self.__hive_pool.append(connection)
+
     def _disconnect(self):
         logger.info('Disconnecting from Hive coordinator...')
-        try:
-            self.__hive.close()
-        except:
-            pass
+        with self.__hive_pool_lock:
+            connections, self.__hive_pool = [self.__hive] + self.__hive_pool, []
+        for connection in connections:
+            try:
+                connection.close()
+            except:
+                pass
         self.__hive = None
         self._sqlalchemy_engine = None
         self._sqlalchemy_metadata = None
 
-    def _execute(self, statement, cursor=None, async=False, poll_interval=1):
+    def _execute(self, statement, cursor=None, async=False, poll_interval=1, via=None, params=None):
         """
         Additional Parameters:
             poll_interval (int): Default delay in seconds between consecutive
                 query status (defaults to 1).
+            params (dict, list, tuple, None): Parameters to be bound to the
+                statement by the driver (using `%(name)s` or `%s` placeholders).
+                Note that HiveServer2 does not support server-side binding,
+                and so parameters are escaped and substituted client-side.
+            via (str, None): If 'hdfs', `SELECT` statements are executed using
+                `INSERT OVERWRITE DIRECTORY` into a temporary directory in
+                `.hdfs_result_dir`, and the resulting files are read in
+                parallel directly from HDFS using `.hdfs_fs` (which is much
+                faster than fetching large results via Thrift). The
+                temporary directory is removed when the returned cursor is
+                closed. Note that values containing newlines or CTRL-A
+                characters cannot be faithfully recovered in this mode.
         """
+        if isinstance(cursor, HiveHdfsResultCursor):  # Cannot execute statements against HDFS results
+            cursor.close()
+            cursor = None
+
+        if via == 'hdfs':
+            if re.match(r'^\s*(SELECT|WITH)\b', statement, flags=re.IGNORECASE):
+                return self._execute_via_hdfs(statement, cursor=cursor, poll_interval=poll_interval, params=params)
+        elif via is not None:
+            raise ValueError("Unsupported value for `via`: '{}'. The only supported value is 'hdfs'.".format(via))
+
         cursor = cursor or self.__hive_cursor()
         log_offset = 0
 
         if self.driver == 'pyhive':
             from TCLIService.ttypes import TOperationState
-            cursor.execute(statement, async=True)
+            cursor.execute(statement, parameters=params, async=True)
 
             if not async:
                 status = cursor.poll().operationState
@@ -148,7 +235,7 @@ class HiveServer2Client(DatabaseClient):
                     status = cursor.poll().operationState
 
         elif self.driver == 'impyla':
-            cursor.execute_async(statement)
+            cursor.execute_async(statement, parameters=params)
             if not async:
                 while cursor.is_executing():
                     log_offset = self._log_status(cursor, log_offset)
@@ -156,6 +243,59 @@ class HiveServer2Client(DatabaseClient):
 
         return cursor
 
+    def _execute_via_hdfs(self, statement, cursor=None, poll_interval=1, params=None):
+        fs = self._get_hdfs_fs()
+        path = fs.path_normpath(fs.path_join(fs._path(self.hdfs_result_dir), uuid.uuid4().hex))
+
+        # Determine the schema of the results without computing them.
+        cursor = self._execute(
+            "SELECT * FROM (\n{}\n) omniduct_hdfs_result LIMIT 0".format(statement),
+            cursor=cursor, poll_interval=poll_interval, params=params
+        )
+        description = [
+            (re.sub('^omniduct_hdfs_result\\.', '', column[0]),) + tuple(column[1:])
+            for column in cursor.description
+        ]
+        cursor.fetchall()
+
+        # Results must be written uncompressed to be read back directly, and
+        # the previous setting is restored afterwards.
+        cursor = self._execute("SET hive.exec.compress.output", cursor=cursor, poll_interval=poll_interval)
+        compress_output = self._setting_value(cursor, 'hive.exec.compress.output')
+        logger.info("Writing query results to '{}' on HDFS...".format(path))
+        cursor = self._execute("SET hive.exec.compress.output=false", cursor=cursor, poll_interval=poll_interval)
+        try:
+            cursor = self._execute(
+                "INSERT OVERWRITE DIRECTORY '{}'\n{}".format(path, statement),
+                cursor=cursor, poll_interval=poll_interval, params=params
+            )
+        finally:
+            if compress_output not in (None, 'false'):
+                cursor = self._execute("SET hive.exec.compress.output={}".format(compress_output),
+                                       cursor=cursor, poll_interval=poll_interval)
+        cursor.close()
+
+        return HiveHdfsResultCursor(fs, path, description, parallelism=self.hdfs_read_parallelism)
+
+    @classmethod
+    def _setting_value(cls, cursor, key):
+        # `SET <key>` returns a single row of the form '<key>=<value>' (or
+        # '<key> is undefined').
+        for row in cursor.fetchall():
+            if row and isinstance(row[0], six.string_types) and row[0].startswith(key + '='):
+                return row[0][len(key) + 1:]
+        return None
+
+    def _get_hdfs_fs(self):
+        from omniduct.filesystems.base import FileSystemClient
+        fs = self.hdfs_fs
+        if isinstance(fs, six.string_types):
+            assert self.registry is not None, "A registry is required to look up `hdfs_fs` by name."
+            fs = self.registry.lookup(fs, kind=Duct.Type.FILESYSTEM)
+        if not isinstance(fs, FileSystemClient):
+            raise RuntimeError("Querying via HDFS requires `hdfs_fs` to be set to a `FileSystemClient` instance (or the name of one in the registry).")
+        return fs
+
     def _cursor_empty(self, cursor):
         if self.driver == 'impyla':
             return not cursor.has_result_set
@@ -188,7 +328,8 @@ class HiveServer2Client(DatabaseClient):
         return len(log)
 
     def _push(self, df, table, if_exists='fail', schema=None, use_hive_cli=None,
-              partition=None, sep=chr(1), table_props=None, dtype_overrides=None, **kwargs):
+              partition=None, sep=chr(1), table_props=None, dtype_overrides=None,
+              via=None, file_format='parquet', chunk_size=500000, **kwargs):
         """
         If `use_hive_cli` (or if not specified `.push_using_hive_cli`) is
         `True`, a `CREATE TABLE` statement will be automatically generated based
@@ -202,9 +343,23 @@ class HiveServer2Client(DatabaseClient):
         If `use_hive_cli` (or if not specified `.push_using_hive_cli`) is
         `False`, an attempt will be made to push the `DataFrame` to Hive using
         `pandas.DataFrame.to_sql` and the SQLAlchemy binding provided by
-        `pyhive` and `impyla`. This may be slower, does not support older
+        `pyhive` and `impyla`, inserting rows in batches using multi-row
+        `INSERT` statements. This may be slower, does not support older
         versions of Hive, and does not support table properties or partitioning.
 
+        If `via` is 'hdfs', the `DataFrame` is instead written in chunks of
+        `chunk_size` rows to compressed Parquet (or ORC) files, which are
+        uploaded in parallel via `.hdfs_fs` directly into the storage location
+        of the table (or partition), which is created if necessary (`STORED AS
+        PARQUET` or `ORC`). Existing tables must already be stored in the
+        nominated format, and for partitioned pushes `if_exists` applies to the
+        partition rather than the table. Any new partition is then registered
+        using a single `ALTER TABLE ... ADD PARTITION` statement. This avoids
+        the conversion of the entire `DataFrame` to text, and is typically much
+        faster for large `DataFrame`s. Note that this requires `pyarrow` to be
+        installed, and `.hdfs_fs` to permit writes to the table location (e.g.
+        by setting `global_writes` to `True`).
+
         Additional Parameters:
             schema (str): The schema into which the table should be pushed. If
                 not specified, the schema will be set to your username.
@@ -212,15 +367,25 @@ class HiveServer2Client(DatabaseClient):
                 `.push_using_hive_cli` attribute. If not specified, the global
                 default is used. If True, then pushes are performed using the
                 `hive` CLI executable on the local/remote PATH.
-            **kwargs (dict): Additional arguments to send to `pandas.DataFrame.to_sql`.
-
-        Further Parameters for CLI method (specifying these for the pandas
+            via (str, None): If 'hdfs', push data by writing columnar files
+                directly to HDFS (see above).
+            **kwargs (dict): Additional arguments to send to
+                `DatabaseClient._push_batched` (such as `batch_size`, the number
+                of rows per `INSERT` statement) and `pandas.DataFrame.to_sql`.
+
+        Further Parameters for HDFS method:
+            file_format (str): One of 'parquet' (default) or 'orc'.
+            chunk_size (int): The number of rows to write into each file
+                (default: 500000).
+
+        Further Parameters for CLI and HDFS methods (specifying these for the pandas
         method will cause a `RuntimeError` exception):
             partition (dict): A mapping of column names to values that specify
                 the partition into which the provided data should be uploaded,
                 as well as providing the fields by which new tables should be
                 partitioned.
             sep (str): Field delimiter for data (defaults to CTRL-A, or `chr(1)`).
+                Only used by the CLI method.
             table_props (dict): Properties to set on any newly created tables
                 (extends `.default_table_props`).
             dtype_overrides (dict): Mapping of column names to Hive datatypes to
@@ -232,6 +397,15 @@ class HiveServer2Client(DatabaseClient):
         table_props = table_props or {}
         dtype_overrides = dtype_overrides or {}
 
+        if via == 'hdfs':
+            return self._push_via_hdfs(
+                df, table, if_exists=if_exists, schema=schema, partition=partition,
+                table_props=table_props, dtype_overrides=dtype_overrides,
+                file_format=file_format, chunk_size=chunk_size
+            )
+        elif via is not None:
+            raise ValueError("Unsupported value for `via`: '{}'. The only supported value is 'hdfs'.".format(via))
+
         # Try using SQLALchemy method
         if not use_hive_cli:
             if partition or table_props or dtype_overrides:
@@ -244,9 +418,8 @@ class HiveServer2Client(DatabaseClient):
                     "and try again."
                 )
             try:
-                return df.to_sql(name=table, con=self._sqlalchemy_engine,
-                                 index=False, if_exists=if_exists,
-                                 schema=schema, **kwargs)
+                return self._push_batched(df, table, engine=self._sqlalchemy_engine,
+                                          if_exists=if_exists, schema=schema, **kwargs)
             except Exception as e:
                 raise RuntimeError(
                     "Push unsuccessful. Your version of Hive may be too old to "
@@ -337,13 +510,175 @@ class HiveServer2Client(DatabaseClient):
             partition="into {} of ".format(partition_clause) if partition_clause else ""
         ))
 
+    def _push_via_hdfs(self, df, table, if_exists, schema, partition, table_props,
+                       dtype_overrides, file_format='parquet', chunk_size=500000):
+        import pyarrow
+
+        assert file_format in ('parquet', 'orc'), "Supported file formats are 'parquet' and 'orc'."
+        assert len(set(partition).intersection(df.columns)) == 0, "The dataframe to be uploaded must not have any partitioned fields. Please remove the field(s): {}.".format(','.join(set(partition).intersection(df.columns)))
+
+        fs = self._get_hdfs_fs()
+        name = '{}.{}'.format(schema, table)
+
+        # Unless the table is to be replaced, files are written into the
+        # storage location of any existing table, which must therefore
+        # already be stored in the nominated format.
+        storage = None
+        if self._table_exists(table, schema=schema):
+            if if_exists == 'fail' and not partition:
+                raise ValueError("Table `{}` already exists.".format(name))
+            if if_exists != 'replace' or partition:
+                storage = self._table_storage(table, schema=schema)
+                input_format = storage.get('InputFormat') or ''
+                if not input_format.endswith(self.HDFS_PUSH_INPUT_FORMATS[file_format]):
+                    raise ValueError(
+                        "Table `{}` is stored using `{}`, and so cannot be pushed to as {} files."
+                        .format(name, input_format, file_format)
+                    )
+
+        # Columnar files are read by column name, and so types must agree with
+        # those written. Timestamps are stored as Hive TIMESTAMPs, and narrow
+        # numeric types are widened to match BIGINT and DOUBLE.
+        dtype_overrides = dict(dtype_overrides)
+        casts = {}
+        for col, dtype in df.dtypes.iteritems():
+            if dtype.kind == 'M':
+                dtype_overrides.setdefault(col, 'TIMESTAMP')
+            elif dtype.kind in 'iu' and dtype.itemsize < 8:
+                casts[col] = 'int64'
+            elif dtype.kind == 'f' and dtype.itemsize < 8:
+                casts[col] = 'float64'
+        columns = {col: re.sub(r'\W', '', col.lower().replace(' ', '_')) for col in df.columns}
+
+        tblprops = self.default_table_props.copy()
+        tblprops.update(table_props)
+        cts = self._create_table_statement_from_df(
+            df=df, table=table,
+            schema=schema,
+            drop=(if_exists == 'replace') and not partition,
+            text=False,
+            stored_as=file_format.upper(),
+            table_props=tblprops,
+            partition_cols=list(partition),
+            dtype_overrides=dtype_overrides
+        )
+        if storage is None:
+            self.execute(cts, template=False)
+            storage = self._table_storage(table, schema=schema)
+
+        # Determine the location into which files should be written.
+        location = storage['Location']
+        if partition:
+            location = fs.path_join(location, *['{}={}'.format(key, value) for key, value in partition.items()])
+            if fs.exists(location):
+                if if_exists == 'fail':
+                    raise ValueError("Partition {} of table `{}` already exists.".format(partition, name))
+                elif if_exists == 'replace':
+                    fs.remove(location, recursive=True)
+
+        if file_format == 'parquet':
+            import pyarrow.parquet
+
+            def write(tbl, fh):
+                pyarrow.parquet.write_table(tbl, fh, compression='snappy', use_deprecated_int96_timestamps=True)
+        else:
+            import pyarrow.orc
+
+            def write(tbl, fh):
+                pyarrow.orc.write_table(tbl, fh)
+
+        push_id = uuid.uuid4().hex
+
+        def upload_chunk(offset):
+            chunk = df.iloc[offset:offset + chunk_size]
+            if casts:
+                chunk = chunk.astype(casts)
+            chunk = chunk.rename(columns=columns)
+            buf = io.BytesIO()
+            write(pyarrow.Table.from_pandas(chunk, preserve_index=False), buf)
+            path = fs.path_join(location, 'omniduct_{}_{:05d}.{}'.format(push_id, offset // chunk_size, file_format))
+            with fs.open(path, 'wb') as f:
+                f.write(buf.getvalue())
+            return len(chunk)
+
+        logger.info("Uploading data to '{}' on HDFS...".format(location))
+        offsets = list(range(0, len(df), chunk_size))
+        pool = ThreadPool(self.hdfs_write_parallelism)
+        try:
+            uploaded = 0
+            logger.progress(0)
+            for n in pool.imap_unordered(upload_chunk, offsets):
+                uploaded += n
+                logger.progress(100. * uploaded / max(len(df), 1))
+            logger.progress(100, complete=True)
+        finally:
+            pool.terminate()
+
+        partition_clause = ''
+        if partition:
+            partition_clause = 'PARTITION ({})'.format(','.join("{key} = '{value}'".format(key=key, value=value) for key, value in partition.items()))
+            self.execute(
+                "ALTER TABLE {schema}.{table} ADD IF NOT EXISTS {partition_clause}"
+                .format(schema=schema, table=table, partition_clause=partition_clause),
+                template=False
+            )
+
+        logger.info("Successfully uploaded dataframe {partition}`{schema}.{table}`.".format(
+            schema=schema,
+            table=table,
+            partition="into {} of ".format(partition_clause) if partition_clause else ""
+        ))
+
+    def _table_storage(self, table, schema=None):
+        """
+        Return the storage details of `table` reported by `DESCRIBE FORMATTED`
+        (such as 'Location', 'InputFormat', 'OutputFormat' and 'SerDe
+        Library') as a dictionary. The location is returned without the scheme
+        and authority of its URI (e.g. 'hdfs://nameservice').
+        """
+        name = '{}.{}'.format(schema, table) if schema else table
+        records = self.query('DESCRIBE FORMATTED {}'.format(name), format='tuple', use_cache=False)
+        storage = {}
+        for record in records:
+            key = (record[0] or '').strip()
+            if key.endswith(':') and len(record) > 1 and record[1] is not None:
+                storage.setdefault(key[:-1], record[1].strip())
+        if not storage.get('Location'):
+            raise RuntimeError("Unable to determine the location of table `{}`.".format(name))
+        storage['Location'] = re.sub(r'^[a-zA-Z][a-zA-Z0-9+.-]*://[^/]*', '', storage['Location'])
+        return storage
+
     def _table_list(self, schema=None, like='*', **kwargs):
         schema = schema or self.schema or 'default'
         return self.query("SHOW TABLES IN {0} '{1}'".format(schema, like),
                           **kwargs)
 
     def _table_exists(self, table, schema=None):
-        return (self.table_list(renew=True, schema=schema)['tab_name'] == table).any()
+        return self._tables_exist([table], schema=schema)[table]
+
+    def _tables_exist(self, tables, schema=None):
+        """
+        The existence of tables is checked using one `SHOW TABLES` statement
+        per schema, with a pattern matching only the nominated tables.
+
+        Additional Parameters:
+            schema (str): The schema of unqualified table names (defaults to
+                `.schema`, or 'default').
+        """
+        names = {
+            table: tuple(name.lower() for name in self._table_name_split(table, schema or self.schema or 'default'))
+            for table in tables
+        }
+        by_schema = {}
+        for schema, name in names.values():
+            by_schema.setdefault(schema, set()).add(name)
+
+        found = set()
+        for schema, schema_tables in by_schema.items():
+            records = self.table_list(schema=schema, like='|'.join(sorted(schema_tables)), use_cache=False)
+            if records is not None and len(records):
+                found.update((schema, name.lower()) for name in records.iloc[:, 0])
+        return {table: name in found for table, name in names.items()}
 
     def _table_desc(self, table, **kwargs):
         records = self.query("DESCRIBE {0}".format(table), **kwargs)
@@ -362,6 +697,42 @@ class HiveServer2Client(DatabaseClient):
 
         return pd.concat((fields_df, partitions_df))
 
+    def _explain(self, statement, **kwargs):
+        """
+        Statements are explained using `EXPLAIN`, and the estimated rows and
+        bytes read are those reported in the statistics of table scans (which
+        depend on table statistics having been computed). If no scans are
+        found, or any scan lacks statistics, the estimates are unknown (`None`).
+        """
+        rows = self.query("EXPLAIN\n{}".format(statement), format='tuple', use_cache=False, template=False, **kwargs)
+        plan = '\n'.join(row[0] for row in rows or [])
+
+        totals = {'rows': 0, 'bytes': 0}
+        scans = estimated = 0
+        scan = False
+        for line in plan.splitlines():
+            if 'TableScan' in line:
+                scans += 1
+                scan = True
+                continue
+            match = re.search(r'Statistics: Num rows: (\d+) Data size: (\d+)', line)
+            if match and scan:
+                estimated += 1
+                totals['rows'] += int(match.group(1))
+                totals['bytes'] += int(match.group(2))
+                scan = False
+
+        # Plans which could not be parsed have unknown costs
+        known = scans > 0 and estimated == scans
+        return {'plan': plan, 'rows': totals['rows'] if known else None, 'bytes': totals['bytes'] if known else None}
+
+    def _statement_sampled_relation(self, statement, sample=None):
+        # Hive only supports `TABLESAMPLE` on tables, and so rows are sampled
+        # using a random filter instead.
+        if sample is not None:
+            statement = "SELECT * FROM (\n{}\n) omniduct_sample WHERE rand() < {}".format(statement, float(sample) / 100)
+        return DatabaseClient._statement_sampled_relation(self, statement)
+
     def _table_head(self, table, n=10, **kwargs):
         return self.query("SELECT * FROM {} LIMIT {}".format(table, n), **kwargs)
 
@@ -384,7 +755,7 @@ class HiveServer2Client(DatabaseClient):
     def _create_table_statement_from_df(cls, df, table, schema='default', drop=False,
                                         text=True, sep=chr(1), loc=None,
                                         table_props=None, partition_cols=None,
-                                        dtype_overrides=None):
+                                        dtype_overrides=None, stored_as=None):
         """
         Return create table statement for new hive table based on pandas dataframe.
 
@@ -402,6 +773,11 @@ class HiveServer2Client(DatabaseClient):
             table_props (dict): The table properties (if any) to set on the table.
             partition_cols (list): The columns by which the created table should
                 be partitioned.
+            dtype_overrides (dict): Mapping of column names to Hive datatypes to
+                use instead of default mapping.
+            stored_as (str, None): The storage format of the table (e.g. 'ORC'
+                or 'PARQUET') if not stored as a textfile (ignored if `text` is
+                `True`).
 
         Returns:
             str: The Hive SQL required to create the table with the above
@@ -466,6 +842,8 @@ class HiveServer2Client(DatabaseClient):
         ROW FORMAT DELIMITED
         FIELDS TERMINATED BY "{{ sep }}"
         STORED AS TEXTFILE
+        {% elif stored_as %}
+        STORED AS {{ stored_as }}
         {% endif %}
         {%- if loc %}
         LOCATION "{{ loc }}"
@@ -475,3 +853,116 @@ class HiveServer2Client(DatabaseClient):
         """).render(**locals())
 
         return cmd
+
+
+class HiveHdfsResultCursor(object):
+    """
+    A minimal DBAPI2-like cursor over the text files written by Hive into a
+    directory on HDFS (e.g. via `INSERT OVERWRITE DIRECTORY`). Files are read
+    in parallel (while preserving order) using a thread pool, and values are
+    parsed according to the type codes in `description`. At most
+    `parallelism` files are read ahead of the rows being consumed, which
+    bounds the memory used while streaming results. The directory is removed
+    from HDFS when the cursor is closed.
+    """
+
+    TYPE_PARSERS = {
+        'BOOLEAN': lambda value: value == 'true',
+        'TINYINT': int,
+        'SMALLINT': int,
+        'INT': int,
+        'BIGINT': int,
+        'FLOAT': float,
+        'DOUBLE': float,
+    }
+
+    def __init__(self, fs, path, description, parallelism=4, sep=chr(1), null=r'\N', cleanup=True):
+        self.fs = fs
+        self.path = path
+        self.description = description
+        self.parallelism = parallelism
+        self.sep = sep
+        self.null = null
+        self.cleanup = cleanup
+        self.closed = False
+
+        self._parsers = []
+        for column in description:
+            type_code = column[1].upper() if isinstance(column[1], six.string_types) else ''
+            if type_code.endswith('_TYPE'):
+                type_code = type_code[:-len('_TYPE')]
+            self._parsers.append(self.TYPE_PARSERS.get(type_code))
+        self._rows = self.__iter_rows()
+
+    @property
+    def files(self):
+        return sorted(
+            f.path for f in self.fs.dir(self.path)
+            if f.type == 'file' and not f.name.startswith(('.', '_'))
+        )
+
+    def _read_file(self, path):
+        with self.fs.open(path, 'r') as f:
+            return f.read()
+
+    def _parse_line(self, line):
+        return tuple(
+            None if value == self.null else (parser(value) if parser else value)
+            for value, parser in zip(line.split(self.sep), self._parsers)
+        )
+
+    def __iter_rows(self):
+        pool = ThreadPool(self.parallelism)
+        try:
+            files = iter(self.files)
+            pending = deque(pool.apply_async(self._read_file, (path,)) for path in islice(files, self.parallelism))
+            while pending:
+                content = pending.popleft().get()
+                for path in islice(files, 1):
+                    pending.append(pool.apply_async(self._read_file, (path,)))
+                for line in self._iter_lines(content):
+                    yield self._parse_line(line)
+                del content
+        finally:
+            pool.terminate()
+
+    @classmethod
+    def _iter_lines(cls, content):
+        # Avoids holding a second (split) copy of the file contents in memory.
+        # Empty lines are rows (e.g. an empty string in a single column), and
+        # only the empty segment following a trailing newline is skipped.
+        start = 0
+        while start < len(content):
+            end = content.find('\n', start)
+            if end == -1:
+                end = len(content)
+            yield content[start:end]
+            start = end + 1
+
+    def __iter__(self):
+        return self._rows
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def fetchmany(self, size=1):
+        rows = []
+        for row in self._rows:
+            rows.append(row)
+            if len(rows) >= size:
+                break
+        return rows
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._rows.close()
+        if self.cleanup:
+            try:
+                self.fs.remove(self.path, recursive=True)
+            except Exception as e:
+                logger.warning("Unable to remove temporary query results at '{}': {}".format(self.path, e))
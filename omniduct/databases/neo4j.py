@@ -1,7 +1,11 @@
 from __future__ import absolute_import
 
+import threading
+from itertools import islice
+
 from omniduct.utils.debug import logger
 
+from . import cursor_formatters
 from .base import DatabaseClient
 
 
@@ -9,18 +13,28 @@ class Neo4jClient(DatabaseClient):
     """
     This Duct connects to a Neo4j graph database server using the `neo4j` python
     library.
+
+    Results are returned as `Neo4jCursor` instances, which stream records
+    lazily from the server, and so can be used with all of the standard
+    formatters. In addition, a 'graph' formatter is available, which returns
+    results column-wise with nodes, relationships and paths converted to
+    plain Python structures (see `Neo4jGraphCursorFormatter`).
     """
 
     PROTOCOLS = ['neo4j']
     DEFAULT_PORT = 7687
     DEFAULT_CURSOR_FORMATTER = 'raw'
 
+    CURSOR_FORMATTERS = dict(DatabaseClient.CURSOR_FORMATTERS)
+
     @classmethod
     def statement_cleanup(cls, statement):
         return statement  # base statement cleanup assumes SQL
 
     def _init(self):
         self.__driver = None
+        self.__sessions = []
+        self.__sessions_lock = threading.Lock()
 
     # Connection
     def _connect(self):
@@ -30,25 +44,59 @@ class Neo4jClient(DatabaseClient):
         self.__driver = GraphDatabase.driver("bolt://{}:{}".format(self.host, self.port), auth=auth)  # TODO: Add kerberos support
 
     def _is_connected(self):
-        return hasattr(self, '__driver') and self.__driver is not None
+        return self.__driver is not None
 
     def _disconnect(self):
         logger.info('Disconnecting from Neo4J graph database ...')
+        with self.__sessions_lock:
+            sessions, self.__sessions = self.__sessions, []
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
         try:
             self.__driver.close()
         except Exception:
             pass
         self.__driver = None
 
-    # Querying
-    def _execute(self, statement, cursor=None, async=False):
-        with self.__driver.session() as session:
-            result = session.run(statement)
+    # Session pooling
+    def _session_acquire(self):
+        with self.__sessions_lock:
+            if self.__sessions:
+                return self.__sessions.pop()
+        return self.__driver.session()
+
+    def _session_release(self, session, healthy=True):
+        # Sessions are only reused once their results have been fully consumed,
+        # and are discarded if an error occurred.
+        if healthy and self.__driver is not None:
+            with self.__sessions_lock:
+                self.__sessions.append(session)
+        else:
+            try:
+                session.close()
+            except Exception:
+                pass
 
-        # hacky: make the result look like a cursor
-        result.close = result.detach
-        result.fetchall = result.records
-        return result
+    # Querying
+    def _execute(self, statement, cursor=None, async=False, params=None):
+        """
+        Additional Parameters:
+            params (dict, None): Parameters to be passed to the server alongside
+                the Cypher statement (referenced as `$name` or `{name}`), which
+                allows Neo4j to reuse cached query plans.
+        """
+        if cursor is not None:
+            cursor.close()  # Return the session of the previous result to the pool
+        session = self._session_acquire()
+        try:
+            result = session.run(statement, params)
+        except Exception:
+            self._session_release(session, healthy=False)
+            raise
+        return Neo4jCursor(result, release=lambda healthy: self._session_release(session, healthy=healthy))
 
     def _table_exists(self, table, schema=None):
         raise Exception('tables do not apply to the Neo4J graph database')
@@ -64,3 +112,106 @@ class Neo4jClient(DatabaseClient):
 
     def _table_props(self, table, **kwargs):
         raise Exception('tables do not apply to the Neo4J graph database')
+
+
+class Neo4jCursor(object):
+    """
+    A DBAPI2-like cursor adapter for `neo4j` statement results, which streams
+    records lazily from the server as they are fetched. Rows are the `neo4j`
+    `Record` instances themselves (which behave as tuples). Once all records
+    have been consumed (or the cursor is closed), the underlying session is
+    released back to the client's session pool.
+    """
+
+    def __init__(self, result, release=None):
+        self._result = result
+        self._records = iter(result)
+        self._release = release
+        self.description = [(key, None, None, None, None, None, True) for key in result.keys()]
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        try:
+            rows = list(islice(self._records, size))
+        except Exception:
+            self._finish(healthy=False)
+            raise
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        return list(self)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(1000)
+            for row in rows:
+                yield row
+            if len(rows) < 1000:
+                return
+
+    def close(self):
+        if self._release is None:
+            return
+        try:
+            self._result.consume()  # Discard any unfetched records
+        except Exception:
+            self._finish(healthy=False)
+        else:
+            self._finish()
+
+    def _finish(self, healthy=True):
+        release, self._release = self._release, None
+        self._records = iter(())
+        if release is not None:
+            release(healthy)
+
+
+class Neo4jGraphCursorFormatter(cursor_formatters.ColumnarCursorFormatter):
+    """
+    Formats graph query results column-wise (as for `ColumnarCursorFormatter`),
+    converting graph entities into plain Python structures that are easy to
+    serialize and load into other tools:
+
+    - nodes become dictionaries of their properties, along with `_id` and
+      `_labels`;
+    - relationships become dictionaries of their properties, along with `_id`,
+      `_type`, `_start` and `_end` (the ids of the nodes they connect);
+    - paths become dictionaries with `nodes` and `relationships` lists.
+    """
+
+    def prepare_row(self, row):
+        return tuple(self.convert(value) for value in row)
+
+    @classmethod
+    def convert(cls, value):
+        if hasattr(value, 'nodes') and hasattr(value, 'relationships'):  # Path
+            return {
+                'nodes': [cls.convert(node) for node in value.nodes],
+                'relationships': [cls.convert(rel) for rel in value.relationships],
+            }
+        if hasattr(value, 'labels') and hasattr(value, 'id'):  # Node
+            converted = dict(value.items())
+            converted.update(_id=value.id, _labels=sorted(value.labels))
+            return converted
+        if hasattr(value, 'type') and hasattr(value, 'id') and hasattr(value, 'items'):  # Relationship
+            converted = dict(value.items())
+            converted.update(
+                _id=value.id,
+                _type=value.type,
+                _start=getattr(value, 'start', None),
+                _end=getattr(value, 'end', None),
+            )
+            return converted
+        if isinstance(value, list):
+            return [cls.convert(item) for item in value]
+        if isinstance(value, dict):
+            return {key: cls.convert(item) for key, item in value.items()}
+        return value
+
+
+Neo4jClient.CURSOR_FORMATTERS['graph'] = Neo4jGraphCursorFormatter
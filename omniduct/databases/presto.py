@@ -1,13 +1,18 @@
 from __future__ import absolute_import
 
 import ast
+import hashlib
 import logging
 import re
 import sys
+import threading
+import time
 
 import pandas.io.sql
 import six
 from future.utils import raise_with_traceback
+from six.moves.queue import Full, Queue
+from six.moves.urllib.parse import quote_plus
 
 from omniduct.utils.debug import logger
 
@@ -27,6 +32,15 @@ class PrestoClient(DatabaseClient):
     Attributes:
         catalog (str): The default catalog to use in database queries.
         schema (str): The default schema/database to use in database queries.
+        prefetch_pages (int): The number of result pages to prefetch in a
+            background thread while the current page is being processed (0
+            disables prefetching).
+        metrics_sink (callable, None): A callable to which the statistics of
+            each completed query are passed (as a dictionary).
+        last_query_stats (dict, None): The statistics of the most recently
+            completed query (see `PrestoClient.QUERY_STATS`).
+        metadata_ttl (int): The number of seconds after which cached schema
+            metadata is refreshed (in the background).
         connection_options (dict): Additional options to pass on to
             `pyhive.presto.connect(...)`.
     """
@@ -34,18 +48,62 @@ class PrestoClient(DatabaseClient):
     PROTOCOLS = ['presto']
     DEFAULT_PORT = 3506
 
-    def _init(self, catalog='default', schema='default', source=None, **connection_options):
+    # Mapping of query statistic names to the Presto statistics from which they
+    # are extracted, and the factor by which they are scaled (milliseconds are
+    # converted to seconds).
+    QUERY_STATS = {
+        'queued_time': ('queuedTimeMillis', 1e-3),
+        'elapsed_time': ('elapsedTimeMillis', 1e-3),
+        'wall_time': ('wallTimeMillis', 1e-3),
+        'cpu_time': ('cpuTimeMillis', 1e-3),
+        'processed_rows': ('processedRows', 1),
+        'processed_bytes': ('processedBytes', 1),
+        'peak_memory_bytes': ('peakMemoryBytes', 1),
+        'nodes': ('nodes', 1),
+        'total_splits': ('totalSplits', 1),
+    }
+
+    # Regular expressions used to parse the cost estimates of plan nodes
+    # reported by `EXPLAIN`. Older versions of Presto report "Cost" rather
+    # than "Estimates", and newer versions (and Trino) omit the "- " prefix of
+    # plan nodes.
+    _EXPLAIN_NODE = re.compile(r'^\s*(?:- )?(\w+)\[')
+    _EXPLAIN_ESTIMATES = re.compile(r'(?:Estimates|Cost): \{rows: ([\d.,]+|\?) \(([\d.,]+[kMGTP]?B|\?)\)')
+    _DATA_SIZE_UNITS = {'B': 0, 'kB': 1, 'MB': 2, 'GB': 3, 'TB': 4, 'PB': 5}
+    # The (optional) `EXPLAIN` prefix of a statement, which is not itself
+    # part of a prepared statement.
+    _EXPLAIN_PREFIX = re.compile(r'^(\s*EXPLAIN(?:\s+ANALYZE)?(?:\s*\([^)]*\))?\s+)?(.*)$', flags=re.IGNORECASE | re.DOTALL)
+
+    def _init(self, catalog='default', schema='default', source=None, prefetch_pages=0,
+              metrics_sink=None, metadata_ttl=24 * 3600, **connection_options):
         """
         catalog (str): The default catalog to use in database queries.
         schema (str): The default schema/database to use in database queries.
         source (str): The source of this query (by default "omniduct <version>").
             If manually specified, result will be: "<source> / omniduct <version>".
+        prefetch_pages (int): The number of result pages to prefetch in a
+            background thread while the current page is being processed, which
+            overlaps network latency with decoding and formatting of results.
+            Defaults to 0 (disabled). Can be overridden per query by passing
+            `prefetch_pages` to `.query()`, `.stream()` or `.execute()`.
+        metrics_sink (callable, None): A callable to which the statistics of
+            each completed query are passed as a dictionary (including the
+            query id, state, user, source and statement, along with the
+            statistics listed in `PrestoClient.QUERY_STATS`), for example to
+            record query costs. Statistics of the most recently completed
+            query are also available as `.last_query_stats`, and those of the
+            query associated with a cursor as `cursor.query_stats`.
         connection_options (dict): Additional options to pass on to
             `pyhive.presto.connect(...)`.
         """
         self.catalog = catalog
         self.schema = schema
         self.source = source
+        self.prefetch_pages = prefetch_pages
+        self.metrics_sink = metrics_sink
+        self.last_query_stats = None
+        self.metadata_ttl = metadata_ttl
+        self._metadata = PrestoMetadataCache(self)
         self.connection_options = connection_options
         self.__presto = None
         self.connection_fields += ('catalog', 'schema')
@@ -93,22 +151,50 @@ class PrestoClient(DatabaseClient):
         self._schemas = None
 
     # Querying
-    def _execute(self, statement, cursor=None, async=False):
+    def _execute(self, statement, cursor=None, async=False, prefetch_pages=None, params=None):
         """
         If something goes wrong, `PrestoClient` will attempt to parse the error
         log and present the user with useful debugging information. If that fails,
         the full traceback will be raised instead.
+
+        Additional Parameters:
+            prefetch_pages (int, None): The number of result pages to prefetch
+                in a background thread once results start arriving (overrides
+                `.prefetch_pages` if not `None`; 0 disables prefetching).
+            params (list, tuple, dict, None): Parameters to be bound to the
+                statement. If a list or tuple, the statement should use `?`
+                placeholders, and is executed server-side as a prepared
+                statement (`EXECUTE ... USING ...`), so that parameter values
+                are bound by Presto rather than rendered into the statement.
+                Note that the full statement is still sent with every request
+                (in the `X-Presto-Prepared-Statement` header), so this does not
+                reduce parsing or planning overhead. If a dictionary, the
+                statement should use `%(name)s` placeholders, which are escaped
+                and substituted by `pyhive`.
         """
         from pyhive.exc import DatabaseError  # Imported here due to slow import performance in Python 3
+        if prefetch_pages is None:
+            prefetch_pages = self.prefetch_pages
         try:
             cursor = cursor or self.__presto.cursor()
-            cursor.execute(statement)
+            PrestoPagePrefetcher.detach(cursor)
+            PrestoPreparedStatementSession.detach(cursor)
+            self._capture_query_stats(cursor, statement)
+            if isinstance(params, (list, tuple)):
+                cursor.execute(self._prepare_statement(cursor, statement, params))
+            else:
+                cursor.execute(statement, params)
             status = cursor.poll()
             if not async:
                 logger.progress(0)
                 # status None means command executed successfully
                 # See https://github.com/dropbox/PyHive/blob/master/pyhive/presto.py#L234
                 while status is not None and status['stats']['state'] != "FINISHED":
+                    if prefetch_pages and 'data' in status:
+                        # Results have started arriving, so hand over remaining
+                        # pages to the prefetcher.
+                        PrestoPagePrefetcher(cursor, max_pages=prefetch_pages).attach()
+                        break
                     if status['stats'].get('totalSplits', 0) > 0:
                         pct_complete = round(status['stats']['completedSplits'] / float(status['stats']['totalSplits']), 4)
                         logger.progress(pct_complete * 100)
@@ -148,14 +234,92 @@ class PrestoClient(DatabaseClient):
 
             raise_with_traceback(exception, traceback)
 
-    def _push(self, df, table, if_exists='fail', schema=None, **kwargs):
+    def _prepare_statement(self, cursor, statement, params):
+        """
+        Attach `statement` to `cursor` as a Presto prepared statement (which
+        Presto clients declare using the `X-Presto-Prepared-Statement` request
+        header), and return the `EXECUTE` statement which binds `params` to it.
+        If `statement` is an `EXPLAIN` statement, the explained statement is
+        prepared instead, and the `EXECUTE` statement is explained.
+        """
+        from pyhive.presto import _escaper  # Imported here due to slow import performance in Python 3
+        explain, statement = self._EXPLAIN_PREFIX.match(statement).groups()
+        name = 'omniduct_{}'.format(hashlib.sha1(statement.encode('utf-8')).hexdigest()[:16])
+        PrestoPreparedStatementSession(cursor, name, statement).attach()
+        execute = 'EXECUTE {}'.format(name)
+        if params:
+            execute += ' USING {}'.format(', '.join(six.text_type(arg) for arg in _escaper.escape_args(tuple(params))))
+        return (explain or '') + execute
+
+    def _capture_query_stats(self, cursor, statement):
+        """
+        Wrap the response processing of `cursor` such that the statistics
+        reported by Presto alongside each page of results are retained, and
+        recorded once the query completes (which, for queries with many pages
+        of results, happens only once all results have been fetched).
+
+        Note: This relies on the internal `_process_response` method of
+        `pyhive.presto.Cursor`.
+        """
+        cursor.__dict__.pop('_process_response', None)
+        process_response = cursor._process_response
+
+        def process_response_and_capture_stats(response):
+            try:
+                payload = response.json()
+            except ValueError:  # Not a JSON response; leave pyhive to raise the appropriate error
+                return process_response(response)
+            response.json = lambda **kwargs: payload  # Avoid decoding the payload again
+
+            try:
+                return process_response(response)
+            finally:
+                if 'stats' in payload:
+                    cursor.query_stats = self._format_query_stats(payload, statement)
+                    if 'nextUri' not in payload or 'error' in payload:
+                        self._record_query_stats(cursor.query_stats)
+
+        cursor._process_response = process_response_and_capture_stats
+
+    def _format_query_stats(self, payload, statement):
+        stats = payload['stats']
+        query_stats = {
+            'query_id': payload.get('id'),
+            'state': stats.get('state'),
+            'user': self.username,
+            'source': self.source,
+            'statement': statement,
+        }
+        for name, (key, scale) in self.QUERY_STATS.items():
+            query_stats[name] = stats[key] * scale if stats.get(key) is not None else None
+        return query_stats
+
+    def _record_query_stats(self, query_stats):
+        self.last_query_stats = query_stats
+        logger.info(
+            "Query {query_id} {state}: {processed_rows} rows ({processed_bytes} bytes) processed "
+            "in {elapsed_time}s (CPU: {cpu_time}s; queued: {queued_time}s; peak memory: {peak_memory_bytes} bytes)."
+            .format(**query_stats)
+        )
+        if self.metrics_sink is not None:
+            try:
+                self.metrics_sink(query_stats)
+            except Exception as e:
+                logger.warning("Failed to record query statistics to metrics sink: {}".format(e))
+
+    def _push(self, df, table, if_exists='fail', schema=None, batch_size=None, **kwargs):
         """
+        Data is inserted using batched multi-row `INSERT` statements.
+
         Additional parameters:
             schema (str): The schema into which the table should be pushed. If
                 not specified, the schema will be set to your username.
+            batch_size (int): The number of rows to insert per statement
+                (defaults to `PrestoClient.PUSH_BATCH_ROWS`).
+            **kwargs (dict): Additional arguments to send to `pandas.DataFrame.to_sql`.
         """
-        return df.to_sql(name=table, con=self._sqlalchemy_engine, index=False,
-                         if_exists=if_exists, schema=schema or self.username, **kwargs)
+        return self._push_batched(df, table, engine=self._sqlalchemy_engine, if_exists=if_exists,
+                                  schema=schema or self.username, batch_size=batch_size, **kwargs)
 
     def _cursor_empty(self, cursor):
         return False
@@ -169,10 +333,156 @@ class PrestoClient(DatabaseClient):
         return self.query(cmd, **kwargs)
 
     def _table_exists(self, table, schema=None):
-        return (self.table_list(renew=True, schema=schema)['Table'] == table).any()
+        return self._tables_exist([table], schema=schema)[table]
 
-    def _table_desc(self, table, **kwargs):
-        return self.query("DESCRIBE {0}".format(table), **kwargs)
+    def _tables_exist(self, tables, schema=None):
+        """
+        The existence of all tables is checked using a single query against
+        `information_schema.tables` per catalog (tables may be qualified by
+        catalog, as in "<catalog>.<schema>.<table>").
+
+        Additional Parameters:
+            schema (str): The schema of unqualified table names (defaults to
+                `.schema`).
+        """
+        names = self.__table_names(tables, schema)
+        found = set()
+        for catalog, catalog_names in self.__by_catalog(names.values()).items():
+            result = self.query(
+                "SELECT table_schema, table_name FROM {}information_schema.tables WHERE {}"
+                .format(self.__catalog_prefix(catalog), self._table_names_predicate(catalog_names)),
+                use_cache=False
+            )
+            found.update((catalog, schema, table) for schema, table in zip(result['table_schema'], result['table_name']))
+        return {table: name in found for table, name in names.items()}
+
+    def _tables_desc(self, tables, schema=None, **kwargs):
+        """
+        All tables are described using a single query against
+        `information_schema.columns` per catalog (with the same columns as
+        `DESCRIBE`). Tables which do not exist are described by empty
+        dataframes.
+
+        Additional Parameters:
+            schema (str): The schema of unqualified table names (defaults to
+                `.schema`).
+        """
+        names = self.__table_names(tables, schema)
+        descs = {}
+        empty = None
+        for catalog, catalog_names in self.__by_catalog(names.values()).items():
+            columns = self.query(
+                'SELECT table_schema, table_name, column_name AS "Column", data_type AS "Type", '
+                'extra_info AS "Extra", comment AS "Comment" '
+                'FROM {}information_schema.columns WHERE {} '
+                'ORDER BY table_schema, table_name, ordinal_position'
+                .format(self.__catalog_prefix(catalog), self._table_names_predicate(catalog_names)),
+                **kwargs
+            )
+            for (schema, table), desc in columns.groupby(['table_schema', 'table_name'], sort=False):
+                descs[(catalog, schema, table)] = desc.drop(['table_schema', 'table_name'], axis=1).reset_index(drop=True)
+            empty = columns.drop(['table_schema', 'table_name'], axis=1).iloc[:0]
+        return {table: descs.get(name, empty) for table, name in names.items()}
+
+    def __table_names(self, tables, schema=None):
+        # Map table names to lower-cased (catalog, schema, table) tuples
+        names = {}
+        for table in tables:
+            parts = [part.strip('"') for part in table.split('.')]
+            catalog = parts[-3] if len(parts) > 2 else self.catalog
+            names[table] = tuple(
+                name.lower() for name in (catalog,) + self._table_name_split('.'.join(parts[-2:]), schema or self.schema)
+            )
+        return names
+
+    @staticmethod
+    def __by_catalog(names):
+        by_catalog = {}
+        for catalog, schema, table in names:
+            by_catalog.setdefault(catalog, []).append((schema, table))
+        return by_catalog
+
+    def __catalog_prefix(self, catalog):
+        # The session catalog's `information_schema` need not be qualified
+        return '' if catalog == self.catalog.lower() else '"{}".'.format(catalog.replace('"', '""'))
+
+    def _table_desc(self, table, renew=False, **kwargs):
+        """
+        Unless additional arguments are passed on to `.query()`, descriptions
+        of tables in the session catalog are served from the schema metadata
+        cache. Tables qualified by another catalog (as in
+        "<catalog>.<schema>.<table>") are described using that catalog's
+        `information_schema`.
+
+        Additional Parameters:
+            renew (bool): Whether to refresh the cached description before
+                returning it (default: False).
+        """
+        if kwargs:
+            return self.query("DESCRIBE {0}".format(table), renew=renew, **kwargs)
+        catalog, schema, name = self.__table_names([table])[table]
+        if catalog != self.catalog.lower():
+            return self._tables_desc([table], renew=renew)[table]
+        return self._metadata.table_desc(schema, name, renew=renew)
+
+    def _explain(self, statement, analyze=False, **kwargs):
+        """
+        Statements are explained using `EXPLAIN (TYPE DISTRIBUTED)`, and the
+        estimated rows and bytes read are those estimated for table scans.
+        If no scans are found, or any scan lacks an estimate, the estimates are
+        unknown (`None`).
+
+        Additional Parameters:
+            analyze (bool): Whether to use `EXPLAIN ANALYZE` instead, which
+                *executes* the statement in order to report its actual costs
+                (default: False).
+        """
+        rows = self.query(
+            "{}\n{}".format('EXPLAIN ANALYZE' if analyze else 'EXPLAIN (TYPE DISTRIBUTED)', statement),
+            format='tuple', use_cache=False, template=False, **kwargs
+        )
+        plan = '\n'.join(row[0] for row in rows or [])
+
+        totals = {'rows': 0, 'bytes': 0}
+        scans = estimated = 0
+        node = None
+        for line in plan.splitlines():
+            match = self._EXPLAIN_NODE.match(line)
+            if match:
+                node = match.group(1)
+                scans += 'Scan' in node
+                continue
+            match = self._EXPLAIN_ESTIMATES.search(line)
+            if match and node is not None and 'Scan' in node:
+                # Only the first estimate of a node corresponds to the scan itself
+                estimated += 1
+                for key, value in zip(('rows', 'bytes'), (self._parse_count(match.group(1)),
+                                                          self._parse_data_size(match.group(2)))):
+                    totals[key] = None if value is None or totals[key] is None else totals[key] + value
+                node = None
+
+        # Plans which could not be parsed have unknown costs
+        known = scans > 0 and estimated == scans
+        return {'plan': plan, 'rows': totals['rows'] if known else None, 'bytes': totals['bytes'] if known else None}
+
+    @classmethod
+    def _parse_count(cls, count):
+        if count == '?':
+            return None
+        return float(count.replace(',', ''))
+
+    @classmethod
+    def _parse_data_size(cls, size):
+        match = re.match(r'^([\d.,]+)([kMGTP]?B)$', size)
+        if not match:
+            return None
+        return float(match.group(1).replace(',', '')) * 1024 ** cls._DATA_SIZE_UNITS[match.group(2)]
+
+    def _statement_sampled_relation(self, statement, sample=None):
+        relation = DatabaseClient._statement_sampled_relation(self, statement)
+        if sample is not None:
+            relation += " TABLESAMPLE BERNOULLI ({})".format(float(sample))
+        return relation
 
     def _table_head(self, table, n=10, **kwargs):
         return self.query("SELECT * FROM {} LIMIT {}".format(table, n), **kwargs)
@@ -185,7 +495,9 @@ class PrestoClient(DatabaseClient):
         """
         This object has as attributes the schemas on the current catalog. These
         schema objects in turn have the tables as SQLAlchemy `Table` objects.
-        This allows tab completion and exploration of Presto Databases.
+        This allows tab completion and exploration of Presto Databases. Schema,
+        table and column names are served from the schema metadata cache (see
+        `metadata_ttl`).
         """
         from werkzeug import LocalProxy
 
@@ -194,8 +506,304 @@ class PrestoClient(DatabaseClient):
                 self.connect()
                 try:
                     from .schemas import Schemas
-                    self._schemas = Schemas(self._sqlalchemy_metadata)
+                    self._schemas = Schemas(self._sqlalchemy_metadata, metadata_cache=self._metadata)
                 except ImportError:
                     logger.warning('cannot import Schemas, perhaps sqlalchemy is not up to date')
             return self._schemas
         return LocalProxy(get_schemas)
+
+
+class PrestoMetadataCache(object):
+    """
+    `PrestoMetadataCache` caches the schema metadata of a Presto catalog
+    (schema names, the tables and columns of each schema, and table
+    descriptions), both in memory and in the cache of the `PrestoClient` (if
+    configured), so that it survives reconnections and new sessions. Entries
+    older than the client's `metadata_ttl` continue to be served while they are
+    refreshed in a background thread.
+
+    Columns are loaded for an entire schema at once from `information_schema`,
+    rather than by reflecting each table individually.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    # Metadata accessors (each of which reloads metadata if `renew` is True)
+
+    def schema_names(self, renew=False):
+        return self._get('schemas', self._load_schema_names, renew=renew)
+
+    def table_names(self, schema, renew=False):
+        return sorted(self.columns(schema, renew=renew))
+
+    def columns(self, schema, renew=False):
+        """
+        Returns:
+            dict<str, list<tuple>>: A mapping from table name to a list of
+                (column name, data type) tuples.
+        """
+        return self._get('columns:{}'.format(schema), lambda: self._load_columns(schema), renew=renew)
+
+    def table_desc(self, schema, table, renew=False):
+        desc = self._get('desc:{}.{}'.format(schema, table), lambda: self._load_table_desc(schema, table), renew=renew)
+        return desc.copy()
+
+    # Cache management
+
+    @property
+    def _id_duct(self):
+        return "{}.{}".format(self.client.__class__.__name__, self.client.name)
+
+    def _id_str(self, key):
+        return 'metadata:{}:{}'.format(self.client.catalog, key)
+
+    def _get(self, key, loader, renew=False):
+        id_str = self._id_str(key)
+        entry = None if renew else self._entries.get(id_str)
+        if entry is None and not renew:
+            entry = self._cache_get(id_str)
+        if entry is None:
+            entry = self._refresh(id_str, loader)
+        elif time.time() - entry[0] > self.client.metadata_ttl:
+            self._refresh_async(id_str, loader)
+        return entry[1]
+
+    def _cache_get(self, id_str):
+        cache = self.client.cache
+        if cache is None or not cache.has_key(self._id_duct, id_str):  # noqa: has_key is not of a dictionary here
+            return None
+        try:
+            entry = cache.get(self._id_duct, id_str)
+        except Exception as e:
+            logger.warning("Failed to load schema metadata from cache: {}".format(e))
+            return None
+        with self._lock:
+            self._entries[id_str] = entry
+        return entry
+
+    def _refresh(self, id_str, loader):
+        entry = (time.time(), loader())
+        with self._lock:
+            self._entries[id_str] = entry
+        cache = self.client.cache
+        if cache is not None:
+            try:
+                cache.set(self._id_duct, id_str, entry)
+            except Exception as e:
+                cache.clear(self._id_duct, id_str)
+                logger.warning("Failed to save schema metadata to cache: {}".format(e))
+        return entry
+
+    def _refresh_async(self, id_str, loader):
+        with self._lock:
+            if id_str in self._refreshing:
+                return
+            self._refreshing.add(id_str)
+
+        def refresh():
+            try:
+                self._refresh(id_str, loader)
+            except Exception as e:
+                logger.debug("Failed to refresh schema metadata for '{}': {}".format(id_str, e))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(id_str)
+
+        thread = threading.Thread(target=refresh)
+        thread.daemon = True
+        thread.start()
+
+    # Metadata loading
+
+    def _fetch(self, statement):
+        # Executed asynchronously so that progress is not reported (which would
+        # interfere with other output when refreshing in the background).
+        cursor = self.client.execute(statement, async=True, template=False)
+        return self.client._get_formatter('pandas', cursor).dump()
+
+    def _load_schema_names(self):
+        return sorted(self._fetch("SHOW SCHEMAS")['Schema'])
+
+    def _load_columns(self, schema):
+        columns = self._fetch(
+            "SELECT table_name, column_name, data_type "
+            "FROM information_schema.columns "
+            "WHERE table_schema = '{}' "
+            "ORDER BY table_name, ordinal_position"
+            .format(schema.replace("'", "''"))
+        )
+        tables = {}
+        for table, column, data_type in columns.itertuples(index=False):
+            tables.setdefault(table, []).append((column, data_type))
+        return tables
+
+    def _load_table_desc(self, schema, table):
+        return self._fetch('DESCRIBE "{}"."{}"'.format(schema, table))
+
+
+class _PrefetchedResponse(object):
+    """
+    A stand-in for a `requests.Response` instance whose JSON payload has already
+    been decoded (by the prefetching thread). All other attributes (including
+    the raw `content`) are those of the original response, and so the payload
+    is never decoded twice.
+    """
+
+    def __init__(self, response, payload):
+        self._response = response
+        self._payload = payload
+
+    def json(self, **kwargs):
+        return self._payload
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class PrestoPagePrefetcher(object):
+    """
+    A wrapper around the `requests` session of a `pyhive` Presto cursor, which
+    fetches (and decodes) the pages of results of a running query in a bounded
+    background thread, so that the network round-trip for the next page
+    overlaps with the processing of the current one. When the cursor requests
+    the next page, the prefetched response is handed back to it, and so the
+    cursor API (`fetchone`, `fetchmany`, `fetchall`, iteration) is otherwise
+    unchanged. Prefetching stops once the query is cancelled, or the cursor is
+    reused or discarded.
+
+    Note: This relies on the internal `_requests_session`, `_requests_kwargs`
+    and `_nextUri` attributes of `pyhive.presto.Cursor`.
+    """
+
+    def __init__(self, cursor, max_pages=2):
+        """
+        cursor (pyhive.presto.Cursor): The cursor for which to prefetch pages.
+        max_pages (int): The maximum number of pages to buffer at any one time.
+        """
+        self.cursor = cursor
+        self.session = cursor._requests_session
+        self.queue = Queue(maxsize=max(int(max_pages), 1))
+        self._stopped = threading.Event()
+        # The background thread does not reference this wrapper (or the
+        # cursor), so that it is stopped when the cursor is discarded.
+        self._thread = threading.Thread(
+            target=self._fetch_pages,
+            args=(self.session, cursor._nextUri, dict(cursor._requests_kwargs or {}), self.queue, self._stopped)
+        )
+        self._thread.daemon = True
+
+    @classmethod
+    def detach(cls, cursor):
+        """
+        Stop any prefetcher attached to `cursor`, and restore the cursor's
+        original `requests` session.
+        """
+        prefetcher = cursor.__dict__.get('_requests_session')
+        if isinstance(prefetcher, cls):
+            prefetcher.stop()
+            cursor._requests_session = prefetcher.session
+
+    def attach(self):
+        self.detach(self.cursor)
+        self.cursor._requests_session = self
+        self.cursor = None  # Avoid a reference cycle between the cursor and this wrapper
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def __del__(self):
+        self.stop()
+
+    @staticmethod
+    def _fetch_pages(session, uri, request_kwargs, queue, stopped):
+        import requests
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        try:
+            while uri and not stopped.is_set():
+                response = session.get(uri, **request_kwargs)
+                if response.status_code != requests.codes.ok:
+                    put((uri, response))  # Let the cursor raise the appropriate error
+                    return
+                payload = response.json()
+                if not put((uri, _PrefetchedResponse(response, payload))):
+                    return
+                uri = payload.get('nextUri')
+        except Exception as e:
+            put((uri, e))
+
+    def get(self, url, **kwargs):
+        if not self._stopped.is_set():
+            uri, item = self.queue.get()
+            if uri == url:
+                if isinstance(item, Exception):
+                    raise item
+                return item
+            self.stop()  # The cursor has diverged from the prefetched pages
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        self.stop()
+        return self.session.delete(url, **kwargs)
+
+
+class PrestoPreparedStatementSession(object):
+    """
+    A wrapper around the `requests` session of a `pyhive` Presto cursor, which
+    declares a prepared statement (via the `X-Presto-Prepared-Statement`
+    header) in each request made by the cursor, so that it can be referenced
+    by name in `EXECUTE` statements.
+
+    Note: This relies on the internal `_requests_session` attribute of
+    `pyhive.presto.Cursor`.
+    """
+
+    def __init__(self, cursor, name, statement):
+        self.cursor = cursor
+        self.session = cursor._requests_session
+        self.header = '{}={}'.format(name, quote_plus(statement))
+
+    @classmethod
+    def detach(cls, cursor):
+        """
+        Restore the original `requests` session of `cursor`, if a prepared
+        statement has been attached to it.
+        """
+        if isinstance(cursor.__dict__.get('_requests_session'), cls):
+            cursor._requests_session = cursor._requests_session.session
+
+    def attach(self):
+        self.detach(self.cursor)
+        self.cursor._requests_session = self
+
+    def _with_header(self, kwargs):
+        headers = dict(kwargs.pop('headers', None) or {})
+        headers['X-Presto-Prepared-Statement'] = self.header
+        kwargs['headers'] = headers
+        return kwargs
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **self._with_header(kwargs))
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **self._with_header(kwargs))
+
+    def delete(self, url, **kwargs):
+        return self.session.delete(url, **self._with_header(kwargs))
@@ -1,4 +1,5 @@
 import logging
+import re
 
 import pandas as pd
 from sqlalchemy import (ARRAY, Boolean, Column, Float, Integer, MetaData,
@@ -58,9 +59,13 @@ class TableDesc(Table):
 # Define helpers to allow for table completion/etc
 class Schemas(object):
 
-    def __init__(self, metadata):
+    def __init__(self, metadata, metadata_cache=None):
         self._metadata = metadata
-        self._schema_names = inspect(self._metadata.bind).get_schema_names()
+        self._metadata_cache = metadata_cache
+        if metadata_cache is not None:
+            self._schema_names = metadata_cache.schema_names()
+        else:
+            self._schema_names = inspect(self._metadata.bind).get_schema_names()
         self._schema_cache = {}
 
     def __dir__(self):
@@ -72,7 +77,8 @@ class Schemas(object):
     def __getattr__(self, value):
         if value in self._schema_names:
             if value not in self._schema_cache:
-                self._schema_cache[value] = Schema(metadata=self._metadata, schema=value)
+                self._schema_cache[value] = Schema(metadata=self._metadata, schema=value,
+                                                   metadata_cache=self._metadata_cache)
             return self._schema_cache[value]
         raise AttributeError("No such schema {}".format(value))
 
@@ -89,10 +95,14 @@ class Schemas(object):
 
 class Schema(object):
 
-    def __init__(self, metadata, schema):
+    def __init__(self, metadata, schema, metadata_cache=None):
         self._metadata = metadata
         self._schema = schema
-        self._table_names = inspect(self._metadata.bind).get_table_names(schema)
+        self._metadata_cache = metadata_cache
+        if metadata_cache is not None:
+            self._table_names = metadata_cache.table_names(schema)
+        else:
+            self._table_names = inspect(self._metadata.bind).get_table_names(schema)
         self._table_cache = {}
 
     def __dir__(self):
@@ -103,7 +113,17 @@ class Schema(object):
 
     def __getattr__(self, table):
         if table in self._table_names:
-            if table not in self._table_cache:
+            if table not in self._table_cache and self._metadata_cache is not None:
+                # Construct table from cached column metadata rather than by reflection
+                columns = [
+                    Column(name, _type_map.get(re.sub(r'\(.*\)$', '', data_type), types.NullType))
+                    for name, data_type in self._metadata_cache.columns(self._schema).get(table, [])
+                ]
+                self._table_cache[table] = TableDesc('{}'.format(table), self._metadata, *columns,
+                                                     schema=self._schema,
+                                                     extend_existing=True
+                                                     )
+            elif table not in self._table_cache:
                 self._table_cache[table] = TableDesc('{}'.format(table), self._metadata,
                                                      autoload=True,
                                                      schema=self._schema
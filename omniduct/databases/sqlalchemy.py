@@ -1,14 +1,64 @@
 from __future__ import absolute_import
+
+import os
+import tempfile
+
 import pandas as pd
+import six
+
+from omniduct.utils.debug import logger
 
 from .base import DatabaseClient
 
 
 class SQLAlchemyClient(DatabaseClient):
+    """
+    This Duct connects to any database supported by `sqlalchemy`.
+
+    Connections are drawn from a pool maintained by the `sqlalchemy` engine,
+    which is configurable via the `pool_*` and `max_overflow` parameters, and
+    which is disposed of (closing all pooled connections) on disconnection.
+    Results of `.stream()` are fetched using server-side cursors (where
+    supported by the driver, e.g. named cursors for `psycopg2` and `SSCursor`
+    for `MySQLdb`/`pymysql`), so that they are never held in memory all at
+    once.
+    """
 
     PROTOCOLS = ['sqlalchemy', 'firebird', 'mssql', 'mysql', 'oracle', 'postgresql', 'sybase']
 
-    def _init(self, dialect=None, driver=None, database=''):
+    # Maximum number of bound parameters per statement for dialects that limit them.
+    DIALECT_BATCH_PARAMS = {
+        'mssql': 2000,
+        'sqlite': 999,
+    }
+
+    @property
+    def PUSH_BATCH_PARAMS(self):
+        return self.DIALECT_BATCH_PARAMS.get(self.dialect)
+
+    def _init(self, dialect=None, driver=None, database='', pool_size=None, max_overflow=None,
+              pool_timeout=None, pool_recycle=None, pool_pre_ping=None, stream_batch_size=10000,
+              **engine_options):
+        """
+        dialect (str): The `sqlalchemy` dialect to use (only required if the
+            protocol is 'sqlalchemy').
+        driver (str): The DBAPI driver to use for the dialect (e.g. 'psycopg2').
+        database (str): The database to connect to.
+        pool_size (int): The number of connections to keep open in the pool.
+        max_overflow (int): The number of connections to allow beyond
+            `pool_size` when the pool is exhausted.
+        pool_timeout (float): The number of seconds to wait for a connection
+            from the pool before giving up.
+        pool_recycle (int): The number of seconds after which pooled
+            connections are replaced (useful when connections are closed by
+            the server or by intermediate firewalls after some idle time).
+        pool_pre_ping (bool): Whether to test the liveness of pooled
+            connections before using them.
+        stream_batch_size (int): The number of rows to fetch from the server
+            at a time when streaming results using server-side cursors.
+        engine_options (dict): Additional options to pass on to
+            `sqlalchemy.create_engine(...)`.
+        """
 
         assert self._port is not None, "Omniduct requires SQLAlchemy databases to manually specify a port, as " \
                                        "it will often be the case that ports are being forwarded."
@@ -21,6 +71,17 @@ class SQLAlchemyClient(DatabaseClient):
 
         self.driver = driver
         self.database = database
+        self.pool_options = {
+            key: value for key, value in [
+                ('pool_size', pool_size),
+                ('max_overflow', max_overflow),
+                ('pool_timeout', pool_timeout),
+                ('pool_recycle', pool_recycle),
+                ('pool_pre_ping', pool_pre_ping),
+            ] if value is not None
+        }
+        self.stream_batch_size = stream_batch_size
+        self.engine_options = engine_options
         self.connection_fields += ('schema',)
 
         self.engine = None
@@ -37,29 +98,175 @@ class SQLAlchemyClient(DatabaseClient):
 
     def _connect(self):
         import sqlalchemy
-        self.engine = sqlalchemy.create_engine(self.db_uri)
+        options = dict(self.pool_options)
+        options.update(self.engine_options)
+        self.engine = sqlalchemy.create_engine(self.db_uri, **options)
 
     def _is_connected(self):
         return self.engine is not None
 
     def _disconnect(self):
+        if self.engine is not None:
+            self.engine.dispose()
         self.engine = None
 
-    def _execute(self, statement, query=True, cursor=None, **kwargs):
+    def _execute(self, statement, query=True, cursor=None, params=None, stream_results=False, **kwargs):
+        """
+        Additional Parameters:
+            params (dict, list, tuple, None): Parameters to be bound to the
+                statement by the DBAPI driver, using the driver's placeholder
+                style (e.g. `%(name)s` for `psycopg2` and `pymysql`, or `?` for
+                `sqlite3`).
+            stream_results (bool): Whether to fetch results incrementally using
+                a server-side cursor, where supported by the driver (default:
+                False, except when using `.stream()`). The connection is
+                returned to the pool once all results have been fetched, or
+                the cursor is closed.
+        """
+        args = () if params is None else (params,)
         if cursor:
-            cursor.execute(statement)
+            cursor.execute(statement, *args)
+        elif stream_results:
+            connection = self.engine.connect()
+            try:
+                result = connection.execution_options(
+                    stream_results=True, max_row_buffer=self.stream_batch_size
+                ).execute(statement, *args)
+            except Exception:
+                connection.close()
+                raise
+            cursor = SQLAlchemyStreamingCursor(result, connection)
         else:
-            cursor = self.engine.execute(statement).cursor
+            cursor = self.engine.execute(statement, *args).cursor
         return cursor
 
+    def stream(self, statement, format=None, format_opts={}, batch=None, **kwargs):
+        """
+        Results are fetched using a server-side cursor where supported by the
+        driver (unless `stream_results=False` is passed), so that memory usage
+        is bounded.
+        """
+        kwargs.setdefault('stream_results', True)
+        return DatabaseClient.stream(self, statement, format=format, format_opts=format_opts,
+                                     batch=batch, **kwargs)
+
     def _cursor_empty(self, cursor):
         return False
 
+    def _push(self, df, table, if_exists='fail', schema=None, bulk=True, batch_size=None, **kwargs):
+        """
+        Where supported, data is bulk loaded using the native facilities of
+        the database: `COPY ... FROM STDIN` for PostgreSQL (via `psycopg2`), and
+        `LOAD DATA LOCAL INFILE` for MySQL (which must be permitted by both the
+        server and client, e.g. by passing `local_infile=1` to the driver).
+        Otherwise, data is inserted using batched multi-row `INSERT`
+        statements. In both cases, the table is first created (or replaced)
+        using `pandas.DataFrame.to_sql`.
+
+        Additional Parameters:
+            schema (str): The schema into which the table should be pushed (if
+                not specified, the database default is used).
+            bulk (bool): Whether to use native bulk loading where supported
+                (default: True).
+            batch_size (int): The number of rows to load per `COPY`/`LOAD`
+                operation (default: 100000), or per `INSERT` statement when
+                not bulk loading (defaults to `PUSH_BATCH_ROWS`, limited by the
+                maximum number of parameters supported by the dialect).
+            **kwargs (dict): Additional arguments to send to `pandas.DataFrame.to_sql`.
+        """
+        loader = {
+            'postgresql': self._push_copy_postgresql,
+            'mysql': self._push_load_mysql,
+        }.get(self.dialect) if bulk else None
+
+        if loader is None:
+            return self._push_batched(df, table, engine=self.engine, if_exists=if_exists,
+                                      schema=schema, batch_size=batch_size, **kwargs)
+
+        # Create (or replace) the table, and then bulk load the data
+        df.head(0).to_sql(name=table, con=self.engine, index=False, if_exists=if_exists,
+                          schema=schema, **kwargs)
+
+        preparer = self.engine.dialect.identifier_preparer
+        target = preparer.quote(table) if schema is None else '{}.{}'.format(preparer.quote_schema(schema), preparer.quote(table))
+        columns = ', '.join(preparer.quote(str(col)) for col in df.columns)
+
+        batch_size = max(int(batch_size or 100000), 1)
+        offsets = list(range(0, len(df), batch_size))
+        logger.progress(0)
+        loader(df, offsets, batch_size, target, columns)
+        logger.progress(100, complete=True)
+
+    def _push_copy_postgresql(self, df, offsets, batch_size, target, columns):
+        # Null values are written as `\N` (rather than as empty fields), so that
+        # they can be distinguished from empty strings.
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for i, offset in enumerate(offsets):
+                buf = six.StringIO()  # `DataFrame.to_csv` writes `str` on both Python 2 and 3
+                df.iloc[offset:offset + batch_size].to_csv(buf, index=False, header=False, na_rep='\\N')
+                buf.seek(0)
+                cursor.copy_expert("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')".format(target, columns), buf)
+                logger.progress(100. * (i + 1) / len(offsets))
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _push_load_mysql(self, df, offsets, batch_size, target, columns):
+        # Null values are written as `\N`, and backslashes within strings are
+        # escaped, so that nulls can be distinguished from the string 'NULL'.
+        # Booleans must be loaded as integers.
+        bool_columns = {col: int for col, dtype in df.dtypes.iteritems() if dtype.kind == 'b'}
+        str_columns = [col for col, dtype in df.dtypes.iteritems() if dtype.kind == 'O']
+        fd, path = tempfile.mkstemp(prefix='omniduct_mysql', suffix='.csv')
+        os.close(fd)
+        try:
+            with self.engine.begin() as connection:
+                for i, offset in enumerate(offsets):
+                    chunk = df.iloc[offset:offset + batch_size]
+                    if bool_columns:
+                        chunk = chunk.astype(bool_columns)
+                    if str_columns:
+                        chunk = chunk.copy()
+                        for col in str_columns:
+                            chunk[col] = chunk[col].map(
+                                lambda value: value.replace('\\', '\\\\') if isinstance(value, six.string_types) else value
+                            )
+                    chunk.to_csv(path, index=False, header=False, na_rep='\\N', encoding='utf-8')
+                    connection.execute(
+                        "LOAD DATA LOCAL INFILE '{path}' INTO TABLE {target} CHARACTER SET utf8 "
+                        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+                        "LINES TERMINATED BY '{linesep}' ({columns})"
+                        .format(path=path.replace('\\', '/'), target=target, columns=columns,
+                                linesep=os.linesep.replace('\r', '\\r').replace('\n', '\\n'))
+                    )
+                    logger.progress(100. * (i + 1) / len(offsets))
+        finally:
+            os.remove(path)
+
     def _table_list(self, **kwargs):
         return self.query("SHOW TABLES", **kwargs)
 
     def _table_exists(self, table, schema=None):
-        return (self.table_list(renew=True, schema=schema)['Table'] == table).any()
+        schema, name = self._table_name_split(table, schema)
+        self.connect()
+        with self.engine.connect() as connection:
+            return self.engine.dialect.has_table(connection, name, schema=schema)
+
+    def _tables_exist(self, tables, schema=None):
+        """
+        The existence of tables is checked by listing the tables (and views)
+        of each nominated schema once, using `sqlalchemy` reflection.
+        """
+        import sqlalchemy
+        names = {table: self._table_name_split(table, schema) for table in tables}
+        self.connect()
+        inspector = sqlalchemy.inspect(self.engine)
+        found = {}
+        for schema in set(schema for schema, _ in names.values()):
+            found[schema] = set(inspector.get_table_names(schema=schema)) | set(inspector.get_view_names(schema=schema))
+        return {table: name in found[schema] for table, (schema, name) in names.items()}
 
     def _table_desc(self, table, **kwargs):
         return self.query("DESCRIBE {0}".format(table), **kwargs)
@@ -69,3 +276,60 @@ class SQLAlchemyClient(DatabaseClient):
 
     def _table_props(self, table, **kwargs):
         raise NotImplementedError
+
+
+class SQLAlchemyStreamingCursor(object):
+    """
+    A DBAPI2-like cursor adapter for `sqlalchemy` results fetched using
+    server-side cursors, which holds on to the connection used to execute the
+    statement until all results have been fetched (or the cursor is closed),
+    at which point it is returned to the engine's pool.
+    """
+
+    def __init__(self, result, connection):
+        self._result = result
+        self._connection = connection
+        self.description = result.cursor.description if result.returns_rows else None
+        self.rowcount = result.rowcount
+        if not result.returns_rows:
+            self.close()
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        if self._connection is None:
+            return []
+        try:
+            rows = [tuple(row) for row in self._result.fetchmany(size)]
+        except Exception:
+            self.close()
+            raise
+        if len(rows) < size:
+            self.close()
+        return rows
+
+    def fetchall(self):
+        if self._connection is None:
+            return []
+        try:
+            return [tuple(row) for row in self._result.fetchall()]
+        finally:
+            self.close()
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(1000)
+            for row in rows:
+                yield row
+            if len(rows) < 1000:
+                return
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                self._result.close()
+            finally:
+                connection.close()
@@ -14,7 +14,7 @@ from enum import Enum
 import six
 from future.utils import raise_with_traceback, with_metaclass
 
-from omniduct.errors import DuctServerUnreachable, DuctProtocolUnknown
+from omniduct.errors import DuctOffline, DuctServerUnreachable, DuctProtocolUnknown
 from omniduct.utils.debug import logger, logging_scope
 from omniduct.utils.dependencies import check_dependencies
 from omniduct.utils.docs import quirk_docs
@@ -179,6 +179,9 @@ class Duct(with_metaclass(ProtocolRegisteringQuirkDocumentedABCMeta, object)):
             `RemoteClient` instance to manage connections to remote services.
         cache (None, omniduct.caches.base.Cache): A reference to a `Cache`
             instance to add support for caching, if applicable.
+        offline (bool): Whether this `Duct` instance is prevented from
+            connecting to its service (in which case results are served only
+            from the cache, if applicable). See `Duct.offline`.
         connection_fields (tuple<str>, list<str>): A list of instance attributes
             to monitor for changes, whereupon the `Duct` instance should automatically
             disconnect. By default, the following attributes are monitored:
@@ -251,7 +254,8 @@ class Duct(with_metaclass(ProtocolRegisteringQuirkDocumentedABCMeta, object)):
     PROTOCOLS = None
 
     def __init__(self, protocol=None, name=None, registry=None, remote=None,
-                 host=None, port=None, username=None, password=None, cache=None):
+                 host=None, port=None, username=None, password=None, cache=None,
+                 offline=False):
         """
         protocol (str, None): Name of protocol (used by Duct registries to inform
             Duct instances of how they were instantiated).
@@ -269,6 +273,10 @@ class Duct(with_metaclass(ProtocolRegisteringQuirkDocumentedABCMeta, object)):
             If True, then users will be prompted at runtime for credentials.
         cache(Cache, None): The cache client to be attached to this instance.
             Cache will only used by specific methods as configured by the client.
+        offline (bool): Whether to prevent this instance from connecting to
+            the service, serving results only from the cache (default: False).
+            Can also be enabled for all ducts in a registry using
+            `DuctRegistry(offline=True)`.
         """
 
         check_dependencies(self.PROTOCOLS)
@@ -282,6 +290,7 @@ class Duct(with_metaclass(ProtocolRegisteringQuirkDocumentedABCMeta, object)):
         self.username = username
         self.password = password
         self.cache = cache
+        self.offline = offline
 
         self.connection_fields = ('host', 'port', 'remote', 'username', 'password')
         self.prepared_fields = ('_host', '_port', '_username', '_password')
@@ -524,6 +533,22 @@ class Duct(with_metaclass(ProtocolRegisteringQuirkDocumentedABCMeta, object)):
     def password(self, password):
         self._password = password
 
+    @property
+    def offline(self):
+        """
+        bool: Whether this `Duct` instance is offline, in which case it will
+        refuse to connect to its service (raising `DuctOffline`), and methods
+        supporting caching will serve results only from the cache (raising
+        `DuctOffline` if results have not been cached). A `Duct` is offline if
+        it was marked as such, or if its registry is offline. You can change
+        this at runtime using: `duct.offline = <bool>`.
+        """
+        return bool(self._offline or getattr(self.registry, 'offline', False))
+
+    @offline.setter
+    def offline(self, offline):
+        self._offline = offline
+
     def __assert_server_reachable(self):
         if self.host is not None or self.port is not None:
             if self.host is None:
@@ -560,7 +585,12 @@ class Duct(with_metaclass(ProtocolRegisteringQuirkDocumentedABCMeta, object)):
 
         Returns:
             `Duct` instance: A reference to the current object.
+
+        Raises:
+            DuctOffline: If this instance is offline (see `Duct.offline`).
         """
+        if self.offline:
+            raise DuctOffline("`{}` is offline, and so cannot connect to its service.".format(self.name))
         if self.host:
             logger.info(
                 "Connecting to {host}:{port}{remote}.".format(
@@ -12,3 +12,11 @@ class DuctServerUnreachable(RuntimeError):
 
 class DuctProtocolUnknown(RuntimeError):
     pass
+
+
+class DuctQueryCostExceeded(RuntimeError):
+    pass
+
+
+class DuctOffline(RuntimeError):
+    pass
@@ -3,7 +3,9 @@ from abc import abstractmethod
 from collections import namedtuple, OrderedDict
 
 import pandas as pd
+from omniduct.caches.base import cached_method
 from omniduct.duct import Duct
+from omniduct.errors import DuctOffline
 from omniduct.utils.docs import quirk_docs
 from omniduct.utils.magics import MagicsProvider, process_line_arguments
 
@@ -22,13 +24,19 @@ class FileSystemClient(Duct, MagicsProvider):
     Parameters:
         cwd (str): The path prefix to use as the current working directory (if None,
             the user's home directory is used where that makes sense).
+        global_writes (bool): Whether writes should be permitted outside of
+            the home directory (default: False).
+        record_reads (bool): Whether to record the contents of files read
+            (along with the home directory) in the cache, so that they can be
+            read again while offline (see `Duct.offline`). Files are always
+            read afresh while online (default: False).
     """
 
     DUCT_TYPE = Duct.Type.FILESYSTEM
     DEFAULT_PORT = None
 
     @quirk_docs('_init', mro=True)
-    def __init__(self, cwd=None, global_writes=False, **kwargs):
+    def __init__(self, cwd=None, global_writes=False, record_reads=False, **kwargs):
         """
         This is a shim __init__ function that passes all arguments onto
         `self._init`, which is implemented by subclasses. This allows subclasses
@@ -38,6 +46,7 @@ class FileSystemClient(Duct, MagicsProvider):
         self._path_cwd = cwd
         self.__path_home = None
         self.global_writes = global_writes
+        self.record_reads = record_reads
         self._init(**kwargs)
 
     @abstractmethod
@@ -55,9 +64,17 @@ class FileSystemClient(Duct, MagicsProvider):
         and so will not be updated on client reconnections.
         """
         if not self.__path_home:
-            self.__path_home = self.connect()._path_home()
+            self.__path_home = self.__path_home_lookup()
         return self.__path_home
 
+    @cached_method(
+        id_str=lambda self, kwargs: 'path_home',
+        use_cache=lambda self, kwargs: self.record_reads or self.offline,
+        renew=lambda self, kwargs: not self.offline
+    )
+    def __path_home_lookup(self):
+        return self.connect()._path_home()
+
     @abstractmethod
     def _path_home(self):
         return NotImplementedError
@@ -425,6 +442,24 @@ class FileSystemClient(Duct, MagicsProvider):
     def _mkdir(self, path, recursive):
         raise NotImplementedError
 
+    @quirk_docs('_remove')
+    def remove(self, path, recursive=False):
+        """
+        This method removes the file or directory at the specified path. If
+        `path` is a non-empty directory, `recursive` must be `True`.
+
+        Parameters:
+            path (str): The path of the file or directory to remove.
+            recursive (bool): Whether to recursively remove the contents of
+                `path` if it is a directory.
+        """
+        if not self.global_writes and not self._path_in_home_dir(path):
+            raise RuntimeError("Attempt to write outside of home directory without setting {}.global_writes to True.".format(self.name))
+        return self.connect()._remove(self._path(path), recursive)
+
+    def _remove(self, path, recursive):
+        raise NotImplementedError
+
     # File handling
 
     @quirk_docs('_open')
@@ -440,20 +475,37 @@ class FileSystemClient(Duct, MagicsProvider):
             path (str): The path of the file to open.
             mode (str): All standard Python file modes.
 
+        While offline (see `Duct.offline`), files may only be opened for
+        reading, and their contents are served from the cache (if recorded
+        using `record_reads`).
+
         Returns:
             FileSystemFile or file-like: An opened file-like object.
         """
+        if self.offline:
+            if 'r' not in mode or '+' in mode:
+                raise DuctOffline("`{}` is offline, and so files cannot be opened for writing.".format(self.name))
+            return FileSystemFile(self, self._path(path), mode)
         return self.connect()._open(path, mode=mode)
 
     def _open(self, path, mode):
         return FileSystemFile(self, self._path(path), mode)
 
     @quirk_docs('_file_read_')
+    @cached_method(
+        id_str=lambda self, kwargs: "read:{}:{}:{}:\n{}".format(
+            kwargs.get('binary', False), kwargs.get('offset', 0), kwargs.get('size', -1),
+            self._path(kwargs['path'])
+        ),
+        use_cache=lambda self, kwargs: self.record_reads or self.offline,
+        renew=lambda self, kwargs: not self.offline
+    )
     def _file_read(self, path, size=-1, offset=0, binary=False):
         """
         This method is used by `FileSystemFile` to read the contents of files.
         `._file_read_` may be left unimplemented if `.open()` returns a different
-        kind of file handle.
+        kind of file handle. If `record_reads` is True, the contents read are
+        also recorded in the cache, from which they are served while offline.
 
         Parameters:
             path (str): The path of the file to be read.
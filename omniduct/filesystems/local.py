@@ -1,6 +1,7 @@
 import datetime
 import errno
 import os
+import shutil
 
 from .base import FileSystemClient, FileSystemFileDesc
 
@@ -24,6 +25,18 @@ class LocalFsClient(FileSystemClient):
         assert self.remote is None, "LocalFsClient cannot be used in conjunction with a remote client."
         self._path_cwd = self._path_cwd or os.getcwd()
 
+    @property
+    def offline(self):
+        """
+        bool: The local filesystem is always available, and so is never
+        offline.
+        """
+        return False
+
+    @offline.setter
+    def offline(self, offline):
+        pass
+
     def _connect(self):
         pass
 
@@ -93,6 +106,12 @@ class LocalFsClient(FileSystemClient):
             else:
                 raise
 
+    def _remove(self, path, recursive):
+        if os.path.isdir(path):
+            shutil.rmtree(path) if recursive else os.rmdir(path)
+        else:
+            os.remove(path)
+
     # File opening
 
     def _open(self, path, mode):
@@ -44,6 +44,9 @@ class StubFsClient(FileSystemClient):
     def _mkdir(self, path, recursive):
         raise NotImplementedError
 
+    def _remove(self, path, recursive):
+        raise NotImplementedError
+
     # File handling
 
     # Either re-implement _open, or implement the _file_*_ methods below.
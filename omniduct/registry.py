@@ -32,8 +32,10 @@ class DuctRegistry(object):
         def __dir__(self):
             return NestedDictObjectProxy.__dir__(self) + ['registry']
 
-    def __init__(self, config=None):
+    def __init__(self, config=None, offline=False):
         self._registry = {}
+        # If True, all registered ducts are offline (see `Duct.offline`).
+        self.offline = offline
 
         if config:
             self.import_from_config(config)
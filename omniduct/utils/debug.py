@@ -145,8 +145,10 @@ class StatusLogger(object):
         """
         if context is None:
             try:
-                caller = inspect.stack()[2]
-                context = inspect.getmodule(caller.frame).__name__
+                # Inspect only the calling frame (rather than using
+                # `inspect.stack()`, which loads source context for every
+                # frame in the stack, and is far too slow for hot paths).
+                context = sys._getframe(2).f_globals['__name__']
             except:
                 context = 'omniduct'
         if not context == 'omniduct' and not context.startswith('omniduct.'):
@@ -4,5 +4,9 @@ import os
 def ensure_path_exists(path):
     path = os.path.expanduser(path)
     if not os.path.exists(path):
-        os.makedirs(path)
+        try:
+            os.makedirs(path)
+        except OSError:  # Path may have been concurrently created by another process
+            if not os.path.isdir(path):
+                raise
     return path
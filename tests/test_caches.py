@@ -1,6 +1,12 @@
+import errno
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 import mock
-from pyfakefs.fake_filesystem_unittest import Patcher
 
 from omniduct.caches.local import LocalCache
 
@@ -9,15 +15,13 @@ ID_DUCT = 'test_id_duct'
 ID_STRING = 'test_id_string'
 ID_STRING_ANOTHER = 'test_id_string_another'
 ID_STRING_NONEXISTANT = 'test_id_string_nonexistant'
-TEST_DIR = 'test_dir'
 
 
 class TestLocalCache(unittest.TestCase):
 
     def setUp(self):
-        self.fs_patcher = Patcher()
-        self.fs_patcher.setUp()
-        self.cache = LocalCache(dir=TEST_DIR)
+        self.dir = tempfile.mkdtemp()  # The cache index uses SQLite, which cannot use a fake filesystem
+        self.cache = LocalCache(dir=self.dir)
 
     def test_clear(self):
         self.cache.clear(ID_DUCT, ID_STRING_NONEXISTANT)
@@ -69,7 +73,10 @@ class TestLocalCache(unittest.TestCase):
         )
 
     def test_keys(self):
-        pass  # TODO test keys when implemented
+        self.assertEqual(self.cache.keys(ID_DUCT), [])
+        self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        self.cache.set(ID_DUCT, ID_STRING_ANOTHER, 'bar')
+        self.assertEqual(self.cache.keys(ID_DUCT), [ID_STRING, ID_STRING_ANOTHER])
 
     def test_set(self):
         serializer_mock = mock.Mock()
@@ -77,4 +84,168 @@ class TestLocalCache(unittest.TestCase):
         serializer_mock.serialize.assert_called_once()
 
     def tearDown(self):
-        self.fs_patcher.tearDown()
+        self.cache.disconnect()
+        shutil.rmtree(self.dir)
+
+
+class TestLocalCacheDedup(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()  # The cache index uses SQLite, which cannot use a fake filesystem
+        self.cache = LocalCache(dir=self.dir)
+
+    def blobs(self):
+        return [
+            os.path.join(dirpath, filename)
+            for dirpath, _, filenames in os.walk(self.cache.blobs_dir)
+            for filename in filenames
+        ]
+
+    def test_identical_values_share_storage(self):
+        self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        self.cache.set(ID_DUCT, ID_STRING_ANOTHER, 'foo')
+        self.assertEqual(len(self.blobs()), 1)
+        self.assertEqual(os.stat(self.blobs()[0]).st_nlink, 3)
+        self.assertEqual(self.cache.get(ID_DUCT, ID_STRING_ANOTHER), 'foo')
+
+        self.cache.set(ID_DUCT, ID_STRING_ANOTHER, 'bar')
+        self.assertEqual(len(self.blobs()), 2)
+        self.assertEqual(self.cache.get(ID_DUCT, ID_STRING), 'foo')
+
+    def test_blobs_removed_with_last_reference(self):
+        self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        self.cache.set(ID_DUCT, ID_STRING_ANOTHER, 'foo')
+        self.cache.clear(ID_DUCT, ID_STRING)
+        self.assertEqual(len(self.blobs()), 1)
+        self.cache.clear(ID_DUCT, ID_STRING_ANOTHER)
+        self.assertEqual(self.blobs(), [])
+
+        self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        self.cache.clear_all(ID_DUCT)
+        self.assertEqual(self.blobs(), [])
+
+    def test_falls_back_to_copies_without_hard_links(self):
+        with mock.patch('os.link', side_effect=OSError(errno.EPERM, 'Operation not permitted')):
+            self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        self.assertEqual(self.cache.get(ID_DUCT, ID_STRING), 'foo')
+        self.assertEqual(self.blobs(), [])
+
+    def tearDown(self):
+        self.cache.disconnect()
+        shutil.rmtree(self.dir)
+
+
+class TestLocalCacheIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = LocalCache(dir=self.dir)
+
+    def test_index_tracks_metadata(self):
+        self.cache.set('a.b', ID_STRING, 'foo', format='pickle')
+        self.cache.set('a.c', ID_STRING, 'bar')
+        self.cache.get('a.b', ID_STRING)
+        self.cache.get('a.b', ID_STRING)
+
+        stats = self.cache.stats('a.b')
+        self.assertEqual((stats['entries'], stats['hits']), (1, 2))
+        self.assertEqual(stats['size'], os.path.getsize(self.cache.get_path('a.b', ID_STRING)))
+        self.assertEqual(self.cache.stats('a')['entries'], 2)
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def test_missing_payload_is_a_miss(self):
+        self.cache.set(ID_DUCT, ID_STRING, None)
+        self.assertIsNone(self.cache.get(ID_DUCT, ID_STRING, default=KeyError))
+        os.remove(self.cache.get_path(ID_DUCT, ID_STRING))
+        self.assertIs(self.cache.get(ID_DUCT, ID_STRING, default=KeyError), KeyError)
+        self.assertFalse(self.cache.has_key(ID_DUCT, ID_STRING))
+
+    def test_accesses_recorded_in_batches(self):
+        self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        with mock.patch.object(LocalCache, '_flush_accesses') as flush:
+            for _ in range(3):
+                self.cache.get(ID_DUCT, ID_STRING)
+            flush.assert_not_called()
+        hits, = self.cache._index.execute("SELECT hits FROM entries").fetchone()
+        self.assertEqual(hits, 0)
+        self.assertEqual(self.cache.stats()['hits'], 3)
+
+        with mock.patch.object(LocalCache, 'ACCESS_FLUSH_SIZE', 1):
+            self.cache.get(ID_DUCT, ID_STRING)
+        hits, = self.cache._index.execute("SELECT hits FROM entries").fetchone()
+        self.assertEqual(hits, 4)
+
+    def test_disconnect_closes_connections_of_all_threads(self):
+        self.cache.connect()
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(self.cache._index))
+        thread.start()
+        thread.join()
+        self.cache.disconnect()
+        self.assertRaises(sqlite3.ProgrammingError, connections[0].execute, "SELECT 1")
+
+    def test_ttl_and_eviction(self):
+        self.cache.set(ID_DUCT, ID_STRING, 'foo', ttl=-1)
+        self.assertFalse(self.cache.has_key(ID_DUCT, ID_STRING))
+        self.assertIsNone(self.cache.get(ID_DUCT, ID_STRING))
+
+        self.cache.set(ID_DUCT, ID_STRING_ANOTHER, 'bar')
+        time.sleep(0.01)
+        self.cache.set(ID_DUCT, ID_STRING_NONEXISTANT, 'baz')
+        size = self.cache.stats()['size']
+        self.assertEqual(self.cache.evict(max_size=size // 3), 2)
+        self.assertEqual(self.cache.keys(ID_DUCT), [ID_STRING_NONEXISTANT])
+        self.assertFalse(os.path.exists(self.cache.get_path(ID_DUCT, ID_STRING)))
+
+    def test_invalidate_by_tag(self):
+        self.cache.set('a.b', ID_STRING, 'foo', tags=['s.t', 's.u'])
+        self.cache.set('a.c', ID_STRING, 'foo', tags=['s.t'])
+        self.cache.set('a.b', ID_STRING_ANOTHER, 'bar', tags=['s.u'])
+
+        self.assertEqual(self.cache.invalidate(['s.t'], id_duct='a.c'), 1)
+        self.assertTrue(self.cache.has_key('a.b', ID_STRING))
+        self.assertEqual(self.cache.invalidate(['s.t', 's.v']), 1)
+        self.assertFalse(self.cache.has_key('a.b', ID_STRING))
+        self.assertEqual(self.cache.keys('a.b'), [ID_STRING_ANOTHER])
+
+        self.cache.set('a.b', ID_STRING_ANOTHER, 'bar')  # Replacing an entry replaces its tags
+        self.assertEqual(self.cache.invalidate(['s.u']), 0)
+
+    def test_invalidate_qualified_tags(self):
+        self.cache.set('a.b', ID_STRING, 'foo', tags=['c.s.t'])
+        self.cache.set('a.b', ID_STRING_ANOTHER, 'bar', tags=['xs.t'])
+        self.assertEqual(self.cache.invalidate(['s.t']), 0)
+        self.assertEqual(self.cache.invalidate(['s.t'], qualified=True), 1)
+        self.assertEqual(self.cache.keys('a.b'), [ID_STRING_ANOTHER])
+
+    def test_reindex_existing_entries(self):
+        self.cache.set(ID_DUCT, ID_STRING, 'foo')
+        self.cache.disconnect()
+        os.remove(os.path.join(self.dir, LocalCache.INDEX_FILE))
+
+        cache = LocalCache(dir=self.dir)
+        self.assertTrue(cache.has_key(ID_DUCT, ID_STRING))
+        self.assertEqual(cache.get(ID_DUCT, ID_STRING), 'foo')
+        cache.disconnect()
+
+    def test_export_and_import_bundle(self):
+        self.cache.set('a.b', ID_STRING, 'foo', format='pickle', tags=['s.t'])
+        self.cache.set('a.b', ID_STRING_ANOTHER, 'foo')
+        self.cache.set('a.c', ID_STRING, 'bar', ttl=-1)
+        bundle = os.path.join(self.dir, 'bundle.tar.gz')
+        self.assertEqual(self.cache.export_bundle(bundle, since=time.time() + 60), 0)
+        self.assertEqual(self.cache.export_bundle(bundle), 2)  # Expired entries are not exported
+
+        cache = LocalCache(dir=os.path.join(self.dir, 'imported'))
+        try:
+            self.assertEqual(cache.import_bundle(bundle), 2)
+            self.assertEqual(cache.keys('a.b'), [ID_STRING, ID_STRING_ANOTHER])
+            self.assertEqual(cache.get('a.b', ID_STRING_ANOTHER), 'foo')
+            self.assertEqual(cache.stats()['entries'], 2)
+            self.assertEqual(cache.invalidate(['s.t']), 1)
+        finally:
+            cache.disconnect()
+
+    def tearDown(self):
+        self.cache.disconnect()
+        shutil.rmtree(self.dir)
@@ -0,0 +1,148 @@
+import decimal
+import io
+import os
+import unittest
+
+import pandas as pd
+
+from omniduct.databases.cursor_formatters import (ColumnarCursorFormatter, PandasCursorFormatter,
+                                                  RecordCursorFormatter, SpilledResult)
+
+
+class FakeCursor(object):
+
+    def __init__(self, description, rows):
+        self.description = description
+        self.rows = list(rows)
+        self.closed = False
+
+    def fetchall(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def __iter__(self):
+        while self.rows:
+            yield self.rows.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+DESCRIPTION = [
+    ('id', 'bigint', None, None, None, None, True),
+    ('ts', 'timestamp', None, None, None, None, True),
+    ('ds', 'DATE_TYPE', None, None, None, None, True),
+    ('amount', 'decimal(10,2)', None, None, None, None, True),
+    ('flag', 'BOOLEAN_TYPE', None, None, None, None, True),
+]
+
+ROWS = [
+    (1, '2018-01-01 12:00:00.000', '2018-01-01', '1.50', 'true'),
+    (2, '2018-01-02 13:30:00.000', '2018-01-02', '2.25', 'false'),
+]
+
+
+class TestPandasCursorFormatter(unittest.TestCase):
+
+    def test_dump_coerces_types(self):
+        df = PandasCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).dump()
+        self.assertEqual(df['ts'].dtype.kind, 'M')
+        self.assertEqual(df['ds'].dtype.kind, 'M')
+        self.assertEqual(df['amount'].dtype.kind, 'f')
+        self.assertEqual(df['flag'].tolist(), [True, False])
+        self.assertEqual(df['ts'][1], pd.Timestamp('2018-01-02 13:30:00'))
+
+    def test_stream_batch_coerces_types(self):
+        batches = list(PandasCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).stream(batch=1))
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches[1]['ts'].dtype.kind, 'M')
+
+    def test_stream_rows_coerce_types(self):
+        rows = list(PandasCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).stream())
+        self.assertEqual(rows[0]['ts'], pd.Timestamp('2018-01-01 12:00:00'))
+        self.assertEqual(rows[0]['amount'], 1.5)
+        self.assertIs(rows[1]['flag'], False)
+
+    def test_decimals_coerced_only_when_lossless(self):
+        description = [('amount', 'decimal(38,10)', None, None, None, None, True)]
+        exact = [(decimal.Decimal('1.5'),), (None,)]
+        precise = [(decimal.Decimal('12345678901234567890.0123456789'),), (decimal.Decimal('0.1'),)]
+        self.assertEqual(PandasCursorFormatter(FakeCursor(description, exact)).dump()['amount'].dtype.kind, 'f')
+        df = PandasCursorFormatter(FakeCursor(description, precise)).dump()
+        self.assertEqual(df['amount'].dtype, object)
+        self.assertEqual(df['amount'].tolist(), [value for value, in precise])
+        rows = list(PandasCursorFormatter(FakeCursor(description, precise)).stream())
+        self.assertEqual(rows[0]['amount'], precise[0][0])
+        self.assertEqual(rows[1]['amount'], 0.1)
+
+    def test_column_type_overrides(self):
+        df = PandasCursorFormatter(
+            FakeCursor(DESCRIPTION, ROWS),
+            column_types={'ts': None, 'id': 'decimal'},
+            date_fields={'ds': '%Y-%m-%d'}
+        ).dump()
+        self.assertEqual(df['ts'].dtype, object)
+        self.assertEqual(df['ds'].dtype.kind, 'M')
+
+    def test_coerce_types_disabled(self):
+        df = PandasCursorFormatter(FakeCursor(DESCRIPTION, ROWS), coerce_types=False).dump()
+        self.assertEqual(df['ts'].dtype, object)
+        self.assertEqual(df['flag'].tolist(), ['true', 'false'])
+
+    def test_dump_max_memory_spills(self):
+        formatter = PandasCursorFormatter(FakeCursor(DESCRIPTION, ROWS * 5))
+        formatter.SPILL_BATCH_SIZE = 2
+        result = formatter.dump(max_memory=1)
+        self.assertIsInstance(result, SpilledResult)
+        self.assertEqual(len(list(result)), 5)
+        df = result.load()
+        self.assertEqual(len(df), 10)
+        self.assertEqual(df.index.tolist(), list(range(10)))
+        path = result.path
+        result.cleanup()
+        self.assertFalse(os.path.exists(path))
+
+    def test_dump_max_memory_within_budget(self):
+        df = PandasCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).dump(max_memory=10 ** 9)
+        self.assertIsInstance(df, pd.DataFrame)
+        self.assertEqual(len(df), 2)
+
+
+class TestRecordCursorFormatter(unittest.TestCase):
+
+    def test_records_share_class(self):
+        records = RecordCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).dump()
+        self.assertEqual(records[0].id, 1)
+        self.assertEqual(records[1].amount, '2.25')
+        self.assertIs(type(records[0]), type(records[1]))
+
+    def test_invalid_column_names_renamed(self):
+        description = [('a b', 'varchar'), ('class', 'varchar')]
+        record = next(RecordCursorFormatter(FakeCursor(description, [('x', 'y')])).stream())
+        self.assertEqual(tuple(record), ('x', 'y'))
+
+    def test_serialization_roundtrip(self):
+        records = RecordCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).dump()
+        fh = io.BytesIO()
+        RecordCursorFormatter.serialize(records, fh)
+        fh.seek(0)
+        loaded = RecordCursorFormatter.deserialize(fh)
+        self.assertEqual(loaded, records)
+        self.assertEqual(loaded[0]._fields, records[0]._fields)
+
+
+class TestColumnarCursorFormatter(unittest.TestCase):
+
+    def test_dump_and_stream(self):
+        columns = ColumnarCursorFormatter(FakeCursor(DESCRIPTION, ROWS)).dump()
+        self.assertEqual(list(columns), ['id', 'ts', 'ds', 'amount', 'flag'])
+        self.assertEqual(columns['id'], [1, 2])
+
+        formatter = ColumnarCursorFormatter(FakeCursor(DESCRIPTION, ROWS * 3))
+        formatter.SPILL_BATCH_SIZE = 2
+        columns = formatter.dump(max_memory=10 ** 9)
+        self.assertEqual(columns['id'], [1, 2] * 3)
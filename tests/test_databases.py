@@ -0,0 +1,397 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import jinja2
+import mock
+import pandas as pd
+
+from omniduct.caches.local import LocalCache
+from omniduct.databases.base import DatabaseClient
+from omniduct.errors import DuctOffline, DuctQueryCostExceeded
+from omniduct.registry import DuctRegistry
+
+
+class RecordingDatabaseClient(DatabaseClient):
+
+    PROTOCOLS = []
+
+    def _init(self, delay=0):
+        self.delay = delay
+        self.params = None
+        self.executed = []
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        pass
+
+    def _is_connected(self):
+        return True
+
+    def _disconnect(self):
+        pass
+
+    def _execute(self, statement, cursor=None, async=False, **kwargs):
+        time.sleep(self.delay)
+        if 'fail' in statement:
+            raise RuntimeError(statement)
+        with self.lock:
+            self.executed.append(statement)
+            self.params = kwargs.get('params')
+        return statement
+
+    def _table_list(self, **kwargs):
+        raise NotImplementedError
+
+    def _table_exists(self, table, **kwargs):
+        raise NotImplementedError
+
+    def _table_desc(self, table, **kwargs):
+        raise NotImplementedError
+
+    def _table_head(self, table, n=10, **kwargs):
+        raise NotImplementedError
+
+    def _table_props(self, table, **kwargs):
+        raise NotImplementedError
+
+
+SCRIPT = """
+CREATE TABLE a AS SELECT * FROM src_a;
+CREATE TABLE b AS SELECT * FROM src_b;
+CREATE TABLE c AS SELECT * FROM a JOIN b ON a.id = b.id;
+"""
+
+
+class TestDatabaseClientDag(unittest.TestCase):
+
+    def test_statement_tables(self):
+        reads, writes = DatabaseClient.statement_tables(
+            "WITH t AS (SELECT * FROM db.x) INSERT OVERWRITE TABLE `db`.`y` SELECT * FROM t JOIN z USING (id)"
+        )
+        self.assertEqual(reads, {'db.x', 'z'})
+        self.assertEqual(writes, {'db.y'})
+
+    def test_statements_dependencies(self):
+        statements = list(DatabaseClient.statements_split(SCRIPT + "SET x=1; DROP TABLE src_a"))
+        self.assertEqual(
+            DatabaseClient.statements_dependencies(statements),
+            [set(), set(), {0, 1}, {0, 1, 2}, {0, 3}]
+        )
+
+    def test_execute_dag_runs_independent_statements_concurrently(self):
+        client = RecordingDatabaseClient(delay=0.2)
+        start = time.time()
+        cursor = client.execute(SCRIPT, dag=True, cleanup=False)
+        self.assertLess(time.time() - start, 0.55)
+        self.assertEqual(cursor, 'CREATE TABLE c AS SELECT * FROM a JOIN b ON a.id = b.id')
+        self.assertEqual(client.executed[-1], cursor)
+        self.assertEqual(client.last_execution_timings.index.tolist(), [0, 1, 2])
+        self.assertEqual(client.last_execution_timings.loc[2, 'dependencies'], [0, 1])
+
+    def test_execute_dag_explicit_dependencies(self):
+        client = RecordingDatabaseClient()
+        client.execute(SCRIPT, dag=True, cleanup=False, dependencies={0: [1]})
+        self.assertTrue(client.executed[0].startswith('CREATE TABLE b'))
+        with self.assertRaises(ValueError):
+            client.execute(SCRIPT, dag=True, dependencies={0: [2]})
+
+    def test_execute_dag_session_statements_executed_serially(self):
+        self.assertTrue(DatabaseClient.statement_is_session("-- comment\nSET hive.exec.parallel=true"))
+        self.assertTrue(DatabaseClient.statement_is_session("CREATE TEMPORARY TABLE t AS SELECT 1"))
+        self.assertFalse(DatabaseClient.statement_is_session("CREATE TABLE settings AS SELECT 1"))
+
+        def execute(statement, cursor=None, **kwargs):  # Cursors accumulate the statements executed against them
+            return (cursor or ()) + (statement,)
+
+        client = RecordingDatabaseClient()
+        with mock.patch.object(RecordingDatabaseClient, '_pooled_cursor') as pooled_cursor, \
+                mock.patch.object(RecordingDatabaseClient, '_execute', side_effect=execute):
+            cursor = client.execute("USE db;" + SCRIPT, dag=True, cleanup=False)
+        pooled_cursor.assert_not_called()
+        self.assertEqual(len(cursor), 4)
+        self.assertEqual(cursor[0], 'USE db')
+        self.assertEqual(client.last_execution_timings['dependencies'].tolist(), [[], [0], [1], [2]])
+
+    def test_execute_dag_failure_skips_dependents(self):
+        client = RecordingDatabaseClient()
+        with self.assertRaises(RuntimeError):
+            client.execute("CREATE TABLE a AS SELECT fail FROM x; CREATE TABLE b AS SELECT * FROM a", dag=True)
+        self.assertEqual(client.executed, [])
+        self.assertEqual(client.last_execution_timings['status'].tolist(), ['failed'])
+
+
+class TestDatabaseClientTemplates(unittest.TestCase):
+
+    def test_template_render_reuses_compiled_templates(self):
+        client = RecordingDatabaseClient(templates={'a': 'SELECT {{ x }} FROM t'})
+        statement = 'WITH a AS ({{{ a }}}) SELECT * FROM a WHERE y = {{ y }}'
+        rendered = client.template_render(statement, context={'x': 1, 'y': 2})
+        self.assertEqual(rendered, 'WITH a AS (SELECT 1 FROM t) SELECT * FROM a WHERE y = 2')
+
+        template = client._template_get(client._template_expand(statement))
+        client.template_render(statement, context={'x': 3, 'y': 4})
+        self.assertIs(client._template_get(client._template_expand(statement)), template)
+
+    def test_template_add_invalidates_expansions(self):
+        client = RecordingDatabaseClient(templates={'a': 'SELECT 1'})
+        self.assertEqual(client.template_render('{{{ a }}}'), 'SELECT 1')
+        client.template_add('a', 'SELECT 2')
+        self.assertEqual(client.template_render('{{{ a }}}'), 'SELECT 2')
+        self.assertEqual(client.template_render('a', by_name=True), 'SELECT 2')
+
+    def test_template_include_not_supported(self):
+        client = RecordingDatabaseClient(templates={'a': 'SELECT 1'})
+        for statement in ["{% include 'a' %}", "{% extends 'a' %}"]:
+            with self.assertRaises(TypeError):
+                client.template_render(statement)
+
+    def test_template_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        bcc = jinja2.FileSystemBytecodeCache(cache_dir)
+        statement = 'SELECT {{ x }} FROM t'
+        self.assertEqual(RecordingDatabaseClient(template_bytecode_cache=bcc).template_render(statement, {'x': 1}),
+                         'SELECT 1 FROM t')
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+        with mock.patch.object(jinja2.Environment, 'compile') as compile:
+            client = RecordingDatabaseClient(template_bytecode_cache=bcc)
+            self.assertEqual(client.template_render(statement, {'x': 2}), 'SELECT 2 FROM t')
+        compile.assert_not_called()
+
+
+class TestDatabaseClientIncremental(unittest.TestCase):
+
+    STATEMENT = "SELECT * FROM {{ table }}{% if watermark is not none %} WHERE ts > {{ watermark }}{% endif %}"
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.client = RecordingDatabaseClient(cache=LocalCache(dir=self.dir))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_query_incremental_merges_rows_past_watermark(self):
+        batches = [
+            pd.DataFrame({'id': [1, 2], 'ts': [1, 2], 'value': ['a', 'b']}),
+            pd.DataFrame({'id': [2, 3], 'ts': [3, 4], 'value': ['B', 'c']}),
+            pd.DataFrame({'id': [], 'ts': [], 'value': []}),
+        ]
+        with mock.patch.object(RecordingDatabaseClient, 'query', side_effect=batches) as query:
+            self.client.query_incremental(self.STATEMENT, watermark_column='ts', key='id', context={'table': 't'})
+            df = self.client.query_incremental(self.STATEMENT, watermark_column='ts', key='id', context={'table': 't'})
+            self.assertEqual(df['id'].tolist(), [1, 2, 3])
+            self.assertEqual(df['value'].tolist(), ['a', 'B', 'c'])
+
+            df = self.client.query_incremental(self.STATEMENT, watermark_column='ts', key='id', context={'table': 't'})
+            self.assertEqual(len(df), 3)
+
+        statements = [call[0][0] for call in query.call_args_list]
+        self.assertEqual(statements, [
+            'SELECT * FROM t',
+            'SELECT * FROM t WHERE ts > 2',
+            'SELECT * FROM t WHERE ts > 4',
+        ])
+
+    def test_query_incremental_cached_per_context(self):
+        batches = [
+            pd.DataFrame({'id': [1], 'ts': [0]}),
+            pd.DataFrame({'id': [2], 'ts': [5]}),
+            pd.DataFrame({'id': [3], 'ts': [1]}),
+        ]
+        with mock.patch.object(RecordingDatabaseClient, 'query', side_effect=batches) as query:
+            self.client.query_incremental(self.STATEMENT, watermark_column='ts', context={'table': 't'})
+            self.client.query_incremental(self.STATEMENT, watermark_column='ts', context={'table': 'u'})
+            df = self.client.query_incremental(self.STATEMENT, watermark_column='ts', context={'table': 't'})
+        self.assertEqual(df['id'].tolist(), [1, 3])
+
+        statements = [call[0][0] for call in query.call_args_list]
+        self.assertEqual(statements, ['SELECT * FROM t', 'SELECT * FROM u', 'SELECT * FROM t WHERE ts > 0'])
+
+
+class TestDatabaseClientParams(unittest.TestCase):
+
+    def test_params_passed_to_execute(self):
+        client = RecordingDatabaseClient()
+        client.execute("SELECT * FROM t WHERE x = ?", params=[1])
+        self.assertEqual(client.params, [1])
+        with self.assertRaises(ValueError):
+            client.execute("SELECT 1; SELECT ?", params=[1])
+
+    def test_params_hash_is_canonical(self):
+        self.assertEqual(DatabaseClient.params_hash({'a': 1, 'b': 2}), DatabaseClient.params_hash({'b': 2, 'a': 1}))
+        self.assertNotEqual(DatabaseClient.params_hash([1]), DatabaseClient.params_hash([2]))
+
+
+class TestDatabaseClientPreview(unittest.TestCase):
+
+    def test_query_preview_limits_last_statement(self):
+        client = RecordingDatabaseClient()
+        with mock.patch.object(RecordingDatabaseClient, 'query') as query:
+            client.query_preview("SET x=1; SELECT * FROM t WHERE y = {{ y }};", n=5, context={'y': 2})
+        self.assertEqual(
+            query.call_args[0][0],
+            "SET x=1;\nSELECT * FROM (\nSELECT *\nFROM t\nWHERE y = 2\n) omniduct_preview\nLIMIT 5"
+        )
+        with self.assertRaises(NotImplementedError):
+            client.query_preview("SELECT * FROM t", sample=10)
+
+    def test_query_count_scales_sampled_count(self):
+        client = RecordingDatabaseClient()
+        with mock.patch.object(RecordingDatabaseClient, 'query', return_value=[(42,)]) as query:
+            self.assertEqual(client.query_count("SELECT * FROM t"), 42)
+            self.assertTrue(query.call_args[0][0].startswith("SELECT COUNT(*) FROM (\nSELECT *\nFROM t\n)"))
+            with mock.patch.object(RecordingDatabaseClient, '_statement_sampled_relation', return_value='t'):
+                self.assertEqual(client.query_count("SELECT * FROM t", sample=10), 420)
+            self.assertEqual(client.query_count("SELECT * FROM t", format='pandas'), 42)
+            self.assertEqual(query.call_args[1]['format'], 'tuple')
+
+
+class TestDatabaseClientCost(unittest.TestCase):
+
+    def test_query_max_cost_guard(self):
+        client = RecordingDatabaseClient()
+        cost = {'plan': '', 'rows': 1000, 'bytes': 10 ** 9}
+        with mock.patch.object(RecordingDatabaseClient, '_explain', return_value=cost) as explain:
+            with self.assertRaises(DuctQueryCostExceeded):
+                client.query("SELECT * FROM {{ table }}", context={'table': 't'}, max_cost=10 ** 6)
+            explain.assert_called_once_with('SELECT * FROM t')
+            self.assertEqual(client.executed, [])
+
+            with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+                client.query("SELECT * FROM t", max_cost={'rows': 10}, max_cost_action='warn')
+                client.query("SELECT * FROM t", max_cost={'rows': 10000, 'bytes': None})
+            self.assertEqual(len(client.executed), 2)
+
+    def test_query_max_cost_guard_unknown_estimates(self):
+        client = RecordingDatabaseClient()
+        cost = {'plan': '', 'rows': 1000, 'bytes': None}
+        with mock.patch.object(RecordingDatabaseClient, '_explain', return_value=cost) as explain:
+            with self.assertRaises(DuctQueryCostExceeded):
+                client.query("SELECT * FROM t WHERE x = ?", params=[1], max_cost=10 ** 6)
+            explain.assert_called_once_with('SELECT * FROM t WHERE x = ?', params=[1])
+            with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+                client.query("SELECT * FROM t", max_cost={'rows': 10000})
+            self.assertEqual(len(client.executed), 1)
+
+
+class TestDatabaseClientCacheInvalidation(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.client = RecordingDatabaseClient(cache=LocalCache(dir=self.dir))
+
+    def tearDown(self):
+        self.client.cache.disconnect()
+        shutil.rmtree(self.dir)
+
+    def test_statement_tags(self):
+        self.assertEqual(
+            DatabaseClient.statement_tags("SELECT * FROM `Db`.`x` JOIN y USING (id); INSERT INTO z SELECT 1"),
+            ['db.x', 'y', 'z']
+        )
+        self.assertEqual(DatabaseClient.statement_tags("SELECT * FROM a, b"), ['a', 'b'])
+        self.assertEqual(
+            DatabaseClient.statement_tags("SELECT x, y FROM a x, db.b AS y, (SELECT * FROM c, `d`) s JOIN e ON s.id = e.id"),
+            ['a', 'c', 'd', 'db.b', 'e']
+        )
+        self.assertEqual(DatabaseClient.statement_tags("SELECT * FROM t, UNNEST(t.arr) AS u(v)"), ['t'])
+        self.assertEqual(DatabaseClient.statement_tags("SELECT a, b FROM t GROUP BY a, b"), ['t'])
+
+    def test_cache_invalidate_removes_dependent_results(self):
+        with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+            for statement in ["SELECT * FROM db.x", "SELECT * FROM x", "SELECT * FROM db.y"]:
+                self.client.query(statement, format='tuple')
+            self.assertEqual(len(self.client.executed), 3)
+
+            self.assertEqual(self.client.cache_invalidate(['DB.X']), 2)
+            for statement in ["SELECT * FROM db.x", "SELECT * FROM x", "SELECT * FROM db.y"]:
+                self.client.query(statement, format='tuple')
+        self.assertEqual(len(self.client.executed), 5)
+
+    def test_cache_invalidate_matches_qualified_names(self):
+        statements = ["SELECT * FROM db.x", "SELECT * FROM catalog.db.x", "SELECT * FROM other.x", "SELECT * FROM y"]
+        with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+            for statement in statements:
+                self.client.query(statement, format='tuple')
+            self.assertEqual(self.client.cache_invalidate(['db.x']), 2)
+            self.assertEqual(self.client.cache_invalidate(['x']), 1)
+            for statement in statements:
+                self.client.query(statement, format='tuple')
+        self.assertEqual(len(self.client.executed), 7)
+
+    def test_missing_cached_result_recomputed(self):
+        with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+            self.client.query("SELECT * FROM x", format='tuple')
+            for dirpath, _, filenames in os.walk(os.path.join(self.dir, 'RecordingDatabaseClient')):
+                for filename in filenames:
+                    os.remove(os.path.join(dirpath, filename))
+            self.assertIsNone(self.client.query("SELECT * FROM x", format='tuple'))
+            self.assertEqual(len(self.client.executed), 2)
+            self.client.query("SELECT * FROM x", format='tuple')
+        self.assertEqual(len(self.client.executed), 2)
+
+
+class TestDatabaseClientOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.client = RecordingDatabaseClient(cache=LocalCache(dir=self.dir))
+
+    def tearDown(self):
+        self.client.cache.disconnect()
+        shutil.rmtree(self.dir)
+
+    def test_offline_queries_served_from_cache(self):
+        with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+            self.client.query("SELECT * FROM x", format='tuple')
+
+            self.client.offline = True
+            with mock.patch.object(RecordingDatabaseClient, '_connect') as connect:
+                self.assertIsNone(self.client.query("SELECT * FROM x", format='tuple'))
+                self.assertRaises(DuctOffline, self.client.query, "SELECT * FROM y", format='tuple')
+                self.assertRaises(DuctOffline, self.client.query, "SELECT * FROM x", format='tuple', renew=True)
+                self.assertRaises(DuctOffline, self.client.execute, "SELECT * FROM x")
+            connect.assert_not_called()
+        self.assertEqual(len(self.client.executed), 1)
+
+    def test_offline_failed_cache_loads_raise(self):
+        with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+            self.client.query("SELECT * FROM x", format='tuple')
+            self.client.query("SELECT * FROM y", format='tuple')
+        self.client.offline = True
+
+        def cache_path(statement):
+            return self.client.cache.get_path(
+                'RecordingDatabaseClient.RecordingDatabaseClient',
+                'tuple:\n{}'.format(self.client.statement_hash(statement))
+            )
+
+        os.remove(cache_path("SELECT * FROM x"))
+        self.assertRaises(DuctOffline, self.client.query, "SELECT * FROM x", format='tuple')
+        os.remove(cache_path("SELECT * FROM y"))
+        with open(cache_path("SELECT * FROM y"), 'wb') as f:  # Corrupt payload
+            f.write(b'corrupt')
+        self.assertRaises(DuctOffline, self.client.query, "SELECT * FROM y", format='tuple')
+        self.assertEqual(len(self.client.executed), 2)
+
+    def test_registry_offline_with_imported_bundle(self):
+        with mock.patch.object(RecordingDatabaseClient, '_cursor_empty', return_value=True):
+            self.client.query("SELECT * FROM x", format='tuple')
+        bundle = os.path.join(self.dir, 'bundle.tar.gz')
+        self.assertEqual(self.client.cache.export_bundle(bundle), 1)
+
+        cache = LocalCache(dir=os.path.join(self.dir, 'replay'))
+        self.assertEqual(cache.import_bundle(bundle), 1)
+        registry = DuctRegistry(offline=True)
+        client = RecordingDatabaseClient(registry=registry, cache=cache)
+        try:
+            self.assertTrue(client.offline)
+            self.assertIsNone(client.query("SELECT * FROM x", format='tuple'))
+            self.assertRaises(DuctOffline, client.query, "SELECT * FROM y", format='tuple')
+            self.assertEqual(client.executed, [])
+        finally:
+            cache.disconnect()
@@ -0,0 +1,84 @@
+import unittest
+
+import mock
+
+from omniduct.databases.cursor_formatters import PandasCursorFormatter
+from omniduct.databases.druid import DruidClient, DruidNativeCursor, DruidPagedCursor
+
+
+def response(payload):
+    return mock.Mock(json=mock.Mock(return_value=payload))
+
+
+class TestDruidNativeCursor(unittest.TestCase):
+
+    def test_timeseries_rows(self):
+        cursor = DruidNativeCursor(response([
+            {'timestamp': '2018-01-01T00:00:00.000Z', 'result': {'count': 1, 'total': 2.5}},
+            {'timestamp': '2018-01-02T00:00:00.000Z', 'result': {'count': 3}},
+        ]))
+        self.assertEqual([column[0] for column in cursor.description], ['timestamp', 'count', 'total'])
+        self.assertEqual(cursor.fetchall(), [
+            ('2018-01-01T00:00:00.000Z', 1, 2.5),
+            ('2018-01-02T00:00:00.000Z', 3, None),
+        ])
+
+    def test_topn_rows_batched_dataframes(self):
+        cursor = DruidNativeCursor(response([
+            {'timestamp': '2018-01-01T00:00:00.000Z', 'result': [{'page': 'a', 'count': 2}, {'page': 'b', 'count': 1}]},
+        ]))
+        batches = list(PandasCursorFormatter(cursor).stream(batch=1))
+        self.assertEqual(len(batches), 2)
+        self.assertEqual(batches[1]['page'].tolist(), ['b'])
+        self.assertEqual(batches[0]['timestamp'].dtype.kind, 'M')
+
+    def test_scan_compacted_list_rows(self):
+        cursor = DruidNativeCursor(response([
+            {'segmentId': 's', 'columns': ['__time', 'x'], 'events': [[1, 'a'], [2, 'b']]},
+        ]))
+        self.assertEqual(cursor.fetchall(), [(1, 'a'), (2, 'b')])
+
+    def test_native_query_hash_is_canonical(self):
+        self.assertEqual(
+            DruidClient.native_query_hash({'queryType': 'timeseries', 'dataSource': 'x'}),
+            DruidClient.native_query_hash('{"dataSource": "x",\n "queryType": "timeseries"}')
+        )
+
+
+class FakeCursor(object):
+
+    description = [('x', None, None, None, None, None, True)]
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+class TestDruidPagedCursor(unittest.TestCase):
+
+    def test_pages_fetched_lazily(self):
+        data = [(i,) for i in range(5)]
+        statements = []
+
+        def execute(statement):
+            statements.append(statement)
+            offset = int(statement.split('OFFSET ')[1])
+            return FakeCursor(data[offset:offset + 2])
+
+        cursor = DruidPagedCursor(execute, 'SELECT x FROM t ORDER BY x', page_size=2)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(cursor.fetchmany(3), [(0,), (1,), (2,)])
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(cursor.fetchall(), [(3,), (4,)])
+        self.assertEqual(statements[-1], 'SELECT x FROM t ORDER BY x\nLIMIT 2 OFFSET 4')
+        self.assertEqual(cursor.description[0][0], 'x')
+
+    def test_is_pageable(self):
+        self.assertTrue(DruidPagedCursor.is_pageable('SELECT * FROM t ORDER BY __time'))
+        self.assertFalse(DruidPagedCursor.is_pageable('SELECT * FROM t'))
+        self.assertFalse(DruidPagedCursor.is_pageable('SELECT * FROM (SELECT * FROM t ORDER BY x) s'))
+        self.assertFalse(DruidPagedCursor.is_pageable('SELECT * FROM t ORDER BY __time LIMIT 10'))
+        self.assertFalse(DruidPagedCursor.is_pageable('SHOW TABLES'))
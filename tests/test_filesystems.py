@@ -0,0 +1,90 @@
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from omniduct.caches.local import LocalCache
+from omniduct.errors import DuctOffline
+from omniduct.filesystems.base import FileSystemClient
+
+
+class MemoryFsClient(FileSystemClient):
+
+    PROTOCOLS = []
+
+    def _init(self, files=None):
+        self.files = files or {}
+
+    def _connect(self):
+        pass
+
+    def _is_connected(self):
+        return True
+
+    def _disconnect(self):
+        pass
+
+    def _path_home(self):
+        return '/home/user'
+
+    def _path_separator(self):
+        return '/'
+
+    def _exists(self, path):
+        return path in self.files
+
+    def _isdir(self, path):
+        return False
+
+    def _dir(self, path):
+        raise NotImplementedError
+
+    def _mkdir(self, path, recursive):
+        raise NotImplementedError
+
+    def _remove(self, path, recursive):
+        raise NotImplementedError
+
+    def _file_read_(self, path, size=-1, offset=0, binary=False):
+        data = self.files[path]
+        return data.encode('utf-8') if binary else data
+
+    def _file_write_(self, path, s, binary):
+        self.files[path] = s.decode('utf-8') if binary else s
+        return len(s)
+
+    def _file_append_(self, path, s, binary):
+        raise NotImplementedError
+
+
+class TestFileSystemClientOffline(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fs = MemoryFsClient(files={'/home/user/a.txt': 'foo'}, cache=LocalCache(dir=self.dir))
+
+    def tearDown(self):
+        self.fs.cache.disconnect()
+        shutil.rmtree(self.dir)
+
+    def test_reads_not_recorded_by_default(self):
+        with self.fs.open('a.txt') as f:
+            self.assertEqual(f.read(), 'foo')
+        self.assertEqual(self.fs.cache.stats()['entries'], 0)
+
+    def test_recorded_reads_served_offline(self):
+        self.fs.record_reads = True
+        with self.fs.open('a.txt') as f:
+            self.assertEqual(f.read(), 'foo')
+        self.fs.files['/home/user/a.txt'] = 'bar'  # Reads are always fresh while online
+        with self.fs.open('a.txt') as f:
+            self.assertEqual(f.read(), 'bar')
+
+        fs = MemoryFsClient(cache=self.fs.cache, offline=True)
+        with mock.patch.object(MemoryFsClient, '_connect') as connect:
+            with fs.open('a.txt') as f:
+                self.assertEqual(f.read(), 'bar')
+            self.assertRaises(DuctOffline, fs.open, '/home/user/a.txt', 'rb')  # Binary reads were not recorded
+            self.assertRaises(DuctOffline, fs.open, 'a.txt', 'w')
+        connect.assert_not_called()
@@ -0,0 +1,185 @@
+import io
+import threading
+import time
+import unittest
+
+import mock
+import pandas as pd
+
+from omniduct.databases.hiveserver2 import HiveHdfsResultCursor, HiveServer2Client
+from omniduct.filesystems.base import FileSystemClient
+
+
+def hdfs_fs(files):
+    fs = mock.Mock(spec=FileSystemClient)
+    fs.reads = []
+    lock = threading.Lock()
+
+    def open(path, mode):
+        with lock:
+            fs.reads.append(path)
+        return io.StringIO(files[path])
+
+    fs.dir.return_value = []
+    for path in sorted(files, reverse=True):
+        desc = mock.Mock(path=path, type='file')
+        desc.name = path.split('/')[-1]  # `name` cannot be passed to `Mock()`
+        fs.dir.return_value.append(desc)
+    fs.open.side_effect = open
+    return fs
+
+
+DESCRIPTION = [('x', 'INT_TYPE'), ('y', 'STRING_TYPE'), ('z', 'BOOLEAN_TYPE')]
+
+
+class TestHiveHdfsResultCursor(unittest.TestCase):
+
+    def test_rows_parsed_in_file_order(self):
+        fs = hdfs_fs({
+            '/r/000000_0': u'1\x01a\x01true\n2\x01\\N\x01false\n',
+            '/r/000001_0': u'3\x01c\x01\\N',
+            '/r/_SUCCESS': u'',
+        })
+        cursor = HiveHdfsResultCursor(fs, '/r', DESCRIPTION, parallelism=2)
+        self.assertEqual(cursor.fetchone(), (1, 'a', True))
+        self.assertEqual(cursor.fetchall(), [(2, None, False), (3, 'c', None)])
+
+        cursor.close()
+        fs.remove.assert_called_once_with('/r', recursive=True)
+
+    def test_empty_lines_are_rows(self):
+        fs = hdfs_fs({
+            '/r/000000_0': u'a\n\n\\N\n',
+            '/r/000001_0': u'\nb',
+        })
+        cursor = HiveHdfsResultCursor(fs, '/r', [('y', 'STRING_TYPE')], parallelism=2)
+        self.assertEqual(cursor.fetchall(), [('a',), ('',), (None,), ('',), ('b',)])
+
+    def test_read_ahead_is_bounded(self):
+        files = {'/r/{:06d}_0'.format(i): u'{}\x01a\x01true\n'.format(i) for i in range(10)}
+        fs = hdfs_fs(files)
+        cursor = HiveHdfsResultCursor(fs, '/r', DESCRIPTION, parallelism=2)
+        self.assertEqual(cursor.fetchone(), (0, 'a', True))
+        time.sleep(0.05)
+        self.assertLessEqual(len(fs.reads), 3)
+        self.assertEqual([row[0] for row in cursor.fetchall()], list(range(1, 10)))
+        self.assertEqual(len(fs.reads), 10)
+
+
+class TestHiveServer2ClientViaHdfs(unittest.TestCase):
+
+    def setUp(self):
+        self.client = HiveServer2Client(host='localhost', port=3623, hdfs_fs=hdfs_fs({}))
+        self.addCleanup(self.client.disconnect)
+        self.client.hdfs_fs.path_join.side_effect = lambda *components: '/'.join(components)
+        self.client.hdfs_fs._path.side_effect = lambda path: path
+        self.client.hdfs_fs.path_normpath.side_effect = lambda path: path
+
+    def _execute_via_hdfs(self, compress_output):
+        cursor = mock.Mock(description=[('omniduct_hdfs_result.x', 'INT_TYPE')])
+        cursor.fetchall.return_value = [(compress_output,)]
+        with mock.patch.object(HiveServer2Client, '_execute', return_value=cursor) as execute:
+            result = self.client._execute_via_hdfs("SELECT x FROM t")
+        self.assertEqual(result.description, [('x', 'INT_TYPE')])
+        return [call[0][0].split('\n')[0] for call in execute.call_args_list]
+
+    def test_compression_setting_restored(self):
+        self.assertEqual(self._execute_via_hdfs('hive.exec.compress.output=true'), [
+            'SELECT * FROM (',
+            'SET hive.exec.compress.output',
+            'SET hive.exec.compress.output=false',
+            "INSERT OVERWRITE DIRECTORY '.omniduct/hive_results/{}'".format(
+                self.client.hdfs_fs.path_join.call_args[0][1]),
+            'SET hive.exec.compress.output=true',
+        ])
+        self.assertEqual(self._execute_via_hdfs('hive.exec.compress.output is undefined')[-1][:6], 'INSERT')
+
+
+def describe_formatted(input_format):
+    return [
+        ('# Detailed Table Information', None, None),
+        ('Location:           ', 'hdfs://nameservice/warehouse/s.db/t', None),
+        ('# Storage Information', None, None),
+        ('SerDe Library:      ', 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe', None),
+        ('InputFormat:        ', input_format, None),
+    ]
+
+
+PARQUET = 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat'
+TEXTFILE = 'org.apache.hadoop.mapred.TextInputFormat'
+
+
+class TestHiveServer2ClientPushViaHdfs(unittest.TestCase):
+
+    def setUp(self):
+        self.fs = hdfs_fs({})
+        self.fs.path_join.side_effect = lambda *components: '/'.join(components)
+        self.fs.exists.return_value = False
+        self.fs.open.side_effect = lambda path, mode: mock.MagicMock()
+        self.client = HiveServer2Client(host='localhost', port=3623, hdfs_fs=self.fs)
+        self.addCleanup(self.client.disconnect)
+        self.df = pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']})
+
+    def push(self, exists, input_format=PARQUET, **kwargs):
+        with mock.patch.object(HiveServer2Client, '_table_exists', return_value=exists), \
+                mock.patch.object(HiveServer2Client, 'query', return_value=describe_formatted(input_format)), \
+                mock.patch.object(HiveServer2Client, 'execute') as execute:
+            self.client._push(self.df, 't', schema='s', via='hdfs', **kwargs)
+        return [call[0][0].strip().split('\n')[0] for call in execute.call_args_list]
+
+    def written(self):
+        return [call[0][0] for call in self.fs.open.call_args_list]
+
+    def test_new_table_created(self):
+        self.assertEqual(self.push(exists=False), ['CREATE TABLE IF NOT EXISTS s.t ('])
+        written = self.written()
+        self.assertEqual(len(written), 1)
+        self.assertTrue(written[0].startswith('/warehouse/s.db/t/omniduct_'))
+
+    def test_existing_table_respects_if_exists(self):
+        self.assertRaises(ValueError, self.push, exists=True, if_exists='fail')
+        self.assertEqual(self.push(exists=True, if_exists='append'), [])
+        self.assertEqual(self.push(exists=True, if_exists='replace')[0], 'DROP TABLE IF EXISTS s.t;')
+
+    def test_existing_table_in_other_format_not_appended_to(self):
+        self.assertRaises(ValueError, self.push, exists=True, input_format=TEXTFILE, if_exists='append')
+        self.assertRaises(ValueError, self.push, exists=True, input_format=TEXTFILE,
+                          if_exists='replace', partition={'ds': '2018-01-01'})
+        self.assertEqual(self.written(), [])
+
+    def test_partitions(self):
+        self.assertEqual(self.push(exists=True, partition={'ds': '2018-01-01'}),
+                         ["ALTER TABLE s.t ADD IF NOT EXISTS PARTITION (ds = '2018-01-01')"])
+        self.assertTrue(self.written()[0].startswith('/warehouse/s.db/t/ds=2018-01-01/omniduct_'))
+
+        self.fs.exists.return_value = True
+        self.assertRaises(ValueError, self.push, exists=True, partition={'ds': '2018-01-01'})
+        self.push(exists=True, partition={'ds': '2018-01-01'}, if_exists='replace')
+        self.fs.remove.assert_called_once_with('/warehouse/s.db/t/ds=2018-01-01', recursive=True)
+
+
+class TestHiveServer2ClientExplain(unittest.TestCase):
+
+    def setUp(self):
+        self.client = HiveServer2Client(host='localhost', port=3623)
+        self.addCleanup(self.client.disconnect)
+
+    def explain(self, plan):
+        with mock.patch.object(HiveServer2Client, 'query', return_value=[(line,) for line in plan]):
+            return self.client._explain("SELECT x FROM t")
+
+    def test_scan_statistics_summed(self):
+        cost = self.explain([
+            "  Map Operator Tree:",
+            "      TableScan",
+            "        alias: t",
+            "        Statistics: Num rows: 100 Data size: 800 Basic stats: COMPLETE Column stats: NONE",
+            "      TableScan",
+            "        alias: u",
+            "        Statistics: Num rows: 10 Data size: 80 Basic stats: COMPLETE Column stats: NONE",
+        ])
+        self.assertEqual((cost['rows'], cost['bytes']), (110, 880))
+
+    def test_unparsed_plans_have_unknown_cost(self):
+        self.assertEqual(self.explain(["Unrecognised plan"])['bytes'], None)
+        self.assertEqual(self.explain(["      TableScan", "        alias: t"])['rows'], None)
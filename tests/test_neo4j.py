@@ -0,0 +1,84 @@
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from omniduct.caches.local import LocalCache
+from omniduct.databases.neo4j import Neo4jClient, Neo4jCursor, Neo4jGraphCursorFormatter
+
+
+class FakeResult(object):
+
+    def __init__(self, keys, records):
+        self._keys = keys
+        self.records = list(records)
+        self.fetched = 0
+
+    def keys(self):
+        return self._keys
+
+    def __iter__(self):
+        for record in self.records:
+            self.fetched += 1
+            yield record
+
+    def consume(self):
+        pass
+
+
+class FakeNode(dict):
+
+    def __init__(self, id, labels, **properties):
+        dict.__init__(self, **properties)
+        self.id = id
+        self.labels = set(labels)
+
+
+class TestNeo4jCursor(unittest.TestCase):
+
+    def test_streams_records_and_releases_session(self):
+        release = mock.Mock()
+        result = FakeResult(['a', 'b'], [(i, i * 2) for i in range(5)])
+        cursor = Neo4jCursor(result, release=release)
+
+        self.assertEqual([column[0] for column in cursor.description], ['a', 'b'])
+        self.assertEqual(cursor.fetchmany(2), [(0, 0), (1, 2)])
+        self.assertEqual(result.fetched, 2)
+        release.assert_not_called()
+
+        self.assertEqual(cursor.fetchall(), [(2, 4), (3, 6), (4, 8)])
+        release.assert_called_once_with(True)
+        cursor.close()
+        release.assert_called_once_with(True)
+
+    def test_close_releases_session(self):
+        release = mock.Mock()
+        Neo4jCursor(FakeResult(['a'], [(1,)]), release=release).close()
+        release.assert_called_once_with(True)
+
+
+class TestNeo4jGraphCursorFormatter(unittest.TestCase):
+
+    def test_graph_entities_converted_columnwise(self):
+        result = FakeResult(['n', 'count'], [
+            (FakeNode(1, ['Person'], name='Ann'), 3),
+            (FakeNode(2, ['Person'], name='Bob'), 1),
+        ])
+        columns = Neo4jGraphCursorFormatter(Neo4jCursor(result)).dump()
+        self.assertEqual(list(columns), ['n', 'count'])
+        self.assertEqual(columns['count'], [3, 1])
+        self.assertEqual(columns['n'][0], {'name': 'Ann', '_id': 1, '_labels': ['Person']})
+
+    def test_graph_results_cached(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with mock.patch('atexit.register'):  # Avoid disconnecting (and logging) after output is closed
+            client = Neo4jClient(cache=LocalCache(dir=cache_dir))
+        result = FakeResult(['n'], [(FakeNode(1, ['Person'], name='Ann'),)])
+        with mock.patch.object(Neo4jClient, 'connect', return_value=client), \
+                mock.patch.object(Neo4jClient, '_execute', return_value=Neo4jCursor(result)) as execute:
+            columns = client.query("MATCH (n) RETURN n", format='graph')
+            self.assertEqual(client.query("MATCH (n) RETURN n", format='graph'), columns)
+        self.assertEqual(execute.call_count, 1)
+        self.assertEqual(columns['n'], [{'name': 'Ann', '_id': 1, '_labels': ['Person']}])
@@ -0,0 +1,276 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+import mock
+import pandas as pd
+from pyhive import presto
+
+from omniduct.caches.local import LocalCache
+from omniduct.databases.presto import PrestoClient, PrestoMetadataCache, PrestoPagePrefetcher
+
+
+def presto_client(**kwargs):
+    # Clients register a disconnection handler at construction, which would
+    # otherwise log to pytest's (by then closed) captured streams at exit.
+    with mock.patch('atexit.register'):
+        return PrestoClient(host='localhost', port=8080, **kwargs)
+
+
+def response(payload):
+    return mock.Mock(status_code=200, headers={}, json=mock.Mock(return_value=payload))
+
+
+STATS = {
+    'state': 'FINISHED', 'queuedTimeMillis': 100, 'elapsedTimeMillis': 2500, 'wallTimeMillis': 4000,
+    'cpuTimeMillis': 3000, 'processedRows': 1000, 'processedBytes': 8000, 'peakMemoryBytes': 1024,
+    'nodes': 1, 'totalSplits': 2, 'completedSplits': 2,
+}
+
+PAGES = [
+    {'id': 'q1', 'nextUri': 'http://localhost/2', 'stats': dict(STATS, state='QUEUED')},
+    {'id': 'q1', 'nextUri': 'http://localhost/3', 'columns': [{'name': 'x', 'type': 'bigint'}],
+     'data': [[1]], 'stats': dict(STATS, state='RUNNING')},
+    {'id': 'q1', 'columns': [{'name': 'x', 'type': 'bigint'}], 'data': [[2]], 'stats': STATS},
+]
+
+
+class TestPrestoClient(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = mock.Mock()
+        self.client = presto_client(metrics_sink=self.sink)
+        session = mock.Mock()
+        session.post.return_value = response(PAGES[0])
+        session.get.side_effect = [response(page) for page in PAGES[1:]]
+        self.cursor = presto.Cursor('localhost', requests_session=session)
+
+    def test_query_stats_captured_on_completion(self):
+        cursor = self.client._execute("SELECT x FROM t", cursor=self.cursor, async=True)
+        self.assertIsNone(self.client.last_query_stats)
+        self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+
+        stats = self.client.last_query_stats
+        self.assertIs(cursor.query_stats, stats)
+        self.assertEqual(stats['query_id'], 'q1')
+        self.assertEqual(stats['state'], 'FINISHED')
+        self.assertEqual(stats['cpu_time'], 3.0)
+        self.assertEqual(stats['queued_time'], 0.1)
+        self.assertEqual(stats['processed_rows'], 1000)
+        self.assertEqual(stats['peak_memory_bytes'], 1024)
+        self.assertEqual(stats['statement'], "SELECT x FROM t")
+        self.sink.assert_called_once_with(stats)
+
+    def test_positional_params_executed_as_prepared_statement(self):
+        session = self.cursor._requests_session
+        cursor = self.client._execute("SELECT x FROM t WHERE y = ? AND z = ?", cursor=self.cursor,
+                                      async=True, params=['a', 1])
+        self.assertEqual(cursor.fetchall(), [(1,), (2,)])
+
+        args, kwargs = session.post.call_args
+        name = kwargs['data'].decode('utf-8').split()[1]
+        self.assertEqual(kwargs['data'].decode('utf-8'), "EXECUTE {} USING 'a', 1".format(name))
+        self.assertEqual(
+            kwargs['headers']['X-Presto-Prepared-Statement'],
+            '{}=SELECT+x+FROM+t+WHERE+y+%3D+%3F+AND+z+%3D+%3F'.format(name)
+        )
+        self.assertIn('X-Presto-Prepared-Statement', session.get.call_args[1]['headers'])
+
+        session.post.return_value = response(PAGES[-1])
+        self.client._execute("SELECT 1", cursor=cursor, async=True)
+        self.assertIs(cursor._requests_session, session)
+        self.assertNotIn('X-Presto-Prepared-Statement', session.post.call_args[1]['headers'])
+
+    def test_explained_statement_prepared(self):
+        statement = self.client._prepare_statement(self.cursor, "EXPLAIN (TYPE DISTRIBUTED)\nSELECT ?", ['a'])
+        name = statement.split()[4]
+        self.assertEqual(statement, "EXPLAIN (TYPE DISTRIBUTED)\nEXECUTE {} USING 'a'".format(name))
+        self.assertEqual(self.cursor._requests_session.header, '{}=SELECT+%3F'.format(name))
+
+    def _paged_session(self, n_pages):
+        pages = [{'id': 'q1', 'nextUri': 'http://localhost/1', 'stats': dict(STATS, state='QUEUED')}]
+        for i in range(1, n_pages + 1):
+            page = {'id': 'q1', 'columns': [{'name': 'x', 'type': 'bigint'}], 'data': [[i]],
+                    'stats': STATS}
+            if i < n_pages:
+                page.update(nextUri='http://localhost/{}'.format(i + 1), stats=dict(STATS, state='RUNNING'))
+            pages.append(page)
+        responses = {'http://localhost/{}'.format(i): response(page) for i, page in enumerate(pages) if i}
+        session = mock.Mock()
+        session.post.return_value = response(pages[0])
+        session.get.side_effect = lambda url, **kwargs: responses[url]
+        return session, responses
+
+    def test_pages_prefetched(self):
+        session, responses = self._paged_session(5)
+        decoders = {url: resp.json for url, resp in responses.items()}
+        cursor = presto.Cursor('localhost', requests_session=session)
+        cursor = self.client._execute("SELECT x FROM t", cursor=cursor, prefetch_pages=2)
+        self.assertIsInstance(cursor._requests_session, PrestoPagePrefetcher)
+        self.assertEqual(cursor.fetchall(), [(i,) for i in range(1, 6)])
+
+        self.assertEqual(sorted(call[0][0] for call in session.get.call_args_list), sorted(responses))
+        for decode in decoders.values():  # Each page is decoded exactly once
+            self.assertEqual(decode.call_count, 1)
+        self.assertEqual(self.client.last_query_stats['state'], 'FINISHED')
+
+        session.post.return_value = response(PAGES[-1])
+        self.client._execute("SELECT 1", cursor=cursor)
+        self.assertIs(cursor._requests_session, session)
+
+    def test_prefetched_page_errors_raised_by_cursor(self):
+        from pyhive.exc import OperationalError
+        session, responses = self._paged_session(3)
+        responses['http://localhost/3'] = mock.Mock(status_code=500, content=b'failed', headers={},
+                                                   json=mock.Mock(side_effect=ValueError))
+        cursor = presto.Cursor('localhost', requests_session=session)
+        cursor = self.client._execute("SELECT x FROM t", cursor=cursor, prefetch_pages=1)
+        self.assertRaises(OperationalError, cursor.fetchall)
+
+    def test_preview_samples_with_tablesample(self):
+        self.assertEqual(
+            self.client._statement_preview("SELECT * FROM t", n=10, sample=5),
+            "SELECT * FROM (\nSELECT *\nFROM t\n) omniduct_preview TABLESAMPLE BERNOULLI (5.0)\nLIMIT 10"
+        )
+
+    def test_explain_estimates_scanned_rows_and_bytes(self):
+        plan = "\n".join([
+            "Fragment 0 [SINGLE]",
+            "    - Output[x] => [x:bigint]",
+            "            Estimates: {rows: 10 (90B), cpu: ?, memory: 0B, network: ?}",
+            "Fragment 1 [SOURCE]",
+            "    - ScanFilterProject[table = hive:s:a, filterPredicate = (y = 1)] => [x:bigint]",
+            "            Estimates: {rows: 1,000 (8.79kB), cpu: 9k, memory: 0B, network: 0B}/{rows: 10 (90B), cpu: ?}",
+            "    - TableScan[hive:s:b] => [x:bigint]",
+            "            Estimates: {rows: 500 (1.5MB), cpu: 1.5M, memory: 0B, network: 0B}",
+        ])
+        with mock.patch.object(PrestoClient, 'query', return_value=[(plan,)]) as query:
+            cost = self.client._explain("SELECT x FROM a")
+        self.assertEqual(query.call_args[0][0], "EXPLAIN (TYPE DISTRIBUTED)\nSELECT x FROM a")
+        self.assertEqual(cost['rows'], 1500)
+        self.assertEqual(cost['bytes'], 8.79 * 1024 + 1.5 * 1024 ** 2)
+
+        with mock.patch.object(PrestoClient, 'query', return_value=[(plan.replace('500 (1.5MB)', '? (?)'),)]):
+            cost = self.client._explain("SELECT x FROM a")
+        self.assertIsNone(cost['rows'])
+
+    def test_explain_estimates_without_node_prefix(self):
+        plan = "\n".join([
+            "Fragment 1 [SOURCE]",
+            "    Output layout: [x]",
+            "    TableScan[table = hive:s:a]",
+            "        Layout: [x:bigint]",
+            "        Estimates: {rows: 1000000000 (8.79GB), cpu: 8.79G, memory: 0B, network: 0B}",
+        ])
+        with mock.patch.object(PrestoClient, 'query', return_value=[(plan,)]):
+            cost = self.client._explain("SELECT x FROM a")
+        self.assertEqual(cost['rows'], 10 ** 9)
+        self.assertEqual(cost['bytes'], 8.79 * 1024 ** 3)
+
+        for plan in ["Unrecognised plan", "    TableScan[table = hive:s:a]\n        Layout: [x:bigint]"]:
+            with mock.patch.object(PrestoClient, 'query', return_value=[(plan,)]):
+                cost = self.client._explain("SELECT x FROM a")
+            self.assertEqual((cost['rows'], cost['bytes']), (None, None))
+
+
+COLUMNS = pd.DataFrame(
+    [('a', 'id', 'bigint'), ('a', 'name', 'varchar(10)'), ('b', 'ts', 'timestamp')],
+    columns=['table_name', 'column_name', 'data_type']
+)
+
+
+class TestPrestoMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def client(self, **kwargs):
+        return presto_client(cache=LocalCache(dir=self.dir), **kwargs)
+
+    @mock.patch.object(PrestoMetadataCache, '_fetch', return_value=COLUMNS)
+    def test_columns_persist_across_sessions(self, fetch):
+        self.assertEqual(self.client()._metadata.table_names('s'), ['a', 'b'])
+        self.assertEqual(self.client()._metadata.columns('s')['a'], [('id', 'bigint'), ('name', 'varchar(10)')])
+        self.assertEqual(fetch.call_count, 1)
+
+        self.client()._metadata.columns('s', renew=True)
+        self.assertEqual(fetch.call_count, 2)
+
+    @mock.patch.object(PrestoMetadataCache, '_fetch', return_value=COLUMNS)
+    def test_stale_metadata_refreshed_in_background(self, fetch):
+        client = self.client(metadata_ttl=0)
+        client._metadata.columns('s')
+        time.sleep(0.01)
+        self.assertEqual(client._metadata.columns('s')['b'], [('ts', 'timestamp')])
+        for _ in range(100):
+            if not client._metadata._refreshing:
+                break
+            time.sleep(0.01)
+        self.assertEqual(fetch.call_count, 2)
+
+
+class TestPrestoCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.client = presto_client(schema='s')
+
+    def test_tables_exist_single_query(self):
+        found = pd.DataFrame([('s', 'a'), ('t', 'b')], columns=['table_schema', 'table_name'])
+        with mock.patch.object(PrestoClient, 'query', return_value=found) as query:
+            exists = self.client.tables_exist(['a', 'T.B', 's.b', '"t"."c"'])
+        self.assertEqual(exists.tolist(), [True, True, False, False])
+        self.assertEqual(exists.index.tolist(), ['a', 'T.B', 's.b', '"t"."c"'])
+        query.assert_called_once_with(
+            "SELECT table_schema, table_name FROM information_schema.tables "
+            "WHERE (table_schema = 's' AND table_name IN ('a', 'b')) OR (table_schema = 't' AND table_name IN ('b', 'c'))",
+            use_cache=False
+        )
+
+    def test_tables_exist_catalog_qualified(self):
+        found = [
+            pd.DataFrame([('s', 'a')], columns=['table_schema', 'table_name']),
+            pd.DataFrame([('s', 'a')], columns=['table_schema', 'table_name']),
+        ]
+        with mock.patch.object(PrestoClient, 'query', side_effect=found) as query:
+            exists = self.client.tables_exist(['default.s.a', 'mysql.s.a', 'mysql.s.b'])
+        self.assertEqual(exists.tolist(), [True, True, False])
+        self.assertEqual(sorted(call[0][0] for call in query.call_args_list), [
+            "SELECT table_schema, table_name FROM \"mysql\".information_schema.tables "
+            "WHERE (table_schema = 's' AND table_name IN ('a', 'b'))",
+            "SELECT table_schema, table_name FROM information_schema.tables "
+            "WHERE (table_schema = 's' AND table_name IN ('a'))",
+        ])
+
+    def test_tables_desc_single_query(self):
+        columns = pd.DataFrame(
+            [('s', 'a', 'x', 'bigint', '', ''), ('s', 'a', 'y', 'varchar', '', '')],
+            columns=['table_schema', 'table_name', 'Column', 'Type', 'Extra', 'Comment']
+        )
+        with mock.patch.object(PrestoClient, 'query', return_value=columns) as query:
+            descs = self.client.tables_desc(['a', 'b'])
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(list(descs), ['a', 'b'])
+        self.assertEqual(descs['a']['Column'].tolist(), ['x', 'y'])
+        self.assertEqual(list(descs['b'].columns), ['Column', 'Type', 'Extra', 'Comment'])
+        self.assertEqual(len(descs['b']), 0)
+
+    def test_table_desc_catalog_qualified(self):
+        columns = pd.DataFrame(
+            [('s', 'a', 'x', 'bigint', '', '')],
+            columns=['table_schema', 'table_name', 'Column', 'Type', 'Extra', 'Comment']
+        )
+        with mock.patch.object(PrestoClient, 'query', return_value=columns) as query:
+            desc = self.client.table_desc('mysql.s.a')
+        self.assertEqual(desc['Column'].tolist(), ['x'])
+        self.assertTrue(query.call_args[0][0].startswith(
+            'SELECT table_schema, table_name, column_name AS "Column"'
+        ))
+        self.assertIn("FROM \"mysql\".information_schema.columns WHERE (table_schema = 's' AND table_name IN ('a'))",
+                      query.call_args[0][0])
+
+        with mock.patch.object(PrestoMetadataCache, 'table_desc') as table_desc:
+            self.client.table_desc('default.s.a')
+            self.client.table_desc('a')
+        self.assertEqual([call[0] for call in table_desc.call_args_list], [('s', 'a'), ('s', 'a')])
@@ -0,0 +1,101 @@
+import re
+import unittest
+
+import mock
+import pandas as pd
+import sqlalchemy
+
+from omniduct.databases.sqlalchemy import SQLAlchemyClient, SQLAlchemyStreamingCursor
+
+
+class TestSQLAlchemyClient(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = sqlalchemy.create_engine('sqlite://')
+        self.engine.execute("CREATE TABLE t (x INTEGER)")
+        self.engine.execute("INSERT INTO t VALUES (1), (2), (3)")
+
+        patcher = mock.patch('sqlalchemy.create_engine', return_value=self.engine)
+        self.create_engine = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('omniduct.duct.is_port_bound', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.client = SQLAlchemyClient(protocol='sqlalchemy', dialect='sqlite', host='localhost', port=1,
+                                       pool_size=2, pool_recycle=60, stream_batch_size=2)
+
+    def test_pool_options_and_dispose(self):
+        self.client.connect()
+        self.create_engine.assert_called_once_with(self.client.db_uri, pool_size=2, pool_recycle=60)
+        with mock.patch.object(self.engine, 'dispose') as dispose:
+            self.client.disconnect()
+            dispose.assert_called_once_with()
+        self.assertIsNone(self.client.engine)
+
+    def test_stream_uses_streaming_cursor(self):
+        rows = list(self.client.stream("SELECT x FROM t ORDER BY x", format='tuple', batch=2))
+        self.assertEqual(rows, [[(1,), (2,)], [(3,)]])
+
+        cursor = self.client.execute("SELECT x FROM t ORDER BY x", stream_results=True)
+        self.assertIsInstance(cursor, SQLAlchemyStreamingCursor)
+        self.assertEqual(cursor.description[0][0], 'x')
+        self.assertEqual(cursor.fetchmany(2), [(1,), (2,)])
+        self.assertEqual(cursor.fetchmany(2), [(3,)])
+        self.assertIsNone(cursor._connection)  # Connection returned to the pool once exhausted
+
+    def test_query_with_params(self):
+        df = self.client.query("SELECT x FROM t WHERE x > ?", params=[1], use_cache=False)
+        self.assertEqual(df['x'].tolist(), [2, 3])
+
+    def test_push_batched(self):
+        df = pd.DataFrame({'a': range(5), 'b': list('abcde')})
+        with mock.patch.object(pd.DataFrame, 'to_sql', autospec=True, side_effect=pd.DataFrame.to_sql) as to_sql:
+            self.client.push(df, 'u', batch_size=2)
+        self.assertEqual(to_sql.call_count, 3)
+        self.assertEqual(self.engine.execute("SELECT a, b FROM u ORDER BY a").fetchall(),
+                         list(zip(range(5), 'abcde')))
+
+        self.assertRaises(ValueError, self.client.push, df, 'u')
+        self.client.push(df, 'u', if_exists='append')
+        self.assertEqual(self.engine.execute("SELECT COUNT(*) FROM u").scalar(), 10)
+        self.client.push(df.head(1), 'u', if_exists='replace')
+        self.assertEqual(self.engine.execute("SELECT COUNT(*) FROM u").scalar(), 1)
+
+    def test_push_batch_size_limited_by_dialect(self):
+        df = pd.DataFrame({'a': range(700), 'b': range(700), 'c': range(700)})
+        with mock.patch.object(pd.DataFrame, 'to_sql', autospec=True, side_effect=pd.DataFrame.to_sql) as to_sql:
+            self.client.push(df, 'u')
+        self.assertEqual([len(call[0][0]) for call in to_sql.call_args_list], [333, 333, 34])
+        self.assertEqual(self.engine.execute("SELECT COUNT(*) FROM u").scalar(), 700)
+
+    def test_push_load_mysql(self):
+        df = pd.DataFrame({'a': [1, 2], 'b': ['NULL', None], 'c': ['x\\y', 'z'], 'd': [True, False]})
+        loaded = []
+        connection = mock.MagicMock()
+        connection.__enter__.return_value = connection
+        connection.execute.side_effect = lambda statement: loaded.append(
+            (statement, open(re.search("INFILE '([^']*)'", statement).group(1)).read())
+        )
+        self.client.engine = mock.Mock(**{'begin.return_value': connection})
+        self.client._push_load_mysql(df, [0], 10, 't', 'a, b, c, d')
+
+        statement, content = loaded[0]
+        self.assertIn("ESCAPED BY '\\\\'", statement)
+        self.assertEqual(content.splitlines(), ['1,NULL,x\\\\y,1', '2,\\N,z,0'])
+
+    def test_push_copy_postgresql(self):
+        df = pd.DataFrame({'a': [1, 2, 3], 'b': [u'caf\xe9', None, u'']})
+        copied = []
+        connection = mock.Mock()
+        connection.cursor.return_value.copy_expert.side_effect = lambda sql, buf: copied.append((sql, buf.read()))
+        self.client.engine = mock.Mock(**{'raw_connection.return_value': connection})
+        self.client._push_copy_postgresql(df, [0, 2], 2, 't', 'a, b')
+
+        sql = "COPY t (a, b) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+        self.assertEqual(copied, [
+            (sql, u'1,caf\xe9\n2,\\N\n'),
+            (sql, u'3,\n'),
+        ])
+        connection.commit.assert_called_once_with()
+        connection.close.assert_called_once_with()